@@ -0,0 +1 @@
+__version__ = 'B1.0.5'
@@ -1,67 +1,117 @@
 import os
-import re
 
-def find_application_class(src_dir):
+from ..fs.fs_manager import LOCAL_FS
+from ..guard.guard_manager import guarded_search, guarded_sub, register_pattern
+from ..locator.locator_manager import apply_insertions, get_source_map
+from ..progress.progress_manager import Progress
+from ..templates.template_manager import render_template
+from ..validate.validate_manager import patch_source, write_source
+
+INITIALIZE_SDK_CALL = r'\.initializeSdk\s*\('
+SET_NOTIFICATION_OPTIONS_CALL = r'\.setNotificationOptions\s*\('
+
+APPLICATION_CLASS = register_pattern('application: class declaration', r'class\s+\w+\s*:\s*Application|extends\s+Application')
+DEBUG_LEVEL = register_pattern('application: setDebugLevel', r'\.setDebugLevel\(\s*\d+\s*\)')
+NOTIFICATION_OPTIONS_DECLARATION = {
+    'kotlin': register_pattern('application: kotlin options declaration', r'\bval\s+options\s*=\s*SMTNotificationOptions\s*\('),
+    'java': register_pattern('application: java options declaration',
+                             r'\bSMTNotificationOptions\s+options\s*=\s*new\s+SMTNotificationOptions\s*\('),
+}
+
+def is_application_class(content):
+    """Check whether Java/Kotlin source content declares an Application subclass."""
+    return guarded_search(APPLICATION_CLASS, content) is not None
+
+def has_sdk_initialization(content):
+    """Check whether Application class content initializes the Smartech SDK."""
+    return 'initializeSdk' in content
+
+def has_deeplink_registration(content):
+    """Check whether Application class content registers the Smartech deep link receiver."""
+    return 'DeeplinkReceiver' in content or 'EVENT_PN_INBOX_CLICK' in content
+
+def _on_create(source_map):
+    """Return (class body, onCreate method) of the Application class in a source map."""
+    body = source_map.class_body('Application')
+    if body is None:
+        return None, None
+    return body, source_map.method('onCreate', body)
+
+def insert_into_on_create(content, language, insertion):
+    """Insert statements into Application.onCreate() right after super.onCreate(), adding onCreate if missing."""
+    source_map = get_source_map(content, language)
+    body, method = _on_create(source_map)
+    if body is None:
+        return content
+    if method is None:
+        if language == 'kotlin':
+            method_code = "\n    override fun onCreate() {\n        super.onCreate()" + insertion + "    }\n"
+        else:
+            method_code = "\n    @Override\n    public void onCreate() {\n        super.onCreate();" + insertion + "    }\n"
+        return apply_insertions(content, [(body[1], method_code)])
+    position = source_map.statement_end(r'\bsuper\s*\.\s*onCreate\s*\(', method['body'])
+    if position is None:
+        position = method['body'][0] + 1
+    return apply_insertions(content, [(position, insertion)])
+
+def insert_after_initialization(content, language, code):
+    """Insert statements on the lines after the initializeSdk call in onCreate(); no-op if there is none."""
+    source_map = get_source_map(content, language)
+    _, method = _on_create(source_map)
+    if method is None:
+        return content
+    position = source_map.statement_end(INITIALIZE_SDK_CALL, method['body'])
+    if position is None:
+        return content
+    lines = ''.join('\n        ' + line for line in code.splitlines())
+    return apply_insertions(content, [(position, lines)])
+
+def notification_options_block(content, language):
+    """Return (start, end) of the existing options declaration through its setNotificationOptions statement."""
+    source_map = get_source_map(content, language)
+    declaration = guarded_search(NOTIFICATION_OPTIONS_DECLARATION['kotlin' if language == 'kotlin' else 'java'], source_map.masked)
+    if declaration is None:
+        return None
+    end = source_map.statement_end(SET_NOTIFICATION_OPTIONS_CALL, (declaration.start(), len(content)))
+    if end is None:
+        return None
+    return declaration.start(), end
+
+def find_application_class(src_dir, fs=None, progress=None):
     """Find the application class in the source directory."""
-    for root, _, files in os.walk(src_dir):
-        for file in files:
-            if file.endswith(".java") or file.endswith(".kt"):
-                path = os.path.join(root, file)
-                with open(path, 'r') as f:
-                    content = f.read()
-                    if re.search(r'class\s+\w+\s*:\s*Application|extends\s+Application', content):
-                        return path, 'kotlin' if file.endswith('.kt') else 'java'
+    fs = fs or LOCAL_FS
+    progress = progress or Progress()
+    paths = [os.path.join(root, file) for root, _, files in fs.walk(src_dir)
+             for file in files if file.endswith(".java") or file.endswith(".kt")]
+    with progress.phase("Looking for the Application class", len(paths)):
+        for path in paths:
+            content = fs.read_text(path)
+            progress.advance(len(content))
+            if is_application_class(content):
+                return path, 'kotlin' if path.endswith('.kt') else 'java'
     return None, None
 
-def create_application_class(src_dir, language, application_id):
+def create_application_class(src_dir, language, application_id, target_sdk=None, fs=None):
     """Create a new application class if one doesn't exist."""
+    fs = fs or LOCAL_FS
     path = os.path.join(src_dir, "MyApplication.kt" if language == 'kotlin' else "MyApplication.java")
-    if language == 'kotlin':
-        content = f"""
-package {application_id}
-
-import android.app.Application
-import android.content.IntentFilter
-import com.netcore.android.Smartech
-import java.lang.ref.WeakReference
-
-class MyApplication : Application() {{
-    override fun onCreate() {{
-        super.onCreate()
-        Smartech.getInstance(WeakReference(applicationContext)).initializeSdk(this)
-        Smartech.getInstance(WeakReference(applicationContext)).trackAppInstallUpdateBySmartech()
-    }}
-}}
-"""
-    else:
-        content = f"""
-package {application_id};
-
-import android.app.Application;
-import android.content.IntentFilter;
-import com.netcore.android.Smartech;
-import java.lang.ref.WeakReference;
-
-public class MyApplication extends Application {{
-    @Override
-    public void onCreate() {{
-        super.onCreate();
-        Smartech.getInstance(new WeakReference<>(getApplicationContext())).initializeSdk(this);
-        Smartech.getInstance(new WeakReference<>(getApplicationContext())).trackAppInstallUpdateBySmartech();
-    }}
-}}
-"""
-    with open(path, "w") as f:
-        f.write(content)
+    content = render_template('application', language, application_id, target_sdk)
+    write_source(path, content, language, fs=fs)
     return path
 
-def inject_sdk_initialization(app_class_path, language, target_sdk):
-    """Inject SDK initialization code into the application class."""
-    with open(app_class_path, 'r') as f:
-        content = f.read()
+def inject_sdk_initialization(app_class_path, language, target_sdk, fs=None, register_deeplink=True):
+    """
+    Inject SDK initialization code into the application class.
+
+    The deep link receiver is registered unless register_deeplink is False, for an app that
+    already receives the Smartech deep link broadcast elsewhere.
+    """
+    patch_source(app_class_path, language, 'application.initialization', [target_sdk, register_deeplink],
+                 lambda content: _with_sdk_initialization(content, language, target_sdk, register_deeplink), fs)
 
-    has_smartech_init = 'initializeSdk' in content
-    has_deeplink = 'DeeplinkReceiver' in content or 'EVENT_PN_INBOX_CLICK' in content
+def _with_sdk_initialization(content, language, target_sdk, register_deeplink=True):
+    has_smartech_init = has_sdk_initialization(content)
+    has_deeplink = not register_deeplink or has_deeplink_registration(content)
 
     if language == 'kotlin':
         insertion = ""
@@ -91,9 +141,7 @@ def inject_sdk_initialization(app_class_path, language, target_sdk):
 """
 
         if insertion.strip():
-            content = re.sub(r'(override fun onCreate\(\) \s*{[^}]*super\.onCreate\(\);?)',
-                             lambda m: m.group(0) + insertion,
-                             content)
+            content = insert_into_on_create(content, language, insertion)
 
     else:  # Java
         insertion = ""
@@ -123,54 +171,38 @@ def inject_sdk_initialization(app_class_path, language, target_sdk):
 """
 
         if insertion.strip():
-            content = re.sub(r'(public void onCreate\(\) \s*{[^}]*super\.onCreate\(\);?)',
-                             lambda m: m.group(0) + insertion,
-                             content)
+            content = insert_into_on_create(content, language, insertion)
 
-    with open(app_class_path, 'w') as f:
-        f.write(content)
+    return content
 
-def inject_debug_level(app_class_path, language, enable_debug):
+def inject_debug_level(app_class_path, language, enable_debug, fs=None):
     """Inject debug level setting into the application class."""
-    with open(app_class_path, 'r') as f:
-        content = f.read()
+    patch_source(app_class_path, language, 'application.debug-level', [enable_debug],
+                 lambda content: _with_debug_level(content, language, enable_debug), fs)
 
+def _with_debug_level(content, language, enable_debug):
     debug_level = 9 if enable_debug else 0
     debug_code = f'Smartech.getInstance(WeakReference(applicationContext)).setDebugLevel({debug_level})' if language == 'kotlin' else f'Smartech.getInstance(new WeakReference<>(this)).setDebugLevel({debug_level});'
 
     # Check if setDebugLevel is already present
     if 'setDebugLevel' in content:
         # Update existing debug level
-        if language == 'kotlin':
-            content = re.sub(r'Smartech\.getInstance\(WeakReference\(applicationContext\)\)\.setDebugLevel\(\d+\)',
-                            debug_code,
-                            content)
-        else:
-            content = re.sub(r'Smartech\.getInstance\(new\s+WeakReference<>\(this\)\)\.setDebugLevel\(\d+\);',
-                            debug_code,
-                            content)
+        content = guarded_sub(DEBUG_LEVEL, f'.setDebugLevel({debug_level})', content)
     else:
         # Add debug level setting after SDK initialization
-        if language == 'kotlin':
-            content = re.sub(r'(Smartech\.getInstance\(WeakReference\(applicationContext\)\)\.initializeSdk\(this\))',
-                            r'\1\n        ' + debug_code,
-                            content)
-        else:
-            content = re.sub(r'(Smartech\.getInstance\(new\s+WeakReference<>\(this\)\)\.initializeSdk\(this\);)',
-                            r'\1\n        ' + debug_code,
-                            content)
+        content = insert_after_initialization(content, language, debug_code)
 
-    with open(app_class_path, 'w') as f:
-        f.write(content)
+    return content
 
-def inject_notification_appearance(app_class_path, language, notification_options):
+def inject_notification_appearance(app_class_path, language, notification_options, fs=None):
     """Inject notification appearance settings into the application class."""
-    with open(app_class_path, 'r') as f:
-        content = f.read()
+    patch_source(app_class_path, language, 'application.notification-options', [notification_options],
+                 lambda content: _with_notification_appearance(content, language, notification_options), fs)
 
+def _with_notification_appearance(content, language, notification_options):
     # Build the options code based on user input
     if language == 'kotlin':
-        options_code = "val options = SMTNotificationOptions(context)\n"
+        options_code = "val options = SMTNotificationOptions(this)\n"
         if notification_options.get('brand_logo'):
             options_code += f'options.brandLogo = "{notification_options["brand_logo"]}"\n'
         if notification_options.get('large_icon'):
@@ -183,7 +215,7 @@ def inject_notification_appearance(app_class_path, language, notification_option
             options_code += f'options.transparentIconBgColor = "{notification_options["transparent_bg_color"]}"\n'
         if notification_options.get('placeholder_icon'):
             options_code += f'options.placeHolderIcon = "{notification_options["placeholder_icon"]}"\n'
-        options_code += 'SmartPush.getInstance(WeakReference(context)).setNotificationOptions(options)'
+        options_code += 'SmartPush.getInstance(WeakReference(applicationContext)).setNotificationOptions(options)'
     else:
         options_code = "SMTNotificationOptions options = new SMTNotificationOptions(this);\n"
         if notification_options.get('brand_logo'):
@@ -202,27 +234,12 @@ def inject_notification_appearance(app_class_path, language, notification_option
 
     # Check if SMTNotificationOptions is already present
     if 'SMTNotificationOptions' in content:
-        # Update existing notification options
-        if language == 'kotlin':
-            # Find the entire block from options creation to setNotificationOptions
-            pattern = r'val\s+options\s*=\s*SMTNotificationOptions\([^)]*\)[^}]*SmartPush\.getInstance\([^)]*\)\.setNotificationOptions\(options\)'
-            if re.search(pattern, content):
-                content = re.sub(pattern, options_code, content)
-        else:
-            # Find the entire block from options creation to setNotificationOptions
-            pattern = r'SMTNotificationOptions\s+options\s*=\s*new\s+SMTNotificationOptions\([^)]*\);[^;]*SmartPush\.getInstance\([^)]*\)\.setNotificationOptions\(options\);'
-            if re.search(pattern, content):
-                content = re.sub(pattern, options_code, content)
+        # Update existing notification options: replace the block from options creation to setNotificationOptions
+        block = notification_options_block(content, language)
+        if block:
+            content = content[:block[0]] + '\n        '.join(options_code.splitlines()) + content[block[1]:]
     else:
         # Add notification options after SDK initialization
-        if language == 'kotlin':
-            content = re.sub(r'(Smartech\.getInstance\(WeakReference\(applicationContext\)\)\.initializeSdk\(this\))',
-                            r'\1\n        ' + options_code,
-                            content)
-        else:
-            content = re.sub(r'(Smartech\.getInstance\(new\s+WeakReference<>\(this\)\)\.initializeSdk\(this\);)',
-                            r'\1\n        ' + options_code,
-                            content)
+        content = insert_after_initialization(content, language, options_code)
 
-    with open(app_class_path, 'w') as f:
-        f.write(content) 
\ No newline at end of file
+    return content 
\ No newline at end of file
@@ -1,18 +1,239 @@
+import bisect
 import os
 
-def create_backup_xml_files(project_dir, target_sdk, manifest_path):
-    """Create backup configuration XML files based on target SDK version."""
-    res_dir = os.path.join(project_dir, "app", "src", "main", "res")
+from ..fs.fs_manager import LOCAL_FS, as_text, edit_file
+from ..manifest.manifest_manager import backup_attribute, parse_manifest
+
+BACKUP_INCLUDES = (
+    ('sharedpref', 'smt_guid_preferences.xml'),
+    ('sharedpref', 'smt_preferences_guid.xml'),
+)
+# Root element of the rules file each backup attribute points at.
+RULES_ROOTS = {
+    'android:fullBackupContent': 'full-backup-content',
+    'android:dataExtractionRules': 'data-extraction-rules',
+}
+# Elements holding the rules of a data extraction rules file; a full backup content file holds them at its root.
+DATA_EXTRACTION_SECTIONS = ('cloud-backup', 'device-transfer')
+# Rules files are fed to the parser in chunks of this many characters (bytes for a mapped file).
+_PARSE_CHUNK = 64 * 1024
+
+def backup_file_name(target_sdk):
+    """Return the name of the backup rules resource used for a target SDK version."""
+    return 'my_backup_file_31' if target_sdk >= 31 else 'my_backup_file'
+
+def backup_rules_name(application, target_sdk, res_dir, fs=None):
+    """
+    Return the backup rules resource an integration merges into.
+
+    That is the res/xml file the manifest already points at for the target SDK, so the app's
+    own rules are kept, or the Smartech file when the manifest points at none (or at a file
+    defined elsewhere, such as a library).
+
+    Args:
+        application (dict): Current attributes of the <application> tag, or None
+        target_sdk (int): Target SDK version of the app
+        res_dir (str): The main res directory of the app module
+        fs: Filesystem the project lives on
+    """
+    fs = fs or LOCAL_FS
+    value = (application or {}).get(backup_attribute(target_sdk)) or ''
+    if value.startswith('@xml/') and fs.isfile(os.path.join(res_dir, 'xml', value[5:] + '.xml')):
+        return value[5:]
+    return backup_file_name(target_sdk)
+
+def _scan_rules(content):
+    """
+    Read the rule sections of backup rules content in one streaming expat pass.
+
+    content is decoded text or the buffer of a mapped file; it is fed to the parser in chunks,
+    so no tree is built however long the rules are. Offsets are returned in content's units.
+
+    Returns:
+        tuple: (root element name, sections), each section a dict with 'name', 'start' and 'end'
+        offsets of its start and end tags ('end' is None for an empty element), 'indent' of its
+        rules (None if it has none), and the (domain, path) 'includes' and 'excludes' it declares
+
+    Raises:
+        ValueError: If the content is not well-formed XML
+    """
+    from xml.parsers import expat
+
+    text = isinstance(content, str)
+    # Text is fed as UTF-8 whatever encoding its declaration names, since it is already decoded.
+    parser = expat.ParserCreate('utf-8' if text else None)
+    chunks = []
+    state = {'root': None, 'depth': 0, 'section': None, 'empty': False}
+    sections = []
+
+    def offset(byte_index):
+        if not text:
+            return byte_index
+        # Map a UTF-8 byte index back to a character offset through the chunk it fell in.
+        byte_start, char_start = chunks[bisect.bisect_right(chunks, (byte_index, len(content))) - 1]
+        prefix = content[char_start:char_start + _PARSE_CHUNK].encode('utf-8')[:byte_index - byte_start]
+        return char_start + len(prefix.decode('utf-8'))
+
+    def start(name, attributes):
+        state['depth'] += 1
+        state['empty'] = False
+        if state['depth'] == 1:
+            state['root'] = name
+        section = state['section']
+        if section is None:
+            if state['depth'] == 1 and name == 'full-backup-content' or \
+                    state['depth'] == 2 and state['root'] == 'data-extraction-rules' and name in DATA_EXTRACTION_SECTIONS:
+                state['section'] = {'name': name, 'depth': state['depth'], 'start': offset(parser.CurrentByteIndex),
+                                    'end': None, 'indent': None, 'includes': set(), 'excludes': set()}
+                state['empty'] = True
+        elif state['depth'] == section['depth'] + 1 and name in ('include', 'exclude'):
+            section[name + 's'].add((attributes.get('domain'), attributes.get('path') or '.'))
+            if section['indent'] is None:
+                section['indent'] = offset(parser.CurrentByteIndex)
+
+    def end(name):
+        section = state['section']
+        if section is not None and state['depth'] == section['depth']:
+            index = offset(parser.CurrentByteIndex)
+            # An empty element reports its end just past '/>' rather than at an end tag.
+            if not (state['empty'] and as_text(content[index - 2:index]) == '/>'):
+                section['end'] = index
+            sections.append(section)
+            state['section'] = None
+        state['depth'] -= 1
+        state['empty'] = False
+
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    try:
+        byte_index = 0
+        for position in range(0, len(content), _PARSE_CHUNK):
+            chunk = content[position:position + _PARSE_CHUNK]
+            if text:
+                chunk = chunk.encode('utf-8')
+                chunks.append((byte_index, position))
+                byte_index += len(chunk)
+            parser.Parse(chunk, False)
+        parser.Parse(b'', True)
+    except expat.ExpatError as e:
+        raise ValueError(f"Backup rules are not well-formed XML: {e}")
+    for section in sections:
+        if section['indent'] is not None:
+            section['indent'] = _indent_at(content, section['indent'])
+    return state['root'], sections
+
+def _indent_at(content, position):
+    """Return the whitespace a line starts with before position, or None if other text precedes it there."""
+    line_start = content.rfind('\n' if isinstance(content, str) else b'\n', 0, position) + 1
+    indent = as_text(content[line_start:position])
+    return indent if not indent.strip() else None
+
+def _covers(rules, domain, path):
+    return (domain, path) in rules or (domain, '.') in rules
+
+def inspect_backup_rules(content, attribute):
+    """
+    Check backup rules content for the Smartech shared preferences.
+
+    A rules section without any <include> already backs up every file it does not exclude;
+    once it has one, it backs up only what it includes. So a Smartech include is missing only
+    from sections that include other files, and an exclude of a Smartech file always wins.
+
+    Args:
+        content: Decoded rules text, or the buffer of a mapped file
+        attribute (str): The manifest attribute pointing at the rules (see backup_attribute)
+
+    Returns:
+        dict: 'sections' from the scan, 'missing' (section, (domain, path)) pairs and 'excluded'
+        (domain, path) includes the rules exclude
+
+    Raises:
+        ValueError: If the content is not well-formed, or not the kind of rules the attribute expects
+    """
+    root, sections = _scan_rules(content)
+    expected = RULES_ROOTS[attribute]
+    if root != expected:
+        raise ValueError(f"Backup rules start with <{root}>, but {attribute} expects <{expected}>")
+    missing = []
+    excluded = []
+    for section in sections:
+        for include in BACKUP_INCLUDES:
+            if _covers(section['excludes'], *include):
+                if include not in excluded:
+                    excluded.append(include)
+            elif section['includes'] and not _covers(section['includes'], *include):
+                missing.append((section, include))
+    return {'sections': sections, 'missing': missing, 'excluded': excluded}
+
+def missing_backup_includes(content, attribute):
+    """Return the Smartech (domain, path) includes missing from backup rules content."""
+    missing = []
+    for _, include in inspect_backup_rules(content, attribute)['missing']:
+        if include not in missing:
+            missing.append(include)
+    return missing
+
+def _include_edits(content, rules):
+    """Return the edits that add the includes inspect_backup_rules found missing, leaving every other rule as it is."""
+    edits = []
+    sections = {}
+    for section, (domain, path) in rules['missing']:
+        sections.setdefault(id(section), (section, []))[1].append(f'<include domain="{domain}" path="{path}"/>')
+    for section, includes in sections.values():
+        # Sections with a missing include already hold an <include>, so they have an end tag and an indent.
+        indent = section['indent'] if section['indent'] is not None else '    '
+        closing_indent = _indent_at(content, section['end'])
+        if closing_indent is not None:
+            position = section['end'] - len(closing_indent)
+            edits.append((position, position, ''.join(indent + include + '\n' for include in includes)))
+        else:
+            edits.append((section['end'], section['end'], ''.join('\n' + indent + include for include in includes) + '\n'))
+    return edits
+
+def merge_backup_includes(rules_path, attribute, fs=None):
+    """
+    Merge the Smartech shared preference includes into an existing backup rules file.
+
+    The file is read in one streaming pass and only the missing includes are inserted, so the
+    app's own rules, comments and formatting are kept and an up-to-date file is not rewritten.
+
+    Returns:
+        list: (domain, path) includes the rules exclude; the exclude wins, so those files are not backed up
+    """
+    fs = fs or LOCAL_FS
+    excluded = []
+
+    def plan(content):
+        rules = inspect_backup_rules(content, attribute)
+        excluded.extend(rules['excluded'])
+        return _include_edits(content, rules)
+
+    edit_file(fs, rules_path, plan)
+    return excluded
+
+def create_backup_xml_files(res_dir, target_sdk, manifest_path, fs=None):
+    """
+    Set up the backup rules the manifest points at for the target SDK version.
+
+    Rules the app already has are merged into; otherwise the Smartech rules file is created.
+    res_dir is the main res directory of the app module, as resolve_project_paths finds it.
+
+    Returns:
+        tuple: (path of the rules file, (domain, path) Smartech includes its rules exclude)
+    """
+    fs = fs or LOCAL_FS
     xml_dir = os.path.join(res_dir, "xml")
-    
+    application = parse_manifest(fs.read_text(manifest_path))['application']
+    backup_file_path = os.path.join(xml_dir, backup_rules_name(application, target_sdk, res_dir, fs) + '.xml')
+    if fs.isfile(backup_file_path):
+        return backup_file_path, merge_backup_includes(backup_file_path, backup_attribute(target_sdk), fs)
+
     # Create xml directory if it doesn't exist
-    os.makedirs(xml_dir, exist_ok=True)
+    fs.makedirs(xml_dir)
 
     # Create backup file for targetSdk < 31
     if target_sdk < 31:
-        backup_file_path = os.path.join(xml_dir, "my_backup_file.xml")
-        with open(backup_file_path, 'w') as f:
-            f.write("""<?xml version="1.0" encoding="utf-8"?>
+        fs.write_text(backup_file_path, """<?xml version="1.0" encoding="utf-8"?>
 <full-backup-content>
     <include domain="sharedpref" path="smt_guid_preferences.xml"/>
     <include domain="sharedpref" path="smt_preferences_guid.xml"/>
@@ -21,13 +242,12 @@ def create_backup_xml_files(project_dir, target_sdk, manifest_path):
 
     # Create backup file for targetSdk >= 31
     if target_sdk >= 31:
-        backup_file_path = os.path.join(xml_dir, "my_backup_file_31.xml")
-        with open(backup_file_path, 'w') as f:
-            f.write("""<?xml version="1.0" encoding="utf-8"?>
+        fs.write_text(backup_file_path, """<?xml version="1.0" encoding="utf-8"?>
 <data-extraction-rules>
       <cloud-backup disableIfNoEncryptionCapabilities="false">
        <include  domain="sharedpref" path="smt_guid_preferences.xml" />
        <include domain="sharedpref" path="smt_preferences_guid.xml" />
    </cloud-backup>
 </data-extraction-rules>
-""") 
\ No newline at end of file
+""")
+    return backup_file_path, []
@@ -0,0 +1,238 @@
+import hashlib
+import importlib
+import json
+import os
+import re
+import threading
+import time
+
+from .. import __version__
+from ..fs.fs_manager import apply_edits, cache_dir, replace_file, text_delta
+
+PATCH_CACHE_ENV = 'SMARTECH_PATCH_CACHE'
+MAX_BYTES_ENV = 'SMARTECH_PATCH_CACHE_MAX_MB'
+MAX_AGE_ENV = 'SMARTECH_PATCH_CACHE_MAX_DAYS'
+DEFAULT_MAX_MB = 64
+DEFAULT_MAX_DAYS = 30
+DISABLED = ('off', 'none', '0', 'false')
+# A store plugin is named as 'package.module:factory'; anything else is a directory.
+_PLUGIN = re.compile(r'^[A-Za-z_][\w.]*:[A-Za-z_]\w*$')
+# The store is pruned on the first write of a process and then after every this many writes.
+PRUNE_EVERY = 256
+
+_fingerprint = None
+
+def tool_fingerprint():
+    """Return a hash of the integrator version and its code, so a changed editor never reuses old patches."""
+    global _fingerprint
+    if _fingerprint is None:
+        digest = hashlib.sha256(__version__.encode('utf-8'))
+        archive = getattr(__loader__, 'archive', None)
+        if archive:
+            # Run from a zipapp: the archive holds all of the code.
+            with open(archive, 'rb') as f:
+                digest.update(f.read())
+            _fingerprint = digest.hexdigest()
+            return _fingerprint
+        package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        for root, dirs, files in os.walk(package_dir):
+            dirs[:] = sorted(d for d in dirs if d != '__pycache__')
+            for name in sorted(files):
+                if name.endswith(('.py', '.tmpl')):
+                    path = os.path.join(root, name)
+                    digest.update(os.path.relpath(path, package_dir).encode('utf-8') + b'\0')
+                    with open(path, 'rb') as f:
+                        digest.update(f.read())
+        _fingerprint = digest.hexdigest()
+    return _fingerprint
+
+class MemoryPatchStore:
+    """Patches held in a dict for the life of the process."""
+
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def put(self, key, data):
+        self.entries[key] = data
+
+    def prune(self, max_bytes, max_age):
+        pass
+
+class DirectoryPatchStore:
+    """
+    Patches stored one file per key under a directory, local or shared between hosts.
+
+    Entries are written to a temporary file and renamed into place, so concurrent writers and
+    readers on a shared directory never see a partial entry. A hit refreshes the entry's mtime,
+    which is the age eviction goes by.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key + '.json')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return data
+
+    def put(self, key, data):
+        try:
+            replace_file(self._path(key), data)
+        except OSError:
+            pass
+
+    def prune(self, max_bytes, max_age):
+        """Delete entries unused for max_age seconds, then the least recently used ones above max_bytes."""
+        entries = []
+        now = time.time()
+        try:
+            shards = list(os.scandir(self.root))
+        except OSError:
+            return
+        for shard in shards:
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                if now - st.st_mtime > max_age:
+                    _remove(entry.path)
+                else:
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            _remove(path)
+            total -= size
+
+def _remove(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+class PatchCache:
+    """
+    Content-addressed cache of the edits an editor makes to a file.
+
+    The key hashes the tool fingerprint, the editor name, its arguments and the input text, so
+    byte-identical inputs edited the same way get their patch by lookup. Only the edits are
+    stored, never a whole file.
+    """
+
+    def __init__(self, store, max_bytes=DEFAULT_MAX_MB * 1024 * 1024, max_age=DEFAULT_MAX_DAYS * 86400):
+        self.store = store
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def key(self, editor, args, content):
+        digest = hashlib.sha256()
+        for part in (tool_fingerprint(), editor, json.dumps(args, sort_keys=True, default=str)):
+            digest.update(part.encode('utf-8') + b'\0')
+        digest.update(content.encode('utf-8', 'surrogatepass'))
+        return digest.hexdigest()
+
+    def get(self, key):
+        data = self.store.get(key)
+        if data is None:
+            self.misses += 1
+            return None
+        try:
+            edits = [tuple(edit) for edit in json.loads(data.decode('utf-8'))['edits']]
+        except (ValueError, KeyError, TypeError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return edits
+
+    def put(self, key, edits):
+        self.store.put(key, json.dumps({'edits': edits}, separators=(',', ':')).encode('utf-8'))
+        with self._lock:
+            prune = self._writes % PRUNE_EVERY == 0
+            self._writes += 1
+        if prune:
+            self.store.prune(self.max_bytes, self.max_age)
+
+def _env_number(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+def _open_store(location):
+    if _PLUGIN.match(location):
+        module_name, _, factory = location.partition(':')
+        return getattr(importlib.import_module(module_name), factory)()
+    return DirectoryPatchStore(os.path.expanduser(location))
+
+_cache = None
+_configured = False
+
+def configure_patch_cache(location=None, store=None):
+    """
+    Set up the process-wide patch cache; returns it, or None when caching is off.
+
+    Args:
+        location (str): A directory (local or shared), 'package.module:factory' naming a callable
+            that returns a store with get(key), put(key, data) and prune(max_bytes, max_age), or
+            'off'; defaults to $SMARTECH_PATCH_CACHE, then a directory in the user cache
+        store: A store object to use directly instead of location
+    """
+    global _cache, _configured
+    location = location or os.environ.get(PATCH_CACHE_ENV) or cache_dir('patches')
+    if store is None and location.lower() in DISABLED:
+        _cache = None
+    else:
+        _cache = PatchCache(store or _open_store(location),
+                            int(_env_number(MAX_BYTES_ENV, DEFAULT_MAX_MB) * 1024 * 1024),
+                            _env_number(MAX_AGE_ENV, DEFAULT_MAX_DAYS) * 86400)
+    _configured = True
+    return _cache
+
+def patch_cache():
+    """Return the process-wide patch cache, configuring it from the environment on first use."""
+    return _cache if _configured else configure_patch_cache()
+
+def cached_edits(editor, args, content, plan):
+    """
+    Return plan(content), the edits an editor makes, reusing the patch cached for identical input.
+
+    Mapped buffers of large files are planned directly; they are never cached.
+    """
+    cache = patch_cache()
+    if cache is None or not isinstance(content, str):
+        return plan(content)
+    key = cache.key(editor, args, content)
+    edits = cache.get(key)
+    if edits is None:
+        edits = plan(content)
+        cache.put(key, [list(edit) for edit in edits])
+    return edits
+
+def cached_content(editor, args, content, transform):
+    """Return transform(content), reusing the patch cached for identical input; the patch is stored as one edit."""
+    if patch_cache() is None:
+        return transform(content)
+    return apply_edits(content, cached_edits(editor, args, content,
+                                             lambda content: _delta_edits(content, transform(content))))
+
+def _delta_edits(old, new):
+    return [] if new == old else [text_delta(old, new)]
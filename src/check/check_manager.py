@@ -0,0 +1,241 @@
+import os
+
+from ..application.application_manager import has_deeplink_registration, has_sdk_initialization, is_application_class
+from ..backup.backup_manager import backup_rules_name, inspect_backup_rules
+from ..deeplink.deeplink_manager import DEEPLINK_ACTION, find_action_handlers
+from ..fs.fs_manager import LOCAL_FS
+from ..gradle.gradle_manager import has_smartech_repository, parse_gradle
+from ..index.index_manager import SOURCE_EXTENSIONS, class_name_from_path, resolve_project_paths, source_language
+from ..manifest.manifest_manager import (backup_attribute, parse_manifest, plan_variant_manifests, qualified_name,
+                                         variant_manifest_paths)
+from ..maven.maven_manager import SMARTECH_SDK_VERSION, is_release, version_key
+from ..progress.progress_manager import Progress
+from ..push.push_manager import missing_push_handling, push_service_classes, resolve_push_service
+
+# Exit codes of the check command. These are part of the CLI contract; do not renumber.
+EXIT_OK = 0
+EXIT_DRIFT = 1
+EXIT_ERROR = 2
+
+def _item(item, path, status, message):
+    return {'item': item, 'file': path, 'status': status, 'message': message}
+
+def _setting(value):
+    return 'is not set' if value is None else f'is {value}'
+
+def check_application(content, path='application', deeplink_handled=False):
+    """Return drift items for the Application class content; deeplink_handled when deep links are received elsewhere."""
+    items = []
+    if not has_sdk_initialization(content):
+        items.append(_item('initialization', path, 'missing', 'Smartech initializeSdk call is missing'))
+    if not deeplink_handled and not has_deeplink_registration(content):
+        items.append(_item('receiver', path, 'missing', 'Deep link receiver registration is missing'))
+    return items
+
+def check_gradle(content, path='build.gradle', push=False):
+    """Return drift items for the app build.gradle(.kts) content."""
+    dependencies = parse_gradle(content)['dependencies']
+    artifacts = ['smartech-base', 'smartech-push'] if push else ['smartech-base']
+    items = []
+    for artifact in artifacts:
+        version = dependencies[artifact]
+        if version is None:
+            items.append(_item('dependency', path, 'missing', f'{artifact} dependency is missing'))
+        elif not is_release(version) or version_key(version) < version_key(SMARTECH_SDK_VERSION):
+            # New integrations may get a newer release than the pinned one, so only older versions are drift.
+            items.append(_item('dependency', path, 'outdated',
+                               f'{artifact} is {version}, expected {SMARTECH_SDK_VERSION} or newer'))
+    return items
+
+def check_manifest(content, path='AndroidManifest.xml', app_id=None, push=False):
+    """Return drift items for the meta-data values in AndroidManifest.xml content."""
+    meta_data = parse_manifest(content)['meta_data']
+    items = []
+    if meta_data.get('SMT_APP_ID') is None:
+        items.append(_item('meta-data', path, 'missing', 'SMT_APP_ID meta-data is missing'))
+    elif app_id and meta_data['SMT_APP_ID'] != app_id:
+        items.append(_item('meta-data', path, 'mismatch', f"SMT_APP_ID is {meta_data['SMT_APP_ID']}, expected {app_id}"))
+    names = ['SMT_IS_AUTO_FETCHED_LOCATION']
+    if push:
+        names.append('SMT_IS_AUTO_ASK_NOTIFICATION_PERMISSION')
+    for name in names:
+        if meta_data.get(name) is None:
+            items.append(_item('meta-data', path, 'missing', f'{name} meta-data is missing'))
+        elif meta_data[name] not in ('0', '1'):
+            items.append(_item('meta-data', path, 'invalid', f'{name} is {meta_data[name]}, expected 0 or 1'))
+    return items
+
+def _find_sources(src_dir, read, fs, progress, manifest, namespace):
+    """
+    Return the first Application source in walk order and the resolved push service, reading each file once.
+
+    The walk stops once the Application class and the class of the manifest's first MESSAGING_EVENT
+    service have been found, since that service wins whatever else the sources declare.
+    """
+    found = {'application': (None, None)}
+    sources = {}
+    wanted = [qualified_name(service['name'], namespace or manifest['package'])
+              for service in manifest['services'] if service['messaging'] and service['name']][:1]
+    declared = set()
+    paths = [os.path.join(root, file) for root, _, files in fs.walk(src_dir) for file in files if file.endswith(SOURCE_EXTENSIONS)]
+    with progress.phase('Checking sources', len(paths)):
+        for path in paths:
+            content = read(path)
+            progress.advance(len(content))
+            language = source_language(path)
+            if found['application'][0] is None and is_application_class(content):
+                found['application'] = (path, language)
+            sources[path] = {'language': language, 'push_services': push_service_classes(content, language)}
+            declared.update(sources[path]['push_services'])
+            if found['application'][0] and wanted and wanted[0] in declared:
+                break
+    found['push_service'] = resolve_push_service(sources, manifest, namespace)
+    return found
+
+def check_project(project_dir, app_id=None, index=None, fs=None, progress=None):
+    """
+    Report integration drift of a project without writing any file.
+
+    Every file is read at most once. The source walk stops as soon as both the
+    Application class and the push service the manifest registers have been found.
+
+    Args:
+        project_dir (str): Path to the Android project directory
+        app_id (str): Expected Smartech App ID; when omitted SMT_APP_ID is only checked for presence
+        index (ProjectIndex): Optional warm index whose cached reads and source index are reused
+        fs: Filesystem the project lives on (the index's, or the local disk by default)
+        progress (Progress): Receives the progress of the source scan and can cancel it
+
+    Returns:
+        list: Drift items, each a dict with 'item', 'file', 'status' and 'message' keys
+
+    Raises:
+        FileNotFoundError: If the manifest or app Gradle file is missing
+    """
+    fs = fs or (index.fs if index is not None else LOCAL_FS)
+    progress = progress or Progress()
+    contents = {}
+
+    def read(path):
+        if path not in contents:
+            if index is not None:
+                contents[path] = index.read(path)
+            else:
+                contents[path] = fs.read_text(path)
+        return contents[path]
+
+    def rel(path):
+        return os.path.relpath(path, project_dir)
+
+    paths = resolve_project_paths(project_dir, fs)
+    manifest_path, gradle_path = paths['manifest_path'], paths['gradle_path']
+    manifest_content = read(manifest_path)
+    gradle_content = read(gradle_path)
+    manifest = parse_manifest(manifest_content)
+    gradle = parse_gradle(gradle_content)
+
+    if index is not None:
+        sources = {'application': index.application_class(progress), 'push_service': index.push_service(progress)}
+    else:
+        sources = _find_sources(paths['src_dir'], read, fs, progress, manifest, gradle['namespace'])
+    app_class_path, language = sources['application']
+    push_service = sources['push_service']
+    push_class_path = push_service['path']
+    push = gradle['dependencies']['smartech-push'] is not None or push_class_path is not None
+
+    items = []
+    if paths['settings_path'] is None:
+        items.append(_item('repository', 'settings.gradle', 'missing', 'settings.gradle or settings.gradle.kts is missing'))
+    elif not has_smartech_repository(read(paths['settings_path'])):
+        items.append(_item('repository', rel(paths['settings_path']), 'missing', 'Smartech Maven repository is missing'))
+
+    items.extend(check_gradle(gradle_content, rel(gradle_path), push))
+    items.extend(check_manifest(manifest_content, rel(manifest_path), app_id, push))
+
+    application = manifest['application'] or {}
+    if app_class_path is None:
+        items.append(_item('application', rel(paths['src_dir']), 'missing', 'No Application class found'))
+    else:
+        app_content = read(app_class_path)
+        handled_elsewhere = False
+        if not has_deeplink_registration(app_content):
+            # Only then is the whole project searched for another receiver of the deep link broadcast.
+            if index is not None:
+                handled_elsewhere = bool(index.action_handlers(DEEPLINK_ACTION, progress))
+            else:
+                manifest_paths = [manifest_path] + list(variant_manifest_paths(paths['app_dir'], fs).values())
+                handled_elsewhere = bool(find_action_handlers(DEEPLINK_ACTION, paths['src_dir'], manifest_paths, fs,
+                                                              progress, read))
+        items.extend(check_application(app_content, rel(app_class_path), handled_elsewhere))
+        expected_name = class_name_from_path(app_class_path, paths['src_dir'])
+        if application.get('android:name') not in (expected_name, '.' + expected_name.split('.')[-1]):
+            items.append(_item('application', rel(manifest_path), 'mismatch',
+                               f"android:name {_setting(application.get('android:name'))}, expected {expected_name}"))
+        receiver_path = os.path.join(paths['src_dir'], 'DeeplinkReceiver' + ('.kt' if language == 'kotlin' else '.java'))
+        if not handled_elsewhere and not fs.exists(receiver_path):
+            items.append(_item('receiver', rel(receiver_path), 'missing', 'DeeplinkReceiver class is missing'))
+
+    if push:
+        if push_class_path is None:
+            items.append(_item('firebase-service', rel(paths['src_dir']), 'missing', 'No FirebaseMessagingService class found'))
+        else:
+            for call in missing_push_handling(read(push_class_path)):
+                items.append(_item('firebase-service', rel(push_class_path), 'missing', f'{call} call is missing'))
+            if not push_service['registered']:
+                items.append(_item('firebase-service', rel(manifest_path), 'missing',
+                                   f"{push_service['android_name']} is not registered for MESSAGING_EVENT"))
+
+    if application.get('android:allowBackup') != 'true':
+        items.append(_item('backup', rel(manifest_path), 'mismatch', 'android:allowBackup is not true'))
+    attribute = backup_attribute(gradle['target_sdk'])
+    backup_rules = backup_rules_name(application, gradle['target_sdk'], paths['res_dir'], fs)
+    expected_value = '@xml/' + backup_rules
+    if application.get(attribute) != expected_value:
+        items.append(_item('backup', rel(manifest_path), 'mismatch',
+                           f'{attribute} {_setting(application.get(attribute))}, expected {expected_value}'))
+    backup_path = os.path.join(paths['res_dir'], 'xml', backup_rules + '.xml')
+    if not fs.exists(backup_path):
+        items.append(_item('backup', rel(backup_path), 'missing', 'Backup rules file is missing'))
+    else:
+        try:
+            rules = inspect_backup_rules(read(backup_path), attribute)
+        except ValueError as e:
+            items.append(_item('backup', rel(backup_path), 'mismatch', str(e)))
+        else:
+            missing = []
+            for _, (_, path) in rules['missing']:
+                if path not in missing:
+                    missing.append(path)
+                    items.append(_item('backup', rel(backup_path), 'missing', f'Backup include for {path} is missing'))
+            for _, path in rules['excluded']:
+                items.append(_item('backup', rel(backup_path), 'mismatch', f'Backup rules exclude {path}'))
+
+    # A build-type or flavor manifest that overrides a Smartech setting hides it in the merged manifest.
+    if index is not None:
+        variants = index.variant_manifest_models()
+    else:
+        variants = {source_set: (path, parse_manifest(read(path)))
+                    for source_set, path in variant_manifest_paths(paths['app_dir'], fs).items()}
+    models = {source_set: model for source_set, (_, model) in variants.items()}
+    # An App ID a variant declares itself is treated as a deliberate per-variant ID.
+    variant_app_ids = {source_set: model['meta_data']['SMT_APP_ID'] for source_set, model in models.items()
+                       if model['meta_data'].get('SMT_APP_ID')}
+    for source_set, placement in plan_variant_manifests(manifest, models, variant_app_ids, gradle['namespace']).items():
+        path, model = variants[source_set]
+        for name, value in placement['meta_data'].items():
+            items.append(_item('variant', rel(path), 'mismatch',
+                               f"{name} is {model['meta_data'].get(name)}, hiding the main value {value}"))
+        for attribute, value in placement['application'].items():
+            items.append(_item('variant', rel(path), 'mismatch',
+                               f"{attribute} is {model['application'].get(attribute)}, hiding the main value {value}"))
+
+    return items
+
+def print_report(items):
+    """Print drift items in a human-readable form."""
+    if not items:
+        print("✅ Smartech integration is up to date.")
+        return
+    print(f"❌ Found {len(items)} integration issue(s):")
+    for item in items:
+        print(f"   - [{item['item']}] {item['file']}: {item['message']} ({item['status']})")
@@ -0,0 +1,351 @@
+import concurrent.futures
+import hashlib
+import json
+import os
+import re
+import zipfile
+
+from ..backup.backup_manager import backup_file_name, backup_rules_name
+from ..fs.fs_manager import LOCAL_FS, RealFileSystem, cache_dir, decode_text, replace_file
+from ..gradle.gradle_manager import parse_catalog_libraries, parse_dependency_coordinates, parse_included_projects
+from ..index.index_manager import ProjectIndex, class_name_from_path
+from ..manifest.manifest_manager import BACKUP_ATTRIBUTES, backup_attribute, parse_manifest, qualified_name
+from ..progress.progress_manager import Progress
+
+GRADLE_HOME_ENV = 'GRADLE_USER_HOME'
+SCAN_CACHE_VERSION = 1
+# <application> attributes the integration sets; a library declaring another value fails the manifest merge.
+MERGED_ATTRIBUTES = ('android:name',) + BACKUP_ATTRIBUTES
+# MESSAGING_EVENT services the Firebase and Smartech SDKs register themselves.
+SDK_SERVICE_PREFIXES = ('com.google.firebase.', 'com.netcore.android.')
+# Fewer cache misses than this are summarized in-process; starting worker processes would cost more.
+POOL_MIN_FILES = 8
+
+def gradle_home():
+    """Return the Gradle user home ($GRADLE_USER_HOME, else ~/.gradle)."""
+    return os.environ.get(GRADLE_HOME_ENV) or os.path.join(os.path.expanduser('~'), '.gradle')
+
+def summarize_manifest(content):
+    """Return the parts of a library manifest that can clash with the integration, as plain JSON data."""
+    manifest = parse_manifest(content)
+    application = manifest['application'] or {}
+    package = manifest['package']
+    summary = {attribute: application[attribute] for attribute in MERGED_ATTRIBUTES if attribute in application}
+    if 'android:name' in summary:
+        summary['android:name'] = qualified_name(summary['android:name'], package)
+    return {
+        'package': package,
+        'application': summary,
+        'messaging_services': [qualified_name(service['name'], package) for service in manifest['services']
+                               if service['messaging'] and service['name']],
+    }
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def summarize_manifest_file(path):
+    """
+    Summarize a manifest file or the manifest inside an AAR; runs in pool workers.
+
+    Returns:
+        tuple: ((mtime, size) key taken before reading, sha256 of the file, summary); the hash is
+        None when the file could not be read, and the summary then holds an 'error'
+    """
+    key = LOCAL_FS.stat_key(path)
+    try:
+        digest = _file_digest(path)
+        if path.endswith('.aar'):
+            with zipfile.ZipFile(path) as archive:
+                data = archive.read('AndroidManifest.xml')
+        else:
+            with open(path, 'rb') as f:
+                data = f.read()
+        return key, digest, summarize_manifest(decode_text(data, 'replace')[0])
+    except (OSError, KeyError, zipfile.BadZipFile) as e:
+        return key, None, {'error': str(e)}
+
+class ManifestScanCache:
+    """
+    Library manifest summaries persisted across runs, keyed by the sha256 of the file.
+
+    A path index of (mtime, size, sha256) answers unchanged files without reading them, so a
+    warm scan of the Gradle cache costs one stat per AAR. Summaries are stored once per
+    content hash, however many paths (Gradle homes, copies in CI caches) hold the same file.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or cache_dir('library-manifests.json')
+        self.files = {}
+        self.results = {}
+        self.dirty = False
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get('version') == SCAN_CACHE_VERSION:
+            self.files = data.get('files', {})
+            self.results = data.get('results', {})
+
+    def lookup(self, path):
+        """Return the cached summary of a local file, or None if it changed or was never scanned."""
+        entry = self.files.get(path)
+        key = LOCAL_FS.stat_key(path)
+        if entry is None or key is None or tuple(entry[:2]) != key:
+            return None
+        return self.results.get(entry[2])
+
+    def store(self, path, key, digest, summary):
+        self.files[path] = [key[0], key[1], digest]
+        self.results[digest] = summary
+        self.dirty = True
+
+    def save(self):
+        """Write the cache if it changed, dropping summaries no path refers to any more."""
+        if not self.dirty:
+            return
+        referenced = {entry[2] for entry in self.files.values()}
+        self.results = {digest: summary for digest, summary in self.results.items() if digest in referenced}
+        data = {'version': SCAN_CACHE_VERSION, 'files': self.files, 'results': self.results}
+        try:
+            replace_file(self.path, json.dumps(data, separators=(',', ':')).encode('utf-8'))
+        except OSError:
+            return
+        self.dirty = False
+
+def _version_key(version):
+    return [(1, int(part)) if part.isdigit() else (0, part) for part in re.split(r'[.-]', version)]
+
+def cached_aar(group, artifact, version=None, home=None):
+    """
+    Return the path of a dependency's AAR in the Gradle module cache, or None if it is not cached.
+
+    A missing or dynamic version ('1.+', '[1.0,2.0)') resolves to the newest cached version.
+    """
+    base = os.path.join(home or gradle_home(), 'caches', 'modules-2', 'files-2.1', group, artifact)
+    try:
+        versions = os.listdir(base)
+    except OSError:
+        return None
+    if version not in versions:
+        if version and not re.search(r'[+\[\](),]', version):
+            return None
+        if not versions:
+            return None
+        version = max(versions, key=_version_key)
+    file_name = f'{artifact}-{version}.aar'
+    version_dir = os.path.join(base, version)
+    try:
+        hashes = sorted(os.listdir(version_dir))
+    except OSError:
+        return None
+    for digest in hashes:
+        path = os.path.join(version_dir, digest, file_name)
+        if os.path.isfile(path):
+            return path
+    return None
+
+def _build_file(module_dir, fs):
+    for name in ('build.gradle.kts', 'build.gradle'):
+        path = os.path.join(module_dir, name)
+        if fs.isfile(path):
+            return path
+    return None
+
+def library_manifest_sources(paths, fs=None, home=None, include_aars=True):
+    """
+    List the library manifests merged into the app: other modules of the build and cached AARs.
+
+    Modules come from the include statements of settings.gradle(.kts). AARs are the direct
+    dependencies declared in the build files of every module and in gradle/libs.versions.toml,
+    looked up in the local Gradle cache; dependencies that are not cached are skipped.
+
+    Args:
+        paths (dict): resolve_project_paths() of the project
+        fs: Filesystem the project lives on
+        home (str): Gradle user home (default: gradle_home())
+        include_aars (bool): Also look up dependency AARs
+
+    Returns:
+        list: dicts with 'kind' ('module' or 'aar'), 'label' and 'file'
+    """
+    fs = fs or LOCAL_FS
+    project_dir = paths['project_dir']
+    module_dirs = {':app': paths['app_dir']}
+    if paths['settings_path'] is not None:
+        for name, directory in parse_included_projects(fs.read_text(paths['settings_path'], errors='replace')).items():
+            module_dirs.setdefault(name, os.path.normpath(os.path.join(project_dir, directory)))
+
+    sources = []
+    build_files = []
+    for name, module_dir in sorted(module_dirs.items()):
+        build_files.append(_build_file(module_dir, fs))
+        manifest = os.path.join(module_dir, 'src', 'main', 'AndroidManifest.xml')
+        if module_dir != paths['app_dir'] and fs.isfile(manifest):
+            sources.append({'kind': 'module', 'label': name, 'file': manifest})
+    if not include_aars:
+        return sources
+
+    coordinates = set()
+    for build_file in filter(None, build_files):
+        coordinates.update(parse_dependency_coordinates(fs.read_text(build_file, errors='replace')))
+    catalog = os.path.join(project_dir, 'gradle', 'libs.versions.toml')
+    if fs.isfile(catalog):
+        coordinates.update(parse_catalog_libraries(fs.read_text(catalog, errors='replace')))
+    seen = set()
+    for group, artifact, version in sorted(coordinates, key=lambda coordinate: tuple(part or '' for part in coordinate)):
+        path = cached_aar(group, artifact, version, home)
+        if path is not None and path not in seen:
+            seen.add(path)
+            version = os.path.basename(os.path.dirname(os.path.dirname(path)))
+            sources.append({'kind': 'aar', 'label': f'{group}:{artifact}:{version}', 'file': path})
+    return sources
+
+def _summarize_chunk(paths):
+    return [summarize_manifest_file(path) for path in paths]
+
+def _summarize_files(paths, workers=None):
+    """Yield summarize_manifest_file() of each path in order, from a process pool for larger batches."""
+    workers = workers or os.cpu_count() or 1
+    if workers < 2 or len(paths) < POOL_MIN_FILES:
+        for path in paths:
+            yield summarize_manifest_file(path)
+        return
+    chunk = max(1, len(paths) // (workers * 4))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=min(workers, len(paths))) as executor:
+        futures = [executor.submit(_summarize_chunk, paths[i:i + chunk]) for i in range(0, len(paths), chunk)]
+        try:
+            for future in futures:
+                for result in future.result():
+                    yield result
+        finally:
+            # When the scan is cancelled, chunks that have not started are dropped rather than waited for.
+            for future in futures:
+                future.cancel()
+
+def scan_library_manifests(paths, fs=None, home=None, include_aars=True, workers=None, cache=None, progress=None):
+    """
+    Summarize every library manifest of a project, in parallel and through the scan cache.
+
+    Files on the local disk that changed since the last scan are hashed and parsed in a process
+    pool; manifests of a project read from an archive or a git commit are parsed in-process.
+
+    Args:
+        paths (dict): resolve_project_paths() of the project
+        fs: Filesystem the project lives on
+        home (str): Gradle user home
+        include_aars (bool): Also scan dependency AARs from the Gradle cache
+        workers (int): Worker processes (default: one per CPU)
+        cache (ManifestScanCache): Cache to use (default: the persistent one)
+        progress (Progress): Receives the progress of the scan and can cancel it
+
+    Returns:
+        list: library_manifest_sources() entries, each with its 'summary' added
+    """
+    fs = fs or LOCAL_FS
+    progress = progress or Progress()
+    cache = cache if cache is not None else ManifestScanCache()
+    sources = library_manifest_sources(paths, fs, home, include_aars)
+    local = isinstance(fs, RealFileSystem)
+    pending = []
+    with progress.phase('Scanning library manifests', len(sources)):
+        for source in sources:
+            if source['kind'] == 'module' and not local:
+                source['summary'] = summarize_manifest(fs.read_text(source['file'], errors='replace'))
+                progress.advance()
+                continue
+            source['summary'] = cache.lookup(source['file'])
+            if source['summary'] is None:
+                pending.append(source)
+            else:
+                progress.advance()
+        try:
+            for source, (key, digest, summary) in zip(pending, _summarize_files([s['file'] for s in pending], workers)):
+                source['summary'] = summary
+                if digest is not None and key is not None:
+                    cache.store(source['file'], key, digest, summary)
+                progress.advance()
+        finally:
+            # Manifests summarized before a cancellation are kept for the next scan.
+            cache.save()
+    return sources
+
+def planned_application(target_sdk, app_class_name=None, backup_rules=None):
+    """
+    Return the <application> attributes modify_manifest sets; android:name is None when the class is not known yet.
+
+    backup_rules is the backup_rules_name() the integration points at, the Smartech one by default.
+    """
+    return {
+        'android:name': app_class_name,
+        'android:allowBackup': 'true',
+        backup_attribute(target_sdk): '@xml/' + (backup_rules or backup_file_name(target_sdk)),
+    }
+
+def _replaced_attributes(application):
+    """Return the attributes an app <application> tag overrides with tools:replace, or None for tools:node="replace"."""
+    if application.get('tools:node') == 'replace':
+        return None
+    return {name.strip() for name in application.get('tools:replace', '').split(',') if name.strip()}
+
+def library_conflicts(sources, planned, application=None, package=None):
+    """
+    Compare library manifests with what modify_manifest and register_firebase_service are about to write.
+
+    Args:
+        sources (list): scan_library_manifests() results
+        planned (dict): planned_application() attributes
+        application (dict): Current attributes of the app's <application> tag, for its tools:replace list
+        package (str): The app manifest package, used to qualify a relative android:name
+
+    Returns:
+        list: dicts with 'source', 'file', 'kind' ('attribute', 'service' or 'error') and 'message'
+    """
+    replaced = _replaced_attributes(application or {})
+    conflicts = []
+
+    def add(source, kind, message):
+        conflicts.append({'source': source['label'], 'file': source['file'], 'kind': kind, 'message': message})
+
+    for source in sources:
+        summary = source['summary']
+        if 'error' in summary:
+            add(source, 'error', f"could not read the manifest: {summary['error']}")
+            continue
+        if replaced is not None:
+            for attribute, ours in planned.items():
+                theirs = summary['application'].get(attribute)
+                if attribute == 'android:name' and ours:
+                    ours = qualified_name(ours, package)
+                if theirs is None or theirs == ours or attribute in replaced:
+                    continue
+                add(source, 'attribute', f"{attribute} is {theirs} but the integration sets "
+                                         f"{ours or 'the app Application class'}; the manifest merge will fail unless "
+                                         f"<application> declares tools:replace=\"{attribute}\"")
+        for service in summary['messaging_services']:
+            if not service.startswith(SDK_SERVICE_PREFIXES):
+                add(source, 'service', f"{service} also handles MESSAGING_EVENT; only one service receives "
+                                       "Firebase messages, so Smartech push handling may never run")
+    return conflicts
+
+def find_library_conflicts(project_dir, fs=None, home=None, include_aars=True, workers=None, progress=None):
+    """
+    Scan a project's library manifests against the integration it would receive.
+
+    Returns:
+        tuple: (number of library manifests scanned, library_conflicts() results)
+    """
+    index = ProjectIndex(project_dir, fs=fs)
+    paths = index.paths
+    app_class_path, _ = index.application_class(progress)
+    app_class_name = class_name_from_path(app_class_path, paths['src_dir']) if app_class_path else None
+    manifest = index.manifest_model()
+    sources = scan_library_manifests(paths, index.fs, home, include_aars, workers, progress=progress)
+    target_sdk = index.gradle_model()['target_sdk']
+    backup_rules = backup_rules_name(manifest['application'], target_sdk, paths['res_dir'], index.fs)
+    planned = planned_application(target_sdk, app_class_name, backup_rules)
+    return len(sources), library_conflicts(sources, planned, manifest['application'], manifest['package'])
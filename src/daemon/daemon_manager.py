@@ -0,0 +1,226 @@
+import json
+import os
+import socket
+import socketserver
+import tempfile
+
+# The integration engine is imported by the functions that run requests, not at module load:
+# a client whose request a running daemon answers needs only the socket and json modules.
+SOCKET_ENV = 'SMARTECH_INTEGRATOR_SOCKET'
+PROTOCOL_VERSION = 1
+
+def default_socket_path():
+    """Return the Unix socket path used by the daemon and its clients."""
+    return os.environ.get(SOCKET_ENV) or os.path.join(tempfile.gettempdir(), f'smartech-integrator-{os.getuid()}.sock')
+
+class DaemonState:
+    """Warm state shared across requests: one file cache and one index per project."""
+
+    def __init__(self):
+        from ..index.index_manager import FileCache
+
+        self.cache = FileCache()
+        self.projects = {}
+        self.requests = 0
+
+    def index(self, project_dir):
+        from ..fs.fs_manager import LOCAL_FS, open_project
+        from ..index.index_manager import FileCache, ProjectIndex
+
+        project_dir = os.path.realpath(project_dir)
+        if project_dir not in self.projects:
+            fs, root = open_project(project_dir)
+            # Archived snapshots get their own cache, keyed by the archive members' stat keys.
+            cache = self.cache if fs is LOCAL_FS else FileCache(fs)
+            self.projects[project_dir] = ProjectIndex(root, cache)
+        return self.projects[project_dir]
+
+    def git_index(self, repo_dir, rev, subdir=''):
+        """Return the index of a project inside a commit; only the latest commit per repository is kept."""
+        from ..git.git_manager import open_git_project, resolve_commit
+        from ..index.index_manager import ProjectIndex
+
+        repo_dir = os.path.realpath(repo_dir)
+        commit = resolve_commit(repo_dir, rev)
+        key = ('git', repo_dir, commit, subdir)
+        if key not in self.projects:
+            for stale in [k for k in self.projects if k[:2] == ('git', repo_dir)]:
+                self.projects.pop(stale).fs.close()
+            fs, project_dir = open_git_project(repo_dir, commit, subdir)
+            self.projects[key] = ProjectIndex(project_dir, fs=fs)
+        return self.projects[key]
+
+def dispatch_request(request, state, progress=None):
+    """
+    Execute one protocol request against the given state.
+
+    Requests are dicts with an 'op' of ping, stats, plan, check or apply. Project operations
+    also take 'project_dir', 'app_id' and an optional 'options' dict of integration answers;
+    apply with 'dry_run' edits an in-memory overlay and returns the diff instead of writing.
+    With 'git_rev' (and optional 'subdir') the project is read from that commit of the
+    repository at 'project_dir'; apply then commits the result to 'branch'. A local project is
+    locked for the request, exclusively for apply, waiting up to 'lock_timeout' seconds.
+
+    An in-process caller can pass a Progress to follow the run and cancel it; a cancelled run
+    answers with 'cancelled' set.
+    """
+    from ..cache.cache_manager import patch_cache
+    from ..fs.fs_manager import is_archive
+    from ..lock.lock_manager import ProjectLock
+    from ..progress.progress_manager import Cancelled
+
+    state.requests += 1
+    op = request.get('op')
+    try:
+        if op == 'ping':
+            return {'ok': True, 'result': {'protocol': PROTOCOL_VERSION, 'pid': os.getpid()}}
+        if op == 'stats':
+            return {'ok': True, 'result': {
+                'requests': state.requests,
+                'projects': len(state.projects),
+                'cached_files': len(state.cache),
+                'cache_hits': state.cache.hits,
+                'cache_misses': state.cache.misses,
+                'patch_cache_hits': patch_cache().hits if patch_cache() else 0,
+                'patch_cache_misses': patch_cache().misses if patch_cache() else 0,
+            }}
+        if op not in ('plan', 'check', 'apply'):
+            return {'ok': False, 'error': f'Unknown operation: {op}'}
+        project_dir = request.get('project_dir')
+        if not project_dir or not (os.path.isdir(project_dir) or is_archive(project_dir)):
+            return {'ok': False, 'error': f'Project directory does not exist: {project_dir}'}
+        git_rev = request.get('git_rev')
+        # Runs that write take the project lock exclusively, read-only ones share it; commits and snapshots need none.
+        locked = not git_rev and os.path.isdir(project_dir)
+        exclusive = op == 'apply' and not request.get('dry_run')
+        with ProjectLock(project_dir if locked else None, exclusive, request.get('lock_timeout')) as lock:
+            response = _dispatch_project(request, state, op, project_dir, git_rev, progress)
+        warning = lock.stale_warning()
+        if warning and 'log' in response.get('result', {}):
+            response['result']['log'] = warning + '\n' + response['result']['log']
+        return response
+    except Cancelled as e:
+        return {'ok': False, 'error': f'Cancelled: {e}', 'cancelled': True}
+    except Exception as e:
+        return {'ok': False, 'error': str(e)}
+
+def _dispatch_project(request, state, op, project_dir, git_rev, progress):
+    from ..check.check_manager import check_project
+    from ..main.operations import apply_integration, commit_integration, plan_integration, preview_integration
+
+    if git_rev:
+        index = state.git_index(project_dir, git_rev, request.get('subdir') or '')
+    else:
+        index = state.index(project_dir)
+    app_id = request.get('app_id')
+    if op == 'plan':
+        return {'ok': True, 'result': {'steps': plan_integration(index, app_id, request.get('options'), progress)}}
+    if op == 'check':
+        problems = check_project(index.project_dir, app_id, index=index, progress=progress)
+        return {'ok': True, 'result': {'integrated': not problems, 'problems': problems}}
+    if not app_id:
+        return {'ok': False, 'error': 'App ID cannot be empty'}
+    if request.get('dry_run'):
+        success, log, diff = preview_integration(index, app_id, request.get('options'), progress)
+        return {'ok': success, 'result': {'log': log, 'diff': diff}}
+    if git_rev:
+        if not request.get('branch'):
+            return {'ok': False, 'error': 'A branch is required to commit the integration'}
+        success, log, commit = commit_integration(index, app_id, request.get('options'), request['branch'],
+                                                  request.get('message'), progress)
+        return {'ok': success, 'result': {'log': log, 'commit': commit, 'branch': request['branch']}}
+    success, log = apply_integration(index, app_id, request.get('options'), progress)
+    return {'ok': success, 'result': {'log': log}}
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Read newline-delimited JSON requests and answer each with one JSON line."""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line.decode('utf-8'))
+            except ValueError as e:
+                response = {'ok': False, 'error': f'Invalid request: {e}'}
+            else:
+                if request.get('op') == 'shutdown':
+                    self.wfile.write(b'{"ok": true}\n')
+                    self.server.shutdown_requested = True
+                    return
+                response = dispatch_request(request, self.server.state)
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+class IntegratorServer(socketserver.UnixStreamServer):
+    """Unix socket server that serves requests one at a time against warm state."""
+
+    def __init__(self, socket_path):
+        self.state = DaemonState()
+        self.shutdown_requested = False
+        socketserver.UnixStreamServer.__init__(self, socket_path, _RequestHandler)
+
+def serve(socket_path=None):
+    """Run the integrator daemon until a shutdown request or Ctrl-C."""
+    socket_path = socket_path or default_socket_path()
+    if os.path.exists(socket_path):
+        if send_request({'op': 'ping'}, socket_path) is not None:
+            raise RuntimeError(f'A daemon is already listening on {socket_path}')
+        os.unlink(socket_path)
+    server = IntegratorServer(socket_path)
+    os.chmod(socket_path, 0o600)
+    print(f"🛠  Smartech integrator daemon listening on {socket_path}")
+    server.timeout = 0.5
+    try:
+        while not server.shutdown_requested:
+            server.handle_request()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+    print("Daemon stopped.")
+
+def send_request(request, socket_path=None, timeout=None):
+    """Send one request to a running daemon; return None when no daemon is reachable."""
+    socket_path = socket_path or default_socket_path()
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(timeout)
+    try:
+        client.connect(socket_path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        client.close()
+        return None
+    with client, client.makefile('rwb') as stream:
+        stream.write(json.dumps(request).encode('utf-8') + b'\n')
+        stream.flush()
+        line = stream.readline()
+    if not line:
+        return None
+    return json.loads(line.decode('utf-8'))
+
+def run_request(request, socket_path=None, use_daemon=True, progress=None):
+    """Run a request on the daemon if one is running, otherwise in-process, where progress is reported to progress."""
+    if use_daemon:
+        response = send_request(request, socket_path)
+        if response is not None:
+            return response
+    if request.get('op') == 'check' and not request.get('git_rev') and request.get('project_dir') and os.path.exists(request['project_dir']):
+        from ..check.check_manager import check_project
+        from ..fs.fs_manager import open_project
+        from ..lock.lock_manager import ProjectLock, ProjectLockTimeout
+        from ..progress.progress_manager import Cancelled
+
+        # A one-shot check is cheaper without building an index: it stops walking once both classes are found.
+        locked = os.path.isdir(request['project_dir'])
+        try:
+            with ProjectLock(request['project_dir'] if locked else None, False, request.get('lock_timeout')):
+                fs, project_dir = open_project(request['project_dir'])
+                problems = check_project(project_dir, request.get('app_id'), fs=fs, progress=progress)
+        except Cancelled as e:
+            return {'ok': False, 'error': f'Cancelled: {e}', 'cancelled': True}
+        except (OSError, ProjectLockTimeout) as e:
+            return {'ok': False, 'error': str(e)}
+        return {'ok': True, 'result': {'integrated': not problems, 'problems': problems}}
+    return dispatch_request(request, DaemonState(), progress)
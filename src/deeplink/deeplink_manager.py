@@ -1,74 +1,108 @@
 import os
 
-def create_deeplink_receiver(src_dir, language, application_id):
-    """Create a deep link receiver class if it doesn't exist."""
-    path = os.path.join(src_dir, "DeeplinkReceiver.kt" if language == 'kotlin' else "DeeplinkReceiver.java")
-    if os.path.exists(path):
-        return
-        
-    if language == 'kotlin':
-        content = f"""
-package {application_id}
+from ..fs.fs_manager import LOCAL_FS
+from ..guard.guard_manager import guarded_finditer, register_pattern
+from ..locator.locator_manager import get_source_map
+from ..manifest.manifest_manager import parse_manifest
+from ..progress.progress_manager import Progress
+from ..templates.template_manager import render_template
+from ..validate.validate_manager import write_source
+
+# Broadcast the Smartech SDK sends when a push or inbox notification with a deep link is clicked.
+DEEPLINK_ACTION = 'com.smartech.EVENT_PN_INBOX_CLICK'
+
+RECEIVER_CLASS = register_pattern('deeplink: receiver class declaration',
+                                  r'\bclass\s+(\w+)\s*(?:\([^()]*\)\s*)?:\s*(?:[\w.]+\.)?BroadcastReceiver\s*\('
+                                  r'|\bclass\s+(\w+)\s+extends\s+(?:[\w.]+\.)?BroadcastReceiver\b')
+REGISTER_RECEIVER_CALL = register_pattern('deeplink: registerReceiver call', r'\bregisterReceiver\s*\(')
+FILTER_ACTION = register_pattern('deeplink: intent filter action', r'\b(?:IntentFilter|addAction)\s*\(\s*"([\w.$-]+)"')
+NO_RECEIVERS = {'receivers': (), 'actions': ()}
+
+def receiver_facts(content, language='java'):
+    """
+    Return what a source file does to receive broadcasts, as kept in the project index.
 
-import android.content.BroadcastReceiver
-import android.content.Context
-import android.content.Intent
-import android.util.Log
-import com.netcore.android.*
+    Returns:
+        dict: 'receivers', the BroadcastReceiver subclasses the file declares, and 'actions', the
+        literal actions of the intent filters it builds when it also calls registerReceiver;
+        declarations and calls inside comments or strings do not count
+    """
+    if 'BroadcastReceiver' not in content and 'registerReceiver' not in content:
+        return NO_RECEIVERS
+    source_map = get_source_map(content, language)
+    receivers = tuple(match.group(1) or match.group(2) for match in guarded_finditer(RECEIVER_CLASS, content)
+                      if source_map.is_code(match.start()))
+    actions = ()
+    if any(source_map.is_code(match.start()) for match in guarded_finditer(REGISTER_RECEIVER_CALL, content)):
+        actions = tuple(sorted({match.group(1) for match in guarded_finditer(FILTER_ACTION, content)
+                                if source_map.is_code(match.start())}))
+    if not receivers and not actions:
+        return NO_RECEIVERS
+    return {'receivers': receivers, 'actions': actions}
 
-class DeeplinkReceiver : BroadcastReceiver() {{
-    override fun onReceive(context: Context?, intent: Intent?) {{
-        try {{
-            val bundleExtra = intent?.extras
-            bundleExtra?.let {{
-                val deepLinkSource = it.getString(SMTBundleKeys.SMT_KEY_DEEPLINK_SOURCE)
-                val deepLink = it.getString(SMTBundleKeys.SMT_KEY_DEEPLINK)
-                val customPayload = it.getString(SMTBundleKeys.SMT_KEY_CUSTOM_PAYLOAD)
-                if (deepLink != null && deepLink.isNotEmpty()) {{
-                    // handle deepLink
-                }}
-                if (customPayload != null && customPayload.isNotEmpty()) {{
-                    // handle custom payload
-                }}
-            }}
-        }} catch (t: Throwable) {{
-            Log.e("DeeplinkReceiver", "Error occurred in deeplink:${{t.localizedMessage}}")
-        }}
-    }}
-}}
-"""
-    else:
-        content = f"""
-package {application_id};
+def action_handlers(action, sources, manifests):
+    """
+    Join the receiver facts of the sources with the manifests' <receiver> entries for one broadcast action.
 
-import android.content.BroadcastReceiver;
-import android.content.Context;
-import android.content.Intent;
-import android.os.Bundle;
-import android.util.Log;
-import com.netcore.android.*;
+    Args:
+        action (str): Broadcast action, such as DEEPLINK_ACTION
+        sources (dict): source path -> record with receiver_facts() 'receivers' and 'actions'
+        manifests (dict): manifest path -> parse_manifest model
 
-public class DeeplinkReceiver extends BroadcastReceiver {{
-    @Override
-    public void onReceive(Context context, Intent intent) {{
-        try {{
-            Bundle bundleExtra = intent.getExtras();
-            if (bundleExtra != null) {{
-                String deepLinkSource = bundleExtra.getString(SMTBundleKeys.SMT_KEY_DEEPLINK_SOURCE);
-                String deepLink = bundleExtra.getString(SMTBundleKeys.SMT_KEY_DEEPLINK);
-                String customPayload = bundleExtra.getString(SMTBundleKeys.SMT_KEY_CUSTOM_PAYLOAD);
-                if (deepLink != null && !deepLink.isEmpty()) {{
-                    // handle deepLink
-                }}
-                if (customPayload != null && !customPayload.isEmpty()) {{
-                    // handle custom payload
-                }}
-            }}
-        }} catch (Throwable t) {{
-            Log.e("DeeplinkReceiver", "Error occurred in deeplink:" + t.getLocalizedMessage());
-        }}
-    }}
-}}
-"""
-    with open(path, 'w') as f:
-        f.write(content) 
\ No newline at end of file
+    Returns:
+        list: Where the action is already received, as dicts with 'kind' ('manifest' for a
+        <receiver> intent filter, 'registration' for a registerReceiver call site), 'file' (the
+        manifest or the registering source) and 'receiver' (the class name, or None); a manifest
+        receiver's 'source' is its class file when it is declared in the sources
+    """
+    classes = {}
+    for path, record in sources.items():
+        for name in record['receivers']:
+            classes.setdefault(name, path)
+    handlers = []
+    for path, manifest in sorted(manifests.items()):
+        for receiver in manifest['receivers']:
+            if action in receiver['actions']:
+                name = (receiver['name'] or '').split('.')[-1] or None
+                handlers.append({'kind': 'manifest', 'file': path, 'receiver': receiver['name'],
+                                 'source': classes.get(name)})
+    for path, record in sources.items():
+        if action in record['actions']:
+            handlers.append({'kind': 'registration', 'file': path, 'receiver': None, 'source': path})
+    return handlers
+
+def find_action_handlers(action, src_dir, manifest_paths, fs=None, progress=None, read=None):
+    """
+    Return action_handlers() for a project without an index, walking and reading its sources once.
+
+    Args:
+        action (str): Broadcast action
+        src_dir (str): Source root to walk
+        manifest_paths (list): Main and variant AndroidManifest.xml paths; missing ones are skipped
+        fs: Filesystem the project lives on
+        progress (Progress): Receives the progress of the walk and can cancel it
+        read: Optional callable returning a file's content, to share reads with the caller
+    """
+    fs = fs or LOCAL_FS
+    progress = progress or Progress()
+    read = read or fs.read_text
+    paths = [os.path.join(root, file) for root, _, files in fs.walk(src_dir)
+             for file in files if file.endswith(".java") or file.endswith(".kt")]
+    sources = {}
+    with progress.phase("Looking for broadcast receivers", len(paths)):
+        for path in paths:
+            content = read(path)
+            progress.advance(len(content))
+            sources[path] = receiver_facts(content, 'kotlin' if path.endswith('.kt') else 'java')
+    manifests = {path: parse_manifest(read(path)) for path in manifest_paths if fs.isfile(path)}
+    return action_handlers(action, sources, manifests)
+
+def create_deeplink_receiver(src_dir, language, application_id, target_sdk=None, fs=None):
+    """Create a deep link receiver class if it doesn't exist."""
+    fs = fs or LOCAL_FS
+    path = os.path.join(src_dir, "DeeplinkReceiver.kt" if language == 'kotlin' else "DeeplinkReceiver.java")
+    if fs.exists(path):
+        return
+        
+    content = render_template('deeplink_receiver', language, application_id, target_sdk)
+    write_source(path, content, language, fs=fs)
\ No newline at end of file
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import time
+
+from ..inventory.inventory_manager import iter_project_dirs
+from ..progress.progress_manager import Cancelled, Progress
+
+# Outcomes a resumed run does not repeat; 'error' (the run itself broke, e.g. a lock timeout) is retried.
+DONE_STATUSES = ('ok', 'failed')
+
+def parse_shard(value):
+    """Parse 'i/N' (1 <= i <= N) into (i, N)."""
+    index, _, count = value.partition('/')
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        raise ValueError(f"expected a shard as i/N, got {value!r}")
+    if not 1 <= index <= count:
+        raise ValueError(f"shard {value!r} is out of range: i must be between 1 and N")
+    return index, count
+
+def in_shard(key, shard):
+    """Return True if the project key falls in shard (i, N); the split depends on the key only."""
+    if shard is None:
+        return True
+    index, count = shard
+    return int(hashlib.sha1(key.encode('utf-8')).hexdigest()[:8], 16) % count == index - 1
+
+def iter_fleet_projects(source):
+    """
+    Yield (key, project_dir, app_id) for the projects of a fleet run.
+
+    The key is the project path relative to the checkout directory or list file, so every node
+    derives the same keys and shards from the same list. A list line may give the project's own
+    App ID after a tab; otherwise app_id is None.
+    """
+    base_dir = os.path.abspath(source if os.path.isdir(source) else os.path.dirname(source))
+    if os.path.isdir(source):
+        entries = ((project_dir, None) for project_dir in iter_project_dirs(source))
+    else:
+        entries = _list_entries(source, base_dir)
+    for project_dir, app_id in entries:
+        yield os.path.relpath(project_dir, base_dir), project_dir, app_id
+
+def _list_entries(path, base_dir):
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                project, _, app_id = line.partition('\t')
+                yield os.path.join(base_dir, project.strip()), app_id.strip() or None
+
+class Journal:
+    """
+    Append-only JSONL record of per-project outcomes.
+
+    Each record is appended with one write and fsynced, so a crash loses at most the project
+    in flight; a torn last line is ignored when the journal is read back. Completed keys are
+    held in a dict, so a resumed run skips a finished project with one lookup.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.outcomes = {}
+        self._fd = None
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        self.outcomes[record['project']] = record['status']
+                    except (ValueError, KeyError, TypeError):
+                        continue
+        except FileNotFoundError:
+            pass
+        return self
+
+    def done(self, key):
+        return self.outcomes.get(key) in DONE_STATUSES
+
+    def record(self, key, status, **details):
+        if self._fd is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            # End a line torn by a crash, so it does not swallow the first new record.
+            with open(self.path, 'rb') as f:
+                if f.seek(0, os.SEEK_END):
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b'\n':
+                        os.write(self._fd, b'\n')
+        record = dict(project=key, status=status, time=time.time(), **details)
+        os.write(self._fd, (json.dumps(record, separators=(',', ':')) + '\n').encode('utf-8'))
+        os.fsync(self._fd)
+        self.outcomes[key] = status
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+def run_fleet(source, app_id, options, journal_path=None, shard=None, resume=False, run=None, progress=None):
+    """
+    Integrate every project of a fleet, or of one shard of it, journaling each outcome.
+
+    Args:
+        source (str): Directory of checkouts, or a list file of project paths (optionally '<path>\\t<APP_ID>')
+        app_id (str): App ID for projects the list gives none for
+        options (dict): Integration answers, as for apply
+        journal_path (str): JSONL journal to append outcomes to
+        shard (tuple): (i, N) to take only the i-th of N deterministic shards
+        resume (bool): Skip projects the journal already records as ok or failed
+        run (callable): run(request) returning a protocol response; defaults to an in-process apply
+        progress (Progress): Counts each project as one file of a 'Fleet run' phase and takes the
+            per-project lines. Cancelling its token stops the project in flight at its next step,
+            journaled as an error, and then the run
+
+    Returns:
+        dict: Counts of 'ok', 'failed', 'error' and 'skipped' projects, and 'cancelled', True when
+              the run was stopped before the end
+    """
+    progress = progress or Progress()
+    if run is None:
+        from ..daemon.daemon_manager import run_request
+
+        # Each project gets its own phases, but shares the fleet's cancel token.
+        run = lambda request: run_request(request, use_daemon=False, progress=Progress(token=progress.token))
+    journal = Journal(journal_path) if journal_path else None
+    if journal and resume:
+        journal.load()
+    shard_name = f'{shard[0]}/{shard[1]}' if shard else None
+    counts = {'ok': 0, 'failed': 0, 'error': 0, 'skipped': 0, 'cancelled': False}
+    projects = [project for project in iter_fleet_projects(source) if in_shard(project[0], shard)]
+    try:
+        with progress.phase('Fleet run', len(projects)):
+            _run_projects(projects, app_id, options, journal, shard_name, resume, run, progress, counts)
+    except Cancelled:
+        counts['cancelled'] = True
+    finally:
+        if journal:
+            journal.close()
+    return counts
+
+def _run_projects(projects, app_id, options, journal, shard_name, resume, run, progress, counts):
+    for key, project_dir, project_app_id in projects:
+        if journal and resume and journal.done(key):
+            counts['skipped'] += 1
+            progress.advance()
+            continue
+        started = time.monotonic()
+        request = {'op': 'apply', 'project_dir': project_dir, 'app_id': project_app_id or app_id,
+                   'options': dict(options)}
+        try:
+            response = run(request)
+        except Exception as e:
+            response = {'ok': False, 'error': str(e)}
+        if response['ok']:
+            status, details = 'ok', {}
+            progress.message(f"✅ {key}")
+        elif 'error' in response:
+            # The run never got to integrate or was cancelled, e.g. a missing project or a lock timeout.
+            status, details = 'error', {'error': response['error']}
+            progress.message(f"❌ {key}: {response['error']}")
+        else:
+            status, details = 'failed', {}
+            progress.message(f"❌ {key}: integration failed")
+        counts[status] += 1
+        if journal:
+            journal.record(key, status, shard=shard_name, seconds=round(time.monotonic() - started, 3), **details)
+        # Stops the run here once it is cancelled; the project above is already journaled.
+        progress.advance()
@@ -0,0 +1,652 @@
+import codecs
+import contextlib
+import errno
+import mmap
+import os
+import shutil
+import signal
+import tempfile
+import threading
+
+# Byte order marks, longest first so UTF-32 is not mistaken for UTF-16.
+_BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32-le'),
+    (codecs.BOM_UTF32_BE, 'utf-32-be'),
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be'),
+)
+# Files that are not valid UTF-8 are read as Latin-1, which maps every byte to one character
+# and back, so untouched bytes survive an edit unchanged.
+FALLBACK_ENCODING = 'latin-1'
+# Local files at least this large are edited through a memory map instead of being read whole.
+LARGE_FILE_BYTES = 8 * 1024 * 1024
+_SCAN_CHUNK = 1024 * 1024
+CACHE_DIR_ENV = 'SMARTECH_CACHE_DIR'
+
+class ReadOnlyFileSystemError(OSError):
+    """Raised when writing to a read-only filesystem such as an archived project."""
+
+    def __init__(self, path):
+        OSError.__init__(self, errno.EROFS, 'Read-only project snapshot', path)
+
+def detect_format(data):
+    """
+    Detect how a file is stored.
+
+    Returns:
+        dict: 'encoding', 'bom' (bytes, possibly empty) and 'newline' (CRLF when most lines end in CRLF, else LF)
+    """
+    bom, encoding = b'', None
+    for mark, name in _BOMS:
+        if data.startswith(mark):
+            bom, encoding = mark, name
+            break
+    if encoding is None:
+        try:
+            data.decode('utf-8')
+            encoding = 'utf-8'
+        except UnicodeDecodeError:
+            encoding = FALLBACK_ENCODING
+    crlf = data.count('\r\n'.encode(encoding))
+    newline = '\r\n' if crlf and crlf * 2 >= data.count('\n'.encode(encoding)) else '\n'
+    return {'encoding': encoding, 'bom': bom, 'newline': newline}
+
+def decode_text(data, errors='strict'):
+    """Decode file bytes to text with LF line endings; returns (text, format)."""
+    text_format = detect_format(data)
+    text = data[len(text_format['bom']):].decode(text_format['encoding'], errors)
+    if '\r' in text:
+        text = text.replace('\r\n', '\n')
+    return text, text_format
+
+def encode_text(text, text_format=None):
+    """Encode LF-terminated text in a file's format (UTF-8 with LF line endings by default)."""
+    if text_format is None:
+        return text.encode('utf-8')
+    if text_format['newline'] != '\n':
+        text = text.replace('\n', text_format['newline'])
+    return text_format['bom'] + text.encode(text_format['encoding'])
+
+def _common_prefix(a, b):
+    """Length of the common prefix of two strings, found by comparing slices rather than characters."""
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[low:middle] == b[low:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+def _common_suffix(a, b, limit):
+    """Length of the common suffix of two strings, at most limit."""
+    low, high = 0, limit
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[len(a) - middle:len(a) - low] == b[len(b) - middle:len(b) - low]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+def text_delta(old, new):
+    """Return the single (start, end, text) edit that turns old into new."""
+    prefix = _common_prefix(old, new)
+    suffix = _common_suffix(old, new, min(len(old), len(new)) - prefix)
+    return prefix, len(old) - suffix, new[prefix:len(new) - suffix]
+
+def _line_offsets(data, text, text_format, start, end):
+    """Map the line-aligned text span [start, end) to byte offsets in data."""
+    encoding = text_format['encoding']
+    newlines = data.count(b'\n')
+    crlf = data.count(b'\r\n')
+    if crlf in (0, newlines):
+        # Uniform line endings: offsets follow from the encoded length of the text around the span.
+        extra = 1 if crlf else 0
+        head = len(text_format['bom']) + len(text[:start].encode(encoding)) + extra * text.count('\n', 0, start)
+        tail = len(data) - len(text[end:].encode(encoding)) - extra * text.count('\n', end)
+        return head, tail
+    # Mixed line endings: every LF in text is one LF byte in data, so count lines instead.
+    head = len(text_format['bom'])
+    for _ in range(text.count('\n', 0, start)):
+        head = data.index(b'\n', head) + 1
+    tail = len(data)
+    if end < len(text):
+        for _ in range(text.count('\n', end) + 1):
+            tail = data.rindex(b'\n', 0, tail)
+        tail += 1
+    return head, tail
+
+def splice_text(data, text, content, text_format):
+    """
+    Build the new bytes of a file by replacing only the lines an edit changed.
+
+    Args:
+        data (bytes): Current file contents
+        text (str): data decoded with decode_text
+        content (str): Edited text
+        text_format (dict): Format of data, as detect_format returns
+
+    Returns:
+        bytes: data with the changed lines encoded in the file's format and every other byte
+        copied unchanged, so mixed line endings and Latin-1 bytes outside the edit survive
+    """
+    if '\n'.encode(text_format['encoding']) != b'\n':
+        # UTF-16/32 newlines are several bytes wide; such sources are rare enough to re-encode whole.
+        return encode_text(content, text_format)
+    prefix = _common_prefix(text, content)
+    if prefix == len(text) == len(content):
+        return data
+    suffix = _common_suffix(text, content, min(len(text), len(content)) - prefix)
+    # Widen the changed span to whole lines so edited lines get the file's newline and the rest keep theirs.
+    start = text.rfind('\n', 0, prefix) + 1
+    end = text.find('\n', len(text) - suffix)
+    end = len(text) if end == -1 else max(end + 1, start)
+    head, tail = _line_offsets(data, text, text_format, start, end)
+    middle = content[start:len(content) - (len(text) - end)]
+    return data[:head] + encode_text(middle, dict(text_format, bom=b'')) + data[tail:]
+
+@contextlib.contextmanager
+def deferred_interrupts():
+    """
+    Hold back SIGINT until the block is done, then deliver it to the handler that was installed.
+
+    Wraps in-place writes, so Ctrl-C can never leave a file truncated or half written. Does
+    nothing outside the main thread, where signal handlers cannot be installed.
+    """
+    # getsignal() is None when the handler was not installed from Python; it could not be restored.
+    if threading.current_thread() is not threading.main_thread() or signal.getsignal(signal.SIGINT) is None:
+        yield
+        return
+    received = []
+    previous = signal.signal(signal.SIGINT, lambda signum, frame: received.append(frame))
+    try:
+        yield
+    finally:
+        signal.signal(signal.SIGINT, previous)
+    if received:
+        if callable(previous):
+            previous(signal.SIGINT, received[0])
+        elif previous == signal.SIG_DFL:
+            os.kill(os.getpid(), signal.SIGINT)
+
+class RealFileSystem:
+    """
+    The local disk.
+
+    Files are read as bytes and decoded with their detected encoding, BOM and line endings;
+    writes to an existing file splice only the changed lines into its current bytes, so an
+    edit never re-encodes or converts the rest of the file.
+    """
+
+    read_only = False
+
+    def read_text(self, path, errors='strict'):
+        with open(path, 'rb') as f:
+            return decode_text(f.read(), errors)[0]
+
+    def write_text(self, path, content):
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = None
+        if data is None:
+            new_data = encode_text(content)
+        else:
+            text, text_format = decode_text(data)
+            new_data = splice_text(data, text, content, text_format)
+            if new_data is data:
+                return
+        with deferred_interrupts():
+            with open(path, 'wb') as f:
+                f.write(new_data)
+
+    def exists(self, path):
+        return os.path.exists(path)
+
+    def isfile(self, path):
+        return os.path.isfile(path)
+
+    def isdir(self, path):
+        return os.path.isdir(path)
+
+    def listdir(self, path):
+        return os.listdir(path)
+
+    def makedirs(self, path):
+        os.makedirs(path, exist_ok=True)
+
+    def walk(self, top):
+        return os.walk(top)
+
+    def stat_key(self, path):
+        """Return the (mtime, size) key of a file, or None if it does not exist."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def close(self):
+        pass
+
+LOCAL_FS = RealFileSystem()
+
+def cache_dir(*names):
+    """Return a path under the persistent cache directory ($SMARTECH_CACHE_DIR, else the user cache directory)."""
+    base = os.environ.get(CACHE_DIR_ENV)
+    if not base:
+        base = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+                            'smartech-integrator')
+    return os.path.join(base, *names)
+
+def replace_file(path, data):
+    """Write bytes to a temporary file next to path and rename it into place, so readers never see a partial file."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    handle, temp_path = tempfile.mkstemp(prefix='.smartech-', dir=directory)
+    try:
+        with os.fdopen(handle, 'wb') as out:
+            out.write(data)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    os.replace(temp_path, path)
+
+def as_text(value):
+    """Return a matched fragment as text; fragments of a mapped buffer are bytes and are decoded."""
+    if isinstance(value, str):
+        return value
+    return value.decode('utf-8', 'surrogateescape').replace('\r\n', '\n')
+
+def find_text(content, text, start=0):
+    """str.find for text content or a mapped buffer."""
+    return content.find(text if isinstance(content, str) else text.encode('utf-8'), start)
+
+def rfind_text(content, text):
+    """str.rfind for text content or a mapped buffer."""
+    return content.rfind(text if isinstance(content, str) else text.encode('utf-8'))
+
+def apply_edits(content, edits):
+    """Apply (start, end, text) replacements to content, all offsets referring to the original content."""
+    parts = []
+    last = 0
+    for start, end, text in sorted(edits, key=lambda edit: edit[:2]):
+        parts.append(content[last:start])
+        parts.append(text)
+        last = end
+    parts.append(content[last:])
+    return ''.join(parts)
+
+class MappedFile:
+    """
+    A large local file mapped read-only, edited without loading it into Python objects.
+
+    Patterns run directly on the mapped buffer and the result is streamed to a temporary file
+    as slices of the mapping plus the inserted fragments, then renamed over the original, so
+    peak memory stays around one file size however many edits are made. Bytes are decoded
+    with surrogateescape, which keeps non-UTF-8 bytes in replaced fragments unchanged.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self.buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.newline = self._detect_newline()
+
+    def _detect_newline(self):
+        crlf = newlines = 0
+        for offset in range(0, len(self.buffer), _SCAN_CHUNK):
+            # Chunks overlap by one byte so a CRLF split across two of them is still counted.
+            chunk = self.buffer[max(0, offset - 1):offset + _SCAN_CHUNK]
+            crlf += chunk.count(b'\r\n')
+            newlines += chunk.count(b'\n') - (1 if offset and chunk.startswith(b'\n') else 0)
+        return '\r\n' if crlf and crlf * 2 >= newlines else '\n'
+
+    def encode(self, text):
+        if self.newline != '\n':
+            text = text.replace('\n', self.newline)
+        return text.encode('utf-8', 'surrogateescape')
+
+    def write(self, edits):
+        """Stream the file with (start, end, text) replacements applied and replace the original with it."""
+        handle, temp_path = tempfile.mkstemp(prefix='.smartech-', dir=os.path.dirname(os.path.abspath(self.path)))
+        view = memoryview(self.buffer)
+        try:
+            with os.fdopen(handle, 'wb') as out:
+                last = 0
+                for start, end, text in sorted(edits, key=lambda edit: edit[:2]):
+                    out.write(view[last:start])
+                    out.write(self.encode(text))
+                    last = end
+                out.write(view[last:])
+            shutil.copymode(self.path, temp_path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        finally:
+            view.release()
+        self.close()
+        os.replace(temp_path, self.path)
+
+    def close(self):
+        if not self.buffer.closed:
+            self.buffer.close()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def map_large_file(fs, path):
+    """Return a MappedFile for a large ASCII-compatible file on the local disk, or None to read it whole."""
+    if not isinstance(fs, RealFileSystem):
+        return None
+    try:
+        if os.path.getsize(path) < LARGE_FILE_BYTES:
+            return None
+        with open(path, 'rb') as f:
+            head = f.read(4)
+    except OSError:
+        return None
+    if any(head.startswith(mark) for mark, name in _BOMS if name != 'utf-8'):
+        return None
+    return MappedFile(path)
+
+def edit_file(fs, path, plan):
+    """
+    Apply the (start, end, text) edits plan(content) returns to a file.
+
+    plan receives the decoded text, or for a large local file the mapped buffer, which
+    supports the same slicing, find_text/rfind_text and guarded pattern calls; offsets in
+    its edits refer to whichever it was given. Nothing is written when plan returns no edits.
+    """
+    mapped = map_large_file(fs, path)
+    if mapped is None:
+        content = fs.read_text(path)
+        edits = plan(content)
+        if edits:
+            fs.write_text(path, apply_edits(content, edits))
+        return
+    with mapped:
+        edits = plan(mapped.buffer)
+        if edits:
+            mapped.write(edits)
+
+class TreeFileSystem:
+    """Shared directory bookkeeping for filesystems that keep their file list in memory."""
+
+    def __init__(self):
+        self._children = {}
+
+    @staticmethod
+    def _norm(path):
+        return os.path.normpath(os.path.abspath(path))
+
+    def _add_dir(self, path):
+        child = None
+        while True:
+            known = path in self._children
+            if not known:
+                self._children[path] = set()
+            if child is not None:
+                self._children[path].add(child)
+            parent = os.path.dirname(path)
+            if known or parent == path:
+                return
+            child, path = os.path.basename(path), parent
+
+    def _add_file(self, path):
+        parent = os.path.dirname(path)
+        self._add_dir(parent)
+        self._children[parent].add(os.path.basename(path))
+
+    def exists(self, path):
+        path = self._norm(path)
+        return path in self._children or self.isfile(path)
+
+    def isdir(self, path):
+        return self._norm(path) in self._children
+
+    def listdir(self, path):
+        path = self._norm(path)
+        if path not in self._children:
+            raise FileNotFoundError(errno.ENOENT, 'No such directory', path)
+        return sorted(self._children[path])
+
+    def walk(self, top):
+        top = self._norm(top)
+        if top not in self._children:
+            return
+        pending = [top]
+        while pending:
+            root = pending.pop()
+            names = sorted(self._children[root])
+            dirs = [name for name in names if os.path.join(root, name) in self._children]
+            files = [name for name in names if os.path.join(root, name) not in self._children]
+            yield root, dirs, files
+            pending.extend(os.path.join(root, name) for name in reversed(dirs))
+
+    def close(self):
+        pass
+
+class MemoryFileSystem(TreeFileSystem):
+    """
+    A writable filesystem held entirely in memory.
+
+    Args:
+        files (dict): Optional initial contents, absolute or relative path -> text
+    """
+
+    read_only = False
+
+    def __init__(self, files=None):
+        TreeFileSystem.__init__(self)
+        self.files = {}
+        self._versions = {}
+        self._clock = 0
+        for path, content in (files or {}).items():
+            path = self._norm(path)
+            self._add_file(path)
+            self._store(path, content)
+
+    def _store(self, path, content):
+        self._clock += 1
+        self.files[path] = content
+        self._versions[path] = self._clock
+
+    def read_text(self, path, errors='strict'):
+        path = self._norm(path)
+        if path not in self.files:
+            raise FileNotFoundError(errno.ENOENT, 'No such file', path)
+        return self.files[path]
+
+    def write_text(self, path, content):
+        path = self._norm(path)
+        if os.path.dirname(path) not in self._children:
+            raise FileNotFoundError(errno.ENOENT, 'No such directory', os.path.dirname(path))
+        self._add_file(path)
+        self._store(path, content)
+
+    def isfile(self, path):
+        return self._norm(path) in self.files
+
+    def makedirs(self, path):
+        self._add_dir(self._norm(path))
+
+    def stat_key(self, path):
+        path = self._norm(path)
+        if path not in self.files:
+            return None
+        return self._versions[path], len(self.files[path])
+
+class ArchiveFileSystem(TreeFileSystem):
+    """
+    A read-only view of a zip or tar archive, mounted at the archive's own path.
+
+    Only the member list is loaded up front; members are decompressed when read.
+    """
+
+    read_only = True
+
+    def __init__(self, archive_path):
+        TreeFileSystem.__init__(self)
+        self.archive_path = archive_path
+        self.mount = self._norm(archive_path)
+        self._members = {}
+        self._lock = threading.Lock()
+        self._children[self.mount] = set()
+        # Loaded here rather than at import: most runs work on checkouts and never need them.
+        import tarfile
+        import zipfile
+
+        self._zip = zipfile.is_zipfile(archive_path)
+        if self._zip:
+            self._archive = zipfile.ZipFile(archive_path)
+            for info in self._archive.infolist():
+                self._add_member(info.filename, info.is_dir(), info, (info.date_time, info.file_size))
+        else:
+            self._archive = tarfile.open(archive_path)
+            for info in self._archive.getmembers():
+                if info.isdir() or info.isfile():
+                    self._add_member(info.name, info.isdir(), info, (info.mtime, info.size))
+
+    def _add_member(self, name, is_dir, info, key):
+        path = self._norm(os.path.join(self.mount, name.lstrip('/')))
+        # A member outside the mount, or in a sibling directory sharing its prefix, is skipped.
+        if path != self.mount and not path.startswith(self.mount + os.sep):
+            return
+        if is_dir:
+            self._add_dir(path)
+        else:
+            self._add_file(path)
+            self._members[path] = (info, key)
+
+    def read_text(self, path, errors='strict'):
+        path = self._norm(path)
+        if path not in self._members:
+            raise FileNotFoundError(errno.ENOENT, 'No such file in archive', path)
+        info = self._members[path][0]
+        with self._lock:
+            if self._zip:
+                data = self._archive.read(info)
+            else:
+                data = self._archive.extractfile(info).read()
+        return decode_text(data, errors)[0]
+
+    def write_text(self, path, content):
+        raise ReadOnlyFileSystemError(path)
+
+    def makedirs(self, path):
+        if not self.isdir(path):
+            raise ReadOnlyFileSystemError(path)
+
+    def isfile(self, path):
+        return self._norm(path) in self._members
+
+    def stat_key(self, path):
+        member = self._members.get(self._norm(path))
+        return None if member is None else member[1]
+
+    def close(self):
+        self._archive.close()
+
+class OverlayFileSystem:
+    """
+    Copy-on-write view of another filesystem: reads fall through to the base, writes stay in memory.
+
+    Used for dry runs, which edit a project exactly like a real run and then report the
+    changed files without touching the base.
+    """
+
+    read_only = False
+
+    def __init__(self, base):
+        self.base = base
+        self.upper = MemoryFileSystem()
+
+    def read_text(self, path, errors='strict'):
+        if self.upper.isfile(path):
+            return self.upper.read_text(path)
+        return self.base.read_text(path, errors)
+
+    def write_text(self, path, content):
+        if not self.isdir(os.path.dirname(os.path.abspath(path))):
+            raise FileNotFoundError(errno.ENOENT, 'No such directory', os.path.dirname(path))
+        self.upper.makedirs(os.path.dirname(os.path.abspath(path)))
+        self.upper.write_text(path, content)
+
+    def exists(self, path):
+        return self.upper.exists(path) or self.base.exists(path)
+
+    def isfile(self, path):
+        return self.upper.isfile(path) or self.base.isfile(path)
+
+    def isdir(self, path):
+        return self.upper.isdir(path) or self.base.isdir(path)
+
+    def listdir(self, path):
+        names = set(self.upper.listdir(path)) if self.upper.isdir(path) else set()
+        if self.base.isdir(path):
+            names.update(self.base.listdir(path))
+        return sorted(names)
+
+    def makedirs(self, path):
+        self.upper.makedirs(path)
+
+    def walk(self, top):
+        if not self.isdir(top):
+            return
+        pending = [os.path.normpath(os.path.abspath(top))]
+        while pending:
+            root = pending.pop()
+            names = self.listdir(root)
+            dirs = [name for name in names if self.isdir(os.path.join(root, name))]
+            files = [name for name in names if not self.isdir(os.path.join(root, name))]
+            yield root, dirs, files
+            pending.extend(os.path.join(root, name) for name in reversed(dirs))
+
+    def stat_key(self, path):
+        key = self.upper.stat_key(path)
+        return ('overlay',) + key if key is not None else self.base.stat_key(path)
+
+    def changes(self):
+        """Return {path: (original content or None, new content)} for every file written and changed."""
+        changed = {}
+        for path, content in sorted(self.upper.files.items()):
+            original = self.base.read_text(path) if self.base.isfile(path) else None
+            if content != original:
+                changed[path] = (original, content)
+        return changed
+
+    def close(self):
+        self.base.close()
+
+def is_archive(path):
+    """Check whether a path is a zip or tar archive."""
+    if not os.path.isfile(path):
+        return False
+    import tarfile
+    import zipfile
+
+    return zipfile.is_zipfile(path) or tarfile.is_tarfile(path)
+
+def open_project(path):
+    """
+    Return (fs, project_dir) for a project directory or an archived project snapshot.
+
+    Archives whose members all sit under one top-level directory are opened at that
+    directory, so both `project.zip` layouts (with or without a root folder) work.
+    """
+    if not is_archive(path):
+        return LOCAL_FS, path
+    fs = ArchiveFileSystem(path)
+    project_dir = fs.mount
+    top = fs.listdir(project_dir)
+    if len(top) == 1 and 'app' not in top and fs.isdir(os.path.join(project_dir, top[0])):
+        project_dir = os.path.join(project_dir, top[0])
+    return fs, project_dir
@@ -0,0 +1,164 @@
+import os
+import subprocess
+import tempfile
+import threading
+
+from ..fs.fs_manager import ReadOnlyFileSystemError, TreeFileSystem, decode_text, encode_text, splice_text
+
+NULL_SHA = '0' * 40
+DEFAULT_COMMIT_MESSAGE = 'Integrate Smartech SDK'
+
+class GitError(RuntimeError):
+    """Raised when a git command fails."""
+
+def run_git(repo_dir, args, input=None, env=None):
+    """Run a git command in a repository and return its stripped stdout."""
+    process = subprocess.run(['git', '-C', repo_dir] + args, input=input, stdout=subprocess.PIPE,
+                             stderr=subprocess.PIPE, env=env)
+    if process.returncode != 0:
+        raise GitError(f"git {' '.join(args)} failed: {process.stderr.decode('utf-8', 'replace').strip()}")
+    return process.stdout.decode('utf-8').strip()
+
+def _rev_parse(repo_dir, rev):
+    process = subprocess.run(['git', '-C', repo_dir, 'rev-parse', '--verify', '--quiet', rev],
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    return process.stdout.decode('utf-8').strip() if process.returncode == 0 else None
+
+def resolve_commit(repo_dir, rev):
+    """Return the full commit hash a revision points at."""
+    commit = _rev_parse(repo_dir, rev + '^{commit}')
+    if commit is None:
+        raise GitError(f"Unknown revision {rev} in {repo_dir}")
+    return commit
+
+class GitTreeFileSystem(TreeFileSystem):
+    """
+    A read-only view of one commit of a git repository, without a checkout.
+
+    The file list comes from a single `git ls-tree -r` and file contents are streamed from
+    one long-lived `git cat-file --batch` process. The tree is mounted at the repository
+    path, so project paths look the same as in a worktree.
+    """
+
+    read_only = True
+
+    def __init__(self, repo_dir, rev='HEAD'):
+        TreeFileSystem.__init__(self)
+        self.repo_dir = repo_dir
+        self.mount = self._norm(repo_dir)
+        self.commit = resolve_commit(repo_dir, rev)
+        self.entries = {}
+        self._children[self.mount] = set()
+        self._batch = None
+        self._lock = threading.Lock()
+        listing = run_git(repo_dir, ['ls-tree', '-r', '-z', '--long', '--full-tree', self.commit])
+        for record in listing.split('\0'):
+            if not record:
+                continue
+            info, name = record.split('\t', 1)
+            mode, kind, sha, size = info.split()
+            if kind != 'blob':
+                continue
+            path = os.path.join(self.mount, name)
+            self._add_file(path)
+            self.entries[path] = (mode, sha, int(size))
+
+    def _read_blob(self, sha):
+        with self._lock:
+            if self._batch is None:
+                self._batch = subprocess.Popen(['git', '-C', self.repo_dir, 'cat-file', '--batch'],
+                                               stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+            self._batch.stdin.write(sha.encode('ascii') + b'\n')
+            self._batch.stdin.flush()
+            header = self._batch.stdout.readline().split()
+            if len(header) != 3:
+                raise GitError(f"git cat-file could not read {sha}")
+            data = self._batch.stdout.read(int(header[2]))
+            self._batch.stdout.read(1)
+        return data
+
+    def read_text(self, path, errors='strict'):
+        entry = self.entries.get(self._norm(path))
+        if entry is None:
+            raise FileNotFoundError(2, 'No such file in commit', path)
+        return decode_text(self._read_blob(entry[1]), errors)[0]
+
+    def write_text(self, path, content):
+        raise ReadOnlyFileSystemError(path)
+
+    def makedirs(self, path):
+        if not self.isdir(path):
+            raise ReadOnlyFileSystemError(path)
+
+    def isfile(self, path):
+        return self._norm(path) in self.entries
+
+    def stat_key(self, path):
+        entry = self.entries.get(self._norm(path))
+        return None if entry is None else (entry[1], entry[2])
+
+    def relative(self, path):
+        """Return a mounted path as a path inside the repository tree."""
+        return os.path.relpath(self._norm(path), self.mount).replace(os.sep, '/')
+
+    def close(self):
+        if self._batch is not None:
+            self._batch.stdin.close()
+            self._batch.wait()
+            self._batch = None
+
+def commit_changes(tree_fs, changes, branch, message=None):
+    """
+    Write changed files as a new commit on top of the tree's commit and point a branch at it.
+
+    Blobs are written with `git hash-object`, the tree is assembled in a temporary index
+    file and the branch is moved with a compare-and-swap `git update-ref`, so the worktree
+    and the repository's own index are never touched.
+
+    Args:
+        tree_fs (GitTreeFileSystem): The commit the changes were made against
+        changes (dict): path -> (original content or None, new content), as OverlayFileSystem.changes() returns
+        branch (str): Branch to create, or to advance if it currently points at the base commit
+        message (str): Commit message
+
+    Returns:
+        str: Hash of the new commit
+    """
+    repo_dir = tree_fs.repo_dir
+    ref = branch if branch.startswith('refs/') else 'refs/heads/' + branch
+    current = _rev_parse(repo_dir, ref)
+    if current is not None and current != tree_fs.commit:
+        raise GitError(f"{branch} exists and does not point at {tree_fs.commit[:12]}; choose another branch")
+
+    handle, index_file = tempfile.mkstemp(prefix='smartech-index-')
+    os.close(handle)
+    os.unlink(index_file)
+    env = dict(os.environ, GIT_INDEX_FILE=index_file)
+    try:
+        run_git(repo_dir, ['read-tree', tree_fs.commit], env=env)
+        index_info = []
+        for path, (_, content) in sorted(changes.items()):
+            entry = tree_fs.entries.get(tree_fs._norm(path))
+            if entry:
+                data = tree_fs._read_blob(entry[1])
+                text, text_format = decode_text(data)
+                data = splice_text(data, text, content, text_format)
+            else:
+                data = encode_text(content)
+            sha = run_git(repo_dir, ['hash-object', '-w', '--stdin'], input=data)
+            mode = entry[0] if entry else '100644'
+            index_info.append(f'{mode} {sha}\t{tree_fs.relative(path)}\n')
+        run_git(repo_dir, ['update-index', '--index-info'], input=''.join(index_info).encode('utf-8'), env=env)
+        tree = run_git(repo_dir, ['write-tree'], env=env)
+    finally:
+        if os.path.exists(index_file):
+            os.unlink(index_file)
+    commit = run_git(repo_dir, ['commit-tree', tree, '-p', tree_fs.commit, '-m', message or DEFAULT_COMMIT_MESSAGE])
+    run_git(repo_dir, ['update-ref', ref, commit, current or NULL_SHA])
+    return commit
+
+def open_git_project(repo_dir, rev='HEAD', subdir=''):
+    """Return (fs, project_dir) for a project inside a commit of a git repository."""
+    fs = GitTreeFileSystem(repo_dir, rev)
+    project_dir = os.path.join(fs.mount, subdir) if subdir else fs.mount
+    return fs, os.path.normpath(project_dir)
@@ -1,100 +1,295 @@
 import re
 import os
 
-def extract_target_sdk(gradle_path):
+from ..cache.cache_manager import cached_content, cached_edits
+from ..fs.fs_manager import LOCAL_FS, as_text, edit_file, find_text, map_large_file
+from ..guard.guard_manager import guarded_finditer, guarded_search, guarded_sub, register_pattern
+from ..maven.maven_manager import resolve_sdk_version
+
+SMARTECH_DEPENDENCY_PATTERN = r'com\.netcore\.android:(smartech-base|smartech-push):([^"\'\s)]+)'
+
+SMARTECH_DEPENDENCY = register_pattern('gradle: smartech dependency', SMARTECH_DEPENDENCY_PATTERN)
+TARGET_SDK = register_pattern('gradle: targetSdk', r'targetSdk(?:\s*=)?\s*(\d+)')
+APPLICATION_ID = register_pattern('gradle: applicationId', r'applicationId(?:\s*=)?\s*["\']([^"\'\n]+)["\']')
+NAMESPACE = register_pattern('gradle: namespace', r'\bnamespace(?:\s*=)?\s*["\']([^"\'\n]+)["\']')
+DEPENDENCIES_BLOCK = register_pattern('gradle: dependencies block', r'(dependencies\s*\{)')
+REPOSITORIES_BLOCK = register_pattern('settings: repositories block', r'(repositories\s*\{)')
+RESOLUTION_BLOCK = register_pattern('settings: dependencyResolutionManagement block', r'(dependencyResolutionManagement\s*\{)')
+# Groovy 'group: ..., name: ..., version: ...' and Kotlin 'group = ..., name = ..., version = ...' notation.
+SMARTECH_DEPENDENCY_MAP = register_pattern('gradle: smartech dependency map',
+                                           r'group\s*[:=]\s*["\']com\.netcore\.android["\']\s*,\s*'
+                                           r'name\s*[:=]\s*["\'](smartech-base|smartech-push)["\']\s*,\s*'
+                                           r'version\s*[:=]\s*["\']([^"\'\n]+)["\']')
+# "group:artifact[:version][@type]" string literals; the version is left out when a BOM or platform manages it.
+DEPENDENCY_COORDINATE = register_pattern('gradle: dependency coordinate',
+                                         r'["\']([\w.-]+):([\w.-]+)(?::([^"\'\s:@]+))?(?:@\w+)?["\']')
+INCLUDE_STATEMENT = register_pattern('settings: include', r'\binclude\b[ \t]*(\([^()]*\)|(?:[^\n]*,[ \t]*\n)*[^\n]*)')
+PROJECT_DIR = register_pattern('settings: projectDir',
+                               r'project\(\s*["\'](:?[\w.:-]+)["\']\s*\)\.projectDir\s*=\s*(?:file|new\s+File)\('
+                               r'\s*(?:(?:rootDir|settingsDir)\s*,\s*)?["\']([^"\'\n]+)["\']')
+
+def parse_gradle(content):
+    """Parse the values the integrator cares about out of build.gradle content."""
+    target_sdk = guarded_search(TARGET_SDK, content)
+    application_id = guarded_search(APPLICATION_ID, content)
+    namespace = guarded_search(NAMESPACE, content)
+    dependencies = {'smartech-base': None, 'smartech-push': None}
+    for match in SMARTECH_DEPENDENCY.finditer(content):
+        if dependencies[match.group(1)] is None:
+            dependencies[match.group(1)] = match.group(2)
+    return {
+        'target_sdk': int(target_sdk.group(1)) if target_sdk else 33,
+        'application_id': application_id.group(1) if application_id else None,
+        'namespace': namespace.group(1) if namespace else None,
+        'dependencies': dependencies,
+    }
+
+def parse_version_catalog(content):
+    """Return the Smartech library versions declared in a gradle/libs.versions.toml catalog."""
+    versions = {}
+    section = None
+    dependencies = {'smartech-base': None, 'smartech-push': None}
+    references = {}
+    for line in content.splitlines():
+        line = line.split('#', 1)[0].strip()
+        header = re.match(r'\[(\w+)\]$', line)
+        if header:
+            section = header.group(1)
+            continue
+        if section == 'versions':
+            match = re.match(r'([\w.-]+)\s*=\s*"([^"]+)"', line)
+            if match:
+                versions[match.group(1)] = match.group(2)
+        elif section == 'libraries':
+            artifact = re.search(r'com\.netcore\.android:(smartech-base|smartech-push)\b'
+                                 r'|name\s*=\s*"(smartech-base|smartech-push)"', line)
+            if not artifact:
+                continue
+            name = artifact.group(1) or artifact.group(2)
+            version = re.search(r'com\.netcore\.android:smartech-(?:base|push):([^"]+)"|\bversion\s*=\s*"([^"]+)"', line)
+            reference = re.search(r'version\.ref\s*=\s*"([^"]+)"', line)
+            if version:
+                dependencies[name] = version.group(1) or version.group(2)
+            elif reference:
+                references[name] = reference.group(1)
+    for name, reference in references.items():
+        dependencies[name] = versions.get(reference)
+    return dependencies
+
+def parse_catalog_libraries(content):
+    """Return (group, artifact, version or None) for every library declared in a version catalog."""
+    versions = {}
+    entries = []
+    section = None
+    for line in content.splitlines():
+        line = line.split('#', 1)[0].strip()
+        header = re.match(r'\[(\w+)\]$', line)
+        if header:
+            section = header.group(1)
+            continue
+        if section == 'versions':
+            match = re.match(r'([\w.-]+)\s*=\s*"([^"]+)"', line)
+            if match:
+                versions[match.group(1)] = match.group(2)
+        elif section == 'libraries':
+            notation = re.search(r'(?:=|\bmodule\s*=)\s*"([\w.-]+):([\w.-]+)(?::([^"]+))?"', line)
+            group = re.search(r'\bgroup\s*=\s*"([^"]+)"', line)
+            name = re.search(r'\bname\s*=\s*"([^"]+)"', line)
+            if notation:
+                coordinate = notation.groups()
+            elif group and name:
+                coordinate = (group.group(1), name.group(1), None)
+            else:
+                continue
+            version = re.search(r'\bversion\s*=\s*"([^"]+)"', line)
+            reference = re.search(r'version\.ref\s*=\s*"([^"]+)"', line)
+            entries.append((coordinate, version.group(1) if version else None, reference.group(1) if reference else None))
+    return [(group, artifact, version or literal or versions.get(reference))
+            for (group, artifact, version), literal, reference in entries]
+
+def smartech_version_sites(content):
+    """
+    Find the Smartech versions a build file declares.
+
+    Returns:
+        tuple: ((start, end, artifact, version) spans of literal versions,
+                (artifact, variable) pairs for versions interpolated from a variable such as $smartechVersion)
+    """
+    sites, references = [], []
+    for match in list(guarded_finditer(SMARTECH_DEPENDENCY, content)) + list(guarded_finditer(SMARTECH_DEPENDENCY_MAP, content)):
+        version = match.group(2)
+        if version.startswith('$'):
+            # ${rootProject.ext.smartechVersion} and $smartechVersion both name the variable smartechVersion.
+            references.append((match.group(1), version.strip('${}').rpartition('.')[2]))
+        else:
+            sites.append((match.start(2), match.end(2), match.group(1), version))
+    return sorted(sites), references
+
+def version_definition_sites(content, name, properties=False):
+    """
+    Return (start, end, value) spans where a build script or gradle.properties defines a version variable.
+
+    Covers 'def/val name = "..."', 'ext.name = ...' and ext blocks, 'val name by extra("...")',
+    extra["name"] = ... and set("name", ...) in build scripts, and 'name=...' lines in gradle.properties.
+    """
+    if properties:
+        pattern = r'^[ \t]*' + re.escape(name) + r'[ \t]*[=:][ \t]*([^\s#]+)'
+    else:
+        pattern = (r'(?:\b' + re.escape(name) + r'\s*=|\b' + re.escape(name) + r'\s+by\s+extra\(|'
+                   r'["\']' + re.escape(name) + r'["\']\s*(?:\]\s*=|,))'
+                   r'\s*["\']([^"\'\n$]+)["\']')
+    return [(m.start(1), m.end(1), m.group(1)) for m in re.finditer(pattern, content, re.MULTILINE)]
+
+def catalog_version_sites(content):
+    """
+    Find the Smartech versions a version catalog declares, following version.ref into [versions].
+
+    Returns:
+        tuple: ((start, end, artifact, version) spans, version.ref names that [versions] does not define)
+    """
+    section = None
+    versions = {}
+    sites, references = [], []
+    offset = 0
+    for line in content.splitlines(True):
+        code = line.split('#', 1)[0]
+        header = re.match(r'\s*\[(\w+)\]\s*$', code)
+        if header:
+            section = header.group(1)
+        elif section == 'versions':
+            match = re.match(r'\s*([\w.-]+)\s*=\s*"([^"]+)"', code)
+            if match:
+                versions[match.group(1)] = (offset + match.start(2), offset + match.end(2), match.group(2))
+        elif section == 'libraries':
+            artifact = re.search(r'com\.netcore\.android:(smartech-base|smartech-push)\b'
+                                 r'|name\s*=\s*"(smartech-base|smartech-push)"', code)
+            if artifact:
+                name = artifact.group(1) or artifact.group(2)
+                version = re.search(r'com\.netcore\.android:smartech-(?:base|push):([^"]+)"|\bversion\s*=\s*"([^"]+)"', code)
+                reference = re.search(r'version\.ref\s*=\s*"([^"]+)"', code)
+                if version:
+                    group = 1 if version.group(1) else 2
+                    sites.append((offset + version.start(group), offset + version.end(group), name, version.group(group)))
+                elif reference:
+                    references.append((name, reference.group(1)))
+        offset += len(line)
+    unresolved = []
+    for name, reference in references:
+        if reference in versions:
+            start, end, version = versions[reference]
+            sites.append((start, end, name, version))
+        else:
+            unresolved.append(reference)
+    return sorted(sites), unresolved
+
+def parse_dependency_coordinates(content):
+    """Return (group, artifact, version or None) for every dependency notation string in a build file."""
+    return [(m.group(1), m.group(2), m.group(3)) for m in guarded_finditer(DEPENDENCY_COORDINATE, content)]
+
+def parse_included_projects(content):
+    """
+    Return the projects a settings.gradle(.kts) includes.
+
+    Returns:
+        dict: Gradle project path (':feature:login') -> directory relative to the root ('feature/login')
+    """
+    projects = {}
+    for statement in guarded_finditer(INCLUDE_STATEMENT, content):
+        for name in re.findall(r'["\'](:?[\w.-]+(?::[\w.-]+)*)["\']', statement.group(1)):
+            name = name if name.startswith(':') else ':' + name
+            projects[name] = name[1:].replace(':', '/')
+    for match in guarded_finditer(PROJECT_DIR, content):
+        name = match.group(1) if match.group(1).startswith(':') else ':' + match.group(1)
+        if name in projects:
+            projects[name] = match.group(2)
+    return projects
+
+def has_smartech_repository(content):
+    """Check whether settings.gradle content already declares the Smartech repository."""
+    return 'artifacts.netcore.co.in/artifactory/android' in content
+
+def _search_file(gradle_path, pattern, fs):
+    """Search a build file, through a memory map when it is large; returns the first group as text or None."""
+    mapped = map_large_file(fs, gradle_path)
+    if mapped is None:
+        match = guarded_search(pattern, fs.read_text(gradle_path))
+        return match.group(1) if match else None
+    with mapped:
+        match = guarded_search(pattern, mapped.buffer)
+        return as_text(match.group(1)) if match else None
+
+def _dependency_edits(content, artifact, dependency):
+    """Return the edits that add a dependency at the top of every dependencies block, unless it is declared."""
+    if find_text(content, 'com.netcore.android:' + artifact) != -1:
+        return []
+    # Find the dependencies block
+    return [(m.end(1), m.end(1), '\n    ' + dependency) for m in guarded_finditer(DEPENDENCIES_BLOCK, content)]
+
+def _add_dependency(gradle_path, artifact, dependency, fs=None):
+    edit_file(fs or LOCAL_FS, gradle_path, lambda content: cached_edits(
+        'gradle.dependency', (artifact, dependency), content, lambda content: _dependency_edits(content, artifact, dependency)))
+
+def extract_target_sdk(gradle_path, fs=None):
     """Extract targetSdkVersion from build.gradle file."""
-    with open(gradle_path, 'r') as f:
-        content = f.read()
-        
-    # Check if it's a .kts file
-    is_kts = gradle_path.endswith('.kts')
-    
     # Pattern for both .gradle and .gradle.kts
-    pattern = r'targetSdk\s*(?:=|)\s*(\d+)'
-    match = re.search(pattern, content)
-    if match:
-        return int(match.group(1))
+    target_sdk = _search_file(gradle_path, TARGET_SDK, fs or LOCAL_FS)
+    if target_sdk:
+        return int(target_sdk)
     return 33  # Default to 33 if not found
 
-def extract_application_id(gradle_path):
+def extract_application_id(gradle_path, fs=None):
     """Extract applicationId from build.gradle file."""
-    with open(gradle_path, 'r') as f:
-        content = f.read()
-        
-    # Check if it's a .kts file
-    is_kts = gradle_path.endswith('.kts')
-    
     # Pattern for both .gradle and .gradle.kts
-    pattern = r'applicationId\s*(?:=|)\s*["\']([^"\']+)["\']'
-    match = re.search(pattern, content)
-    if match:
-        return match.group(1)
-    return None
+    return _search_file(gradle_path, APPLICATION_ID, fs or LOCAL_FS)
 
-def modify_gradle(gradle_path):
+def sdk_version_for(gradle_path, fs=None):
+    """Return the newest Smartech release that suits the targetSdk of a build file."""
+    return resolve_sdk_version(extract_target_sdk(gradle_path, fs))
+
+def modify_gradle(gradle_path, fs=None, version=None):
     """Modify build.gradle file to add Smartech dependencies."""
-    with open(gradle_path, 'r') as f:
-        content = f.read()
-        
     # Check if it's a .kts file
     is_kts = gradle_path.endswith('.kts')
+    version = version or sdk_version_for(gradle_path, fs)
     
     # Add core dependency if not present
-    core_dependency = 'implementation("com.netcore.android:smartech-base:3.6.2")' if is_kts else 'implementation "com.netcore.android:smartech-base:3.6.2"'
-    if 'com.netcore.android:smartech-base' not in content:
-        # Find the dependencies block
-        if is_kts:
-            content = re.sub(r'(dependencies\s*\{)', r'\1\n    ' + core_dependency, content)
-        else:
-            content = re.sub(r'(dependencies\s*\{)', r'\1\n    ' + core_dependency, content)
-    
-    with open(gradle_path, 'w') as f:
-        f.write(content)
+    core_dependency = f'implementation("com.netcore.android:smartech-base:{version}")' if is_kts else f'implementation "com.netcore.android:smartech-base:{version}"'
+    _add_dependency(gradle_path, 'smartech-base', core_dependency, fs)
 
-def modify_settings_gradle(settings_path):
+def modify_settings_gradle(settings_path, fs=None):
     """Modify settings.gradle file to add Smartech repository."""
-    with open(settings_path, 'r') as f:
-        content = f.read()
-        
-    # Check if it's a .kts file
+    fs = fs or LOCAL_FS
     is_kts = settings_path.endswith('.kts')
-    
+    content = cached_content('settings.repository', (is_kts,), fs.read_text(settings_path),
+                             lambda content: _settings_with_repository(content, is_kts))
+    fs.write_text(settings_path, content)
+
+def _settings_with_repository(content, is_kts):
+    """Return settings.gradle content with the Smartech repository declared."""
     # Add repository if not present
     repository = 'maven { url = uri("https://artifacts.netcore.co.in/artifactory/android") }' if is_kts else 'maven { url "https://artifacts.netcore.co.in/artifactory/android" }'
     
     if repository not in content:
-        if re.search(r'dependencyResolutionManagement\s*\{', content):
+        if guarded_search(RESOLUTION_BLOCK, content):
             # Add inside existing dependencyResolutionManagement block
-            if re.search(r'repositories\s*\{', content):
+            if guarded_search(REPOSITORIES_BLOCK, content):
                 # Add inside existing repositories block
-                content = re.sub(r'(repositories\s*\{)', r'\1\n        ' + repository, content)
+                content = guarded_sub(REPOSITORIES_BLOCK, lambda m: m.group(1) + '\n        ' + repository, content)
             else:
                 # Add repositories block inside dependencyResolutionManagement
-                content = re.sub(r'(dependencyResolutionManagement\s*\{)', r'\1\n    repositories {\n        ' + repository + '\n    }', content)
+                content = guarded_sub(RESOLUTION_BLOCK, lambda m: m.group(1) + '\n    repositories {\n        ' + repository + '\n    }', content)
         else:
             # Add dependencyResolutionManagement block at the top
             new_block = f'dependencyResolutionManagement {{\n    repositories {{\n        {repository}\n    }}\n}}\n\n'
             content = new_block + content
-    
-    with open(settings_path, 'w') as f:
-        f.write(content)
+    return content
 
-def inject_push_dependency(gradle_path):
+def inject_push_dependency(gradle_path, fs=None, version=None):
     """Inject push notification dependency into build.gradle file."""
-    with open(gradle_path, 'r') as f:
-        content = f.read()
-        
     # Check if it's a .kts file
     is_kts = gradle_path.endswith('.kts')
+    version = version or sdk_version_for(gradle_path, fs)
     
     # Add push dependency if not present
-    push_dependency = 'implementation("com.netcore.android:smartech-push:3.6.2")' if is_kts else 'implementation "com.netcore.android:smartech-push:3.6.2"'
-    if 'com.netcore.android:smartech-push' not in content:
-        # Find the dependencies block
-        if is_kts:
-            content = re.sub(r'(dependencies\s*\{)', r'\1\n    ' + push_dependency, content)
-        else:
-            content = re.sub(r'(dependencies\s*\{)', r'\1\n    ' + push_dependency, content)
-    
-    with open(gradle_path, 'w') as f:
-        f.write(content) 
\ No newline at end of file
+    push_dependency = f'implementation("com.netcore.android:smartech-push:{version}")' if is_kts else f'implementation "com.netcore.android:smartech-push:{version}"'
+    _add_dependency(gradle_path, 'smartech-push', push_dependency, fs) 
\ No newline at end of file
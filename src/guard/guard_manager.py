@@ -0,0 +1,142 @@
+import os
+import re
+import signal
+import threading
+import time
+
+BUDGET_ENV = 'SMARTECH_EDIT_BUDGET'
+DEFAULT_BUDGET_SECONDS = 5.0
+# Inputs larger than this are refused where no timer can interrupt a match (worker threads, Windows).
+MAX_UNTIMED_INPUT = 16 * 1024 * 1024
+
+PATTERNS = {}
+# Bytes twins of registered patterns, compiled on first use against a memory-mapped file.
+_BYTES_PATTERNS = {}
+
+class EditBudgetExceeded(RuntimeError):
+    """Raised when an editing pattern exceeds its time or size budget; no file has been written."""
+
+    def __init__(self, label, reason):
+        RuntimeError.__init__(self, f"Edit '{label}' aborted: {reason}. The file was left unchanged.")
+        self.label = label
+
+def register_pattern(label, pattern, flags=0):
+    """Compile an editing pattern and register it for budget diagnostics and the pathological-input benchmark."""
+    compiled = re.compile(pattern, flags)
+    PATTERNS[label] = compiled
+    return compiled
+
+def _label(pattern):
+    for label, compiled in PATTERNS.items():
+        if compiled is pattern:
+            return label
+    return getattr(pattern, 'pattern', str(pattern))[:40]
+
+def _for_content(pattern, content):
+    """Return pattern for text content, or its bytes twin for a mapped (bytes-like) buffer."""
+    if isinstance(content, str):
+        return pattern
+    twin = _BYTES_PATTERNS.get(pattern)
+    if twin is None:
+        twin = _BYTES_PATTERNS[pattern] = re.compile(pattern.pattern.encode('ascii'), pattern.flags & ~re.UNICODE)
+    return twin
+
+def edit_budget():
+    """Return the per-edit time budget in seconds."""
+    try:
+        return float(os.environ.get(BUDGET_ENV, DEFAULT_BUDGET_SECONDS))
+    except ValueError:
+        return DEFAULT_BUDGET_SECONDS
+
+def _can_interrupt():
+    return hasattr(signal, 'setitimer') and threading.current_thread() is threading.main_thread()
+
+def run_guarded(func, label, size, budget=None, fallback=None):
+    """
+    Run func() under the edit budget.
+
+    On the main thread of a Unix process a real-time timer interrupts the regex engine when
+    the budget runs out; elsewhere inputs above MAX_UNTIMED_INPUT are refused up front.
+    When the budget is exceeded, fallback() is returned if given, otherwise
+    EditBudgetExceeded is raised.
+    """
+    budget = edit_budget() if budget is None else budget
+    if not _can_interrupt():
+        if size > MAX_UNTIMED_INPUT:
+            if fallback is not None:
+                return fallback()
+            raise EditBudgetExceeded(label, f'input of {size} characters exceeds the untimed limit')
+        return func()
+
+    def on_alarm(signum, frame):
+        raise EditBudgetExceeded(label, f'exceeded the {budget:g} s budget')
+
+    previous = signal.signal(signal.SIGALRM, on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, budget)
+    try:
+        return func()
+    except EditBudgetExceeded:
+        if fallback is not None:
+            return fallback()
+        raise
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+def guarded_sub(pattern, repl, content, count=0, fallback=None):
+    """re.sub under the edit budget; pattern must be a compiled (ideally registered) pattern."""
+    return run_guarded(lambda: pattern.sub(repl, content, count), _label(pattern), len(content), fallback=fallback)
+
+def guarded_search(pattern, content, pos=0):
+    """pattern.search under the edit budget; content may also be a mapped file buffer."""
+    label = _label(pattern)
+    pattern = _for_content(pattern, content)
+    return run_guarded(lambda: pattern.search(content, pos), label, len(content))
+
+def guarded_finditer(pattern, content):
+    """Return every match of pattern under the edit budget; content may also be a mapped file buffer."""
+    label = _label(pattern)
+    pattern = _for_content(pattern, content)
+    return run_guarded(lambda: list(pattern.finditer(content)), label, len(content))
+
+def pathological_inputs(size=1024 * 1024):
+    """
+    Build the corpus of adversarial inputs the editing patterns must handle in linear time.
+
+    Returns:
+        dict: name -> input text of roughly size characters
+    """
+    def repeat(unit):
+        return unit * max(1, size // len(unit))
+
+    generated_line = '    fun f{0}() {{ val s = "}}{{ ${{x}}"; /* }} */ g({{ it -> it }}) }}\n'
+    generated = 'class Generated : FirebaseMessagingService() {\n'
+    generated += ''.join(generated_line.format(i) for i in range(max(1, size // len(generated_line))))
+    return {
+        'unclosed application tags': repeat('<application '),
+        'unclosed meta-data tags': repeat('<meta-data android:name="x" '),
+        'unclosed service tags': repeat('<service '),
+        'attribute without value': '<application ' + 'a' * size,
+        'whitespace runs': '<application android:name' + ' ' * size,
+        'whitespace after keys': 'targetSdk' + ' ' * size + '\napplicationId' + ' ' * size,
+        'unclosed brace runs': 'class A : Application() ' + '{' * size,
+        'deep nesting': '{' * (size // 2) + '}' * (size // 2),
+        'unclosed class headers': repeat('class X('),
+        'repeated options declarations': repeat('val options = SMTNotificationOptions('),
+        'repeated java options declarations': repeat('SMTNotificationOptions options = new SMTNotificationOptions(this);'),
+        'unterminated comment': '/*' + 'x' * size,
+        'unterminated raw string': '"""' + '${' * (size // 2),
+        'escaped quotes': repeat('"\\"'),
+        'dependency coordinates': repeat('com.netcore.android:smartech-base:'),
+        'generated kotlin service': generated,
+    }
+
+def time_pattern(label, text):
+    """Return the CPU seconds a registered pattern takes to match all of text, or inf if it exceeds the edit budget."""
+    pattern = PATTERNS[label]
+    started = time.process_time()
+    try:
+        run_guarded(lambda: sum(1 for _ in pattern.finditer(text)), label, len(text))
+    except EditBudgetExceeded:
+        return float('inf')
+    return time.process_time() - started
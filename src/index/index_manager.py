@@ -0,0 +1,185 @@
+import os
+
+from ..fs.fs_manager import LOCAL_FS
+from ..application.application_manager import is_application_class
+from ..deeplink.deeplink_manager import action_handlers, receiver_facts
+from ..gradle.gradle_manager import parse_gradle
+from ..manifest.manifest_manager import parse_manifest, variant_manifest_paths
+from ..progress.progress_manager import Progress
+from ..push.push_manager import is_push_service_class, push_service_classes, resolve_push_service
+
+SOURCE_EXTENSIONS = ('.java', '.kt')
+
+def resolve_project_paths(project_dir, fs=None):
+    """Resolve the files of an Android project that the integrator reads and edits."""
+    fs = fs or LOCAL_FS
+    app_dir = os.path.join(project_dir, "app")
+    gradle_path = os.path.join(app_dir, "build.gradle")
+    gradle_kts_path = os.path.join(app_dir, "build.gradle.kts")
+    if fs.exists(gradle_kts_path):
+        gradle_path = gradle_kts_path
+
+    settings_path = os.path.join(project_dir, "settings.gradle")
+    settings_kts_path = os.path.join(project_dir, "settings.gradle.kts")
+    if fs.exists(settings_kts_path):
+        settings_path = settings_kts_path
+    elif not fs.exists(settings_path):
+        settings_path = None
+
+    return {
+        'project_dir': project_dir,
+        'app_dir': app_dir,
+        'src_dir': os.path.join(app_dir, "src", "main", "java"),
+        'res_dir': os.path.join(app_dir, "src", "main", "res"),
+        'manifest_path': os.path.join(app_dir, "src", "main", "AndroidManifest.xml"),
+        'gradle_path': gradle_path,
+        'settings_path': settings_path,
+    }
+
+def source_language(path):
+    """Return the language of a source file from its extension."""
+    return 'kotlin' if path.endswith('.kt') else 'java'
+
+def class_name_from_path(path, src_dir):
+    """Return the dotted class name of a source file relative to its source root."""
+    return os.path.relpath(path, src_dir).replace(os.sep, '.').replace('.java', '').replace('.kt', '')
+
+def classify_source(content):
+    """Return the set of integration-relevant roles a source file plays."""
+    kinds = set()
+    if is_application_class(content):
+        kinds.add('application')
+    if is_push_service_class(content):
+        kinds.add('push_service')
+    return kinds
+
+class FileCache:
+    """Cache file contents and values derived from them, revalidated by mtime and size."""
+
+    def __init__(self, fs=None):
+        self.fs = fs or LOCAL_FS
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def stat_key(self, path):
+        """Return the (mtime, size) key of a file, or None if it does not exist."""
+        return self.fs.stat_key(path)
+
+    def _entry(self, path):
+        key = self.stat_key(path)
+        if key is None:
+            self._entries.pop(path, None)
+            raise FileNotFoundError(path)
+        entry = self._entries.get(path)
+        if entry is not None and entry['key'] == key:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        entry = {'key': key, 'content': self.fs.read_text(path), 'derived': {}}
+        self._entries[path] = entry
+        return entry
+
+    def read(self, path):
+        """Return the content of a file, reading it only if it changed since the last read."""
+        return self._entry(path)['content']
+
+    def derive(self, path, func):
+        """Return func(content) for a file, recomputing it only when the file changed."""
+        entry = self._entry(path)
+        if func not in entry['derived']:
+            entry['derived'][func] = func(entry['content'])
+        return entry['derived'][func]
+
+    def invalidate(self, prefix=None):
+        """Drop cached entries, either all of them or those under a path prefix."""
+        if prefix is None:
+            self._entries.clear()
+            return
+        for path in [p for p in self._entries if p.startswith(prefix)]:
+            del self._entries[path]
+
+    def __len__(self):
+        return len(self._entries)
+
+class ProjectIndex:
+    """Warm view of one Android project: resolved paths, parsed models and a source index."""
+
+    def __init__(self, project_dir, cache=None, fs=None):
+        self.project_dir = os.path.abspath(project_dir)
+        self.cache = cache if cache is not None else FileCache(fs)
+        self.fs = self.cache.fs
+        self._sources = {}
+
+    @property
+    def paths(self):
+        return resolve_project_paths(self.project_dir, self.fs)
+
+    def gradle_model(self):
+        """Return the parsed app build.gradle(.kts) model."""
+        return self.cache.derive(self.paths['gradle_path'], parse_gradle)
+
+    def manifest_model(self):
+        """Return the parsed main AndroidManifest.xml model."""
+        return self.cache.derive(self.paths['manifest_path'], parse_manifest)
+
+    def variant_manifest_models(self):
+        """Return {source set: (path, parsed model)} for the build-type and flavor manifests of the app module."""
+        return {source_set: (path, self.cache.derive(path, parse_manifest))
+                for source_set, path in variant_manifest_paths(self.paths['app_dir'], self.fs).items()}
+
+    def read(self, path):
+        """Return the cached content of a project file."""
+        return self.cache.read(path)
+
+    def scan_sources(self, progress=None):
+        """Refresh the source index, re-reading only files whose mtime or size changed."""
+        progress = progress or Progress()
+        paths = [os.path.join(root, file) for root, _, files in self.fs.walk(self.paths['src_dir'])
+                 for file in files if file.endswith(SOURCE_EXTENSIONS)]
+        sources = {}
+        with progress.phase('Indexing sources', len(paths)):
+            for path in paths:
+                key = self.cache.stat_key(path)
+                previous = self._sources.get(path)
+                if previous is not None and previous['key'] == key:
+                    sources[path] = previous
+                    progress.advance()
+                    continue
+                # Only the classification is kept; source bodies are not held in memory.
+                content = self.fs.read_text(path)
+                language = source_language(path)
+                sources[path] = dict(receiver_facts(content, language), key=key, language=language,
+                                     kinds=classify_source(content), push_services=push_service_classes(content, language))
+                progress.advance(len(content))
+        self._sources = sources
+        return sources
+
+    def find_source(self, kind, progress=None):
+        """Return (path, language) of the first source file of the given kind, in walk order."""
+        for path, record in self.scan_sources(progress).items():
+            if kind in record['kinds']:
+                return path, record['language']
+        return None, None
+
+    def application_class(self, progress=None):
+        return self.find_source('application', progress)
+
+    def push_service(self, progress=None):
+        """Return resolve_push_service() for the project, joining the main manifest with the source index."""
+        return resolve_push_service(self.scan_sources(progress), self.manifest_model(), self.gradle_model()['namespace'])
+
+    def push_service_class(self, progress=None):
+        service = self.push_service(progress)
+        return service['path'], service['language']
+
+    def action_handlers(self, action, progress=None):
+        """Return where a broadcast action is already received, from the source index and the main and variant manifests."""
+        manifests = {self.paths['manifest_path']: self.manifest_model()}
+        manifests.update(self.variant_manifest_models().values())
+        return action_handlers(action, self.scan_sources(progress), manifests)
+
+    def invalidate(self):
+        """Forget everything cached for this project."""
+        self._sources = {}
+        self.cache.invalidate(self.project_dir + os.sep)
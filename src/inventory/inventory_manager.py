@@ -0,0 +1,123 @@
+import concurrent.futures
+import json
+import os
+import sys
+
+from ..fs.fs_manager import is_archive, open_project
+from ..gradle.gradle_manager import parse_gradle, parse_version_catalog
+from ..lock.lock_manager import ProjectLock
+from ..manifest.manifest_manager import parse_manifest
+
+INVENTORY_FLAGS = ('SMT_IS_AUTO_FETCHED_LOCATION', 'SMT_IS_AUTO_ASK_NOTIFICATION_PERMISSION')
+
+def iter_project_dirs(source):
+    """
+    Yield project directories from a directory of checkouts or from a list file.
+
+    Zip and tar snapshots in the directory are yielded too and inspected without extracting
+    them. A list file holds one project path per line; blank lines and lines starting with '#'
+    are skipped and relative paths are resolved against the list file's directory.
+    """
+    if os.path.isdir(source):
+        with os.scandir(source) as entries:
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                if entry.is_dir() or (entry.is_file() and is_archive(entry.path)):
+                    yield entry.path
+        return
+    base_dir = os.path.dirname(os.path.abspath(source))
+    with open(source, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield os.path.join(base_dir, line)
+
+def _read(fs, path):
+    try:
+        return fs.read_text(path, errors='replace')
+    except OSError:
+        return None
+
+def inspect_project(project_dir):
+    """Return the inventory record of one project, reading only the files that matter."""
+    record = {'project': project_dir, 'integrated': False, 'smartech_base': None, 'smartech_push': None,
+              'app_id': None}
+    record.update((flag, None) for flag in INVENTORY_FLAGS)
+
+    # A shared lock waits out an apply in progress, so the record never mixes edited and unedited files.
+    with ProjectLock(project_dir if os.path.isdir(project_dir) else None):
+        fs, root = open_project(project_dir)
+        try:
+            return _inspect(fs, root, record)
+        finally:
+            fs.close()
+
+def _inspect(fs, root, record):
+    app_dir = os.path.join(root, 'app')
+    gradle = _read(fs, os.path.join(app_dir, 'build.gradle.kts'))
+    if gradle is None:
+        gradle = _read(fs, os.path.join(app_dir, 'build.gradle'))
+    manifest = _read(fs, os.path.join(app_dir, 'src', 'main', 'AndroidManifest.xml'))
+    if gradle is None or manifest is None:
+        record['error'] = 'not an Android project'
+        return record
+
+    dependencies = parse_gradle(gradle)['dependencies']
+    if None in dependencies.values() and 'libs.' in gradle:
+        catalog = _read(fs, os.path.join(root, 'gradle', 'libs.versions.toml'))
+        if catalog is not None:
+            for name, version in parse_version_catalog(catalog).items():
+                dependencies[name] = dependencies[name] or version
+    record['smartech_base'] = dependencies['smartech-base']
+    record['smartech_push'] = dependencies['smartech-push']
+
+    meta_data = parse_manifest(manifest)['meta_data']
+    record['app_id'] = meta_data.get('SMT_APP_ID')
+    for flag in INVENTORY_FLAGS:
+        record[flag] = meta_data.get(flag)
+    record['integrated'] = record['smartech_base'] is not None and record['app_id'] is not None
+    return record
+
+def iter_parallel(function, project_dirs, workers=8, processes=False):
+    """
+    Run function(project_dir) on projects in parallel and yield (project_dir, future) as each completes.
+
+    At most a few tasks per worker are in flight at any time, so memory stays
+    constant however many projects the iterable yields.
+    """
+    executor_class = concurrent.futures.ProcessPoolExecutor if processes else concurrent.futures.ThreadPoolExecutor
+    max_in_flight = workers * 4
+    project_dirs = iter(project_dirs)
+    with executor_class(max_workers=workers) as executor:
+        pending = {}
+        for project_dir in project_dirs:
+            pending[executor.submit(function, project_dir)] = project_dir
+            if len(pending) < max_in_flight:
+                continue
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future
+        for future in concurrent.futures.as_completed(pending):
+            yield pending[future], future
+
+def iter_inventory(project_dirs, workers=8, processes=False):
+    """Inspect projects in parallel and yield records as they complete."""
+    for project_dir, future in iter_parallel(inspect_project, project_dirs, workers, processes):
+        yield _result(future, project_dir)
+
+def _result(future, project_dir):
+    try:
+        return future.result()
+    except Exception as e:
+        return {'project': project_dir, 'integrated': False, 'error': str(e)}
+
+def write_inventory(source, output=None, workers=8, processes=False):
+    """Stream one compact JSON record per project to output (stdout by default); return the count."""
+    stream = output or sys.stdout
+    count = 0
+    for record in iter_inventory(iter_project_dirs(source), workers, processes):
+        stream.write(json.dumps(record, separators=(',', ':')) + '\n')
+        stream.flush()
+        count += 1
+    return count
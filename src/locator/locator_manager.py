@@ -0,0 +1,337 @@
+import bisect
+import collections
+import re
+
+# Tokens the lexer cares about; everything in between is plain code. Line comments, char
+# literals and strings without templates are consumed whole by the regex engine, the rest
+# (block comments, raw strings, templates) are finished by the _skip_* helpers. Adjacent
+# brackets form one token, so runs like '})' or '{{{' cost one match.
+_TOKEN = re.compile(r'''
+    (?P<line>//[^\n]*)
+  | (?P<block>/\*)
+  | (?P<raw>""")
+  | (?P<string>"(?:[^"\\\n$]|\\.|\$(?!\{))*")
+  | (?P<quote>")
+  | (?P<char>'(?:[^'\\\n]|\\.)*')
+  | (?P<apos>')
+  | (?P<bracket>[{}()\[\]]+)
+''', re.VERBOSE)
+_CLOSERS = {'}': '{', ')': '(', ']': '['}
+_STOP = re.compile(r'[{;]')
+# Keywords followed by '(' ... '{' that are not method declarations.
+_JAVA_NON_METHODS = frozenset(['if', 'for', 'while', 'switch', 'catch', 'synchronized', 'try', 'return', 'throw',
+                               'super', 'this'])
+
+class SourceMap:
+    """
+    Lexical map of a Java or Kotlin source file built in one linear pass.
+
+    The lexer understands line and block comments (nested in Kotlin), string and char
+    literals, Java text blocks, Kotlin raw strings and ${...} templates. It records the
+    spans that are not code and matches every bracket that is, so class and method
+    bodies can be located without regexes that span a body.
+    """
+
+    def __init__(self, content, language='java'):
+        self.content = content
+        self.kotlin = language == 'kotlin'
+        self.pairs = {}
+        self.parents = {}
+        self.unmatched = []
+        self._spans = []
+        self._opens = []
+        self._masked = None
+        self._stop = None
+        self._scan()
+
+    def _scan(self):
+        content = self.content
+        spans, pairs, parents, unmatched = self._spans, self.pairs, self.parents, self.unmatched
+        stack = []
+        position = 0
+        while position is not None:
+            restart = None
+            for match in _TOKEN.finditer(content, position):
+                kind = match.lastgroup
+                if kind == 'bracket':
+                    start = match.start()
+                    for token in match.group(0):
+                        if token in '{([':
+                            parents[start] = stack[-1] if stack else None
+                            stack.append(start)
+                        elif stack and content[stack[-1]] == _CLOSERS[token]:
+                            pairs[stack.pop()] = start
+                        else:
+                            unmatched.append(start)
+                        start += 1
+                elif kind in ('line', 'string', 'char'):
+                    spans.append(match.span())
+                else:
+                    # Constructs the regex cannot finish on its own; resume the token scan after them.
+                    start = match.start()
+                    if kind == 'block':
+                        restart = self._skip_block_comment(start)
+                    elif kind == 'apos':
+                        restart = self._skip_char(start)
+                    else:
+                        restart = self._skip_string(start, kind == 'raw')
+                    spans.append((start, restart))
+                    break
+            position = restart
+        unmatched.extend(stack)
+        unmatched.sort()
+        self._opens = sorted(pairs)
+
+    def _skip_block_comment(self, start):
+        content = self.content
+        if not self.kotlin:
+            end = content.find('*/', start + 2)
+            return len(content) if end == -1 else end + 2
+        depth = 0
+        i = start
+        for match in re.compile(r'/\*|\*/').finditer(content, start):
+            depth += 1 if match.group(0) == '/*' else -1
+            i = match.end()
+            if depth == 0:
+                return i
+        return len(content)
+
+    def _skip_string(self, start, raw):
+        """Return the index just past the string literal starting at start."""
+        content = self.content
+        quote = '"""' if raw else '"'
+        i = start + len(quote)
+        special = re.compile(r'"""|\$\{' if raw else r'["\\\n]|\$\{')
+        while True:
+            match = special.search(content, i)
+            if match is None:
+                return len(content)
+            token = match.group(0)
+            if token == quote:
+                end = match.end()
+                # Kotlin allows extra quotes at the end of a raw string: """a"""" ends with the last three.
+                while raw and content.startswith('"', end):
+                    end += 1
+                return end
+            if token == '\\':
+                i = match.end() + 1
+            elif token == '\n':
+                # Unterminated single-line string; stop at the line end like the compiler would.
+                return match.start()
+            elif token == '${' and self.kotlin:
+                i = self._skip_template(match.end())
+            else:
+                i = match.end()
+
+    def _skip_template(self, start):
+        """Return the index just past the '}' closing a Kotlin ${...} template expression."""
+        content = self.content
+        depth = 1
+        i = start
+        while True:
+            match = _TOKEN.search(content, i)
+            if match is None:
+                return len(content)
+            kind, token = match.lastgroup, match.group(0)
+            if kind == 'bracket':
+                for offset, char in enumerate(token, match.start()):
+                    if char == '{':
+                        depth += 1
+                    elif char == '}':
+                        depth -= 1
+                        if depth == 0:
+                            return offset + 1
+            elif kind in ('quote', 'raw'):
+                i = self._skip_string(match.start(), kind == 'raw')
+                continue
+            elif kind == 'apos':
+                i = self._skip_char(match.start())
+                continue
+            elif kind == 'block':
+                i = self._skip_block_comment(match.start())
+                continue
+            i = match.end()
+
+    def _skip_char(self, start):
+        content = self.content
+        i = start + 1
+        if content.startswith('\\', i):
+            i += 2
+        end = content.find("'", i)
+        newline = content.find('\n', i)
+        if end == -1 or (newline != -1 and newline < end):
+            return i
+        return end + 1
+
+    @property
+    def masked(self):
+        """The content with comments and literals blanked out, keeping every offset unchanged."""
+        if self._masked is None:
+            parts = []
+            last = 0
+            for start, end in self._spans:
+                parts.append(self.content[last:start])
+                parts.append(' ' * (end - start))
+                last = end
+            parts.append(self.content[last:])
+            self._masked = ''.join(parts)
+        return self._masked
+
+    def is_code(self, index):
+        """Check whether an offset lies outside comments and literals."""
+        position = bisect.bisect_right(self._spans, (index, len(self.content) + 1)) - 1
+        return position < 0 or not (self._spans[position][0] <= index < self._spans[position][1])
+
+    def enclosing(self, index):
+        """Return the (open, close) brace pair that most closely encloses an offset, or None."""
+        position = bisect.bisect_left(self._opens, index) - 1
+        if position < 0:
+            return None
+        open_index = self._opens[position]
+        while open_index is not None:
+            if self.content[open_index] == '{' and self.pairs.get(open_index, -1) >= index:
+                return open_index, self.pairs[open_index]
+            open_index = self.parents.get(open_index)
+        return None
+
+    def _next_stop(self, start, end):
+        """Return the offset of the first '{' or ';' in code in [start, end), or end."""
+        # Callers scan forward, so the previous answer still holds for any start up to it; without
+        # this, a run of headers with no body would rescan to the end of the file for each one.
+        cached = self._stop
+        if cached is not None and cached[0] <= start <= cached[2] and cached[1] == end:
+            return cached[2]
+        match = _STOP.search(self.masked, start, end)
+        stop = match.start() if match else end
+        self._stop = (start, end, stop)
+        return stop
+
+    def _next_brace(self, start, end=None):
+        """Return the offset of the next '{' in code before any ';', or None."""
+        masked = self.masked
+        end = len(masked) if end is None else end
+        stop = self._next_stop(start, end)
+        if stop == end or masked[stop] != '{' or stop not in self.pairs:
+            return None
+        return stop
+
+    def class_body(self, supertype):
+        """
+        Locate the body of the first class extending supertype.
+
+        Returns:
+            tuple: (open, close) offsets of the class braces, or None
+        """
+        if self.kotlin:
+            pattern = r'\bclass\s+\w+\s*(?:\([^()]*\)\s*)?:\s*(?:[\w.]+\.)?' + re.escape(supertype) + r'\b'
+        else:
+            pattern = r'\bclass\s+\w+\s+extends\s+(?:[\w.]+\.)?' + re.escape(supertype) + r'\b'
+        match = re.compile(pattern).search(self.masked)
+        if match is None:
+            return None
+        open_index = self._next_brace(match.end())
+        if open_index is None:
+            return None
+        return open_index, self.pairs[open_index]
+
+    def method(self, name, body):
+        """
+        Locate a method declared directly inside a class body.
+
+        Returns:
+            dict: 'start' (offset of the declaration), 'params' and 'body' (open, close) pairs, or None
+        """
+        if self.kotlin:
+            pattern = re.compile(r'\bfun\s+' + re.escape(name) + r'\s*\(')
+        else:
+            pattern = re.compile(r'\b' + re.escape(name) + r'\s*\(')
+        for match in pattern.finditer(self.masked, body[0] + 1, body[1]):
+            params_open = match.end() - 1
+            if params_open not in self.pairs or self.enclosing(match.start()) != body:
+                continue
+            open_index = self._next_brace(self.pairs[params_open] + 1, body[1])
+            if open_index is None:
+                continue
+            start = self.masked.rfind('\n', body[0], match.start()) + 1
+            return {'start': max(start, body[0] + 1), 'params': (params_open, self.pairs[params_open]),
+                    'body': (open_index, self.pairs[open_index])}
+        return None
+
+    def class_bodies(self):
+        """Return the (open, close) offsets of every named class, interface, object or enum body."""
+        bodies = []
+        for match in re.compile(r'\b(?:class|interface|object|enum)\s+\w+').finditer(self.masked):
+            open_index = self._next_brace(match.end())
+            if open_index is not None:
+                bodies.append((open_index, self.pairs[open_index]))
+        return sorted(set(bodies))
+
+    def methods(self, body):
+        """
+        List the methods with a body declared directly inside a class body.
+
+        Returns:
+            list: dicts with 'name', 'start', 'params' and 'body' like method() returns
+        """
+        if self.kotlin:
+            pattern = re.compile(r'\bfun\s+(?:<[^<>{};]*>\s*)?(?:[\w.]+\.)?(\w+)\s*\(')
+        else:
+            pattern = re.compile(r'(?<![\w@.])(\w+)\s*\(')
+        found = []
+        for match in pattern.finditer(self.masked, body[0] + 1, body[1]):
+            name = match.group(1)
+            params_open = match.end() - 1
+            if name in _JAVA_NON_METHODS or params_open not in self.pairs or self.enclosing(match.start()) != body:
+                continue
+            if not self.kotlin and re.compile(r'\bnew\s+$').search(self.masked, max(body[0], match.start() - 8), match.start()):
+                continue
+            open_index = self._next_brace(self.pairs[params_open] + 1, body[1])
+            if open_index is None:
+                continue
+            found.append({'name': name, 'start': match.start(), 'params': (params_open, self.pairs[params_open]),
+                          'body': (open_index, self.pairs[open_index])})
+        return found
+
+    def statement_end(self, call, body):
+        """
+        Locate the end of the first statement in a body that contains a call.
+
+        Args:
+            call (str): Regex matching the call up to and including its opening parenthesis
+            body (tuple): (open, close) offsets of the enclosing body
+
+        Returns:
+            int: Offset just past the call's closing parenthesis and optional ';', or None
+        """
+        for match in re.compile(call).finditer(self.masked, body[0] + 1, body[1]):
+            params_open = match.end() - 1
+            if params_open not in self.pairs:
+                continue
+            end = self.pairs[params_open] + 1
+            following = re.compile(r'[ \t]*;').match(self.masked, end)
+            return following.end() if following else end
+        return None
+
+# The last few maps built, so an editor and the validator that checks its result share one scan per text.
+_RECENT_MAPS = collections.deque(maxlen=4)
+
+def get_source_map(content, language='java'):
+    """Return a SourceMap of content, reusing a recent map of the very same string."""
+    kotlin = language == 'kotlin'
+    for source_map in list(_RECENT_MAPS):
+        if source_map.content is content and source_map.kotlin == kotlin:
+            return source_map
+    source_map = SourceMap(content, language)
+    _RECENT_MAPS.append(source_map)
+    return source_map
+
+def apply_insertions(content, insertions):
+    """Apply (offset, text) insertions to content, all offsets referring to the original content."""
+    parts = []
+    last = 0
+    for offset, text in sorted(insertions, key=lambda insertion: insertion[0]):
+        parts.append(content[last:offset])
+        parts.append(text)
+        last = offset
+    parts.append(content[last:])
+    return ''.join(parts)
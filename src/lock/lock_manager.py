@@ -0,0 +1,175 @@
+import errno
+import hashlib
+import json
+import os
+import socket
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: runs are not locked
+    fcntl = None
+
+LOCK_TIMEOUT_ENV = 'SMARTECH_LOCK_TIMEOUT'
+LOCK_DIR_ENV = 'SMARTECH_LOCK_DIR'
+DEFAULT_LOCK_TIMEOUT = 600.0
+# Inside .gradle/, which Android projects keep out of version control.
+LOCK_FILE = os.path.join('.gradle', 'smartech-integrator.lock')
+_MAX_POLL = 0.5
+
+class ProjectLockTimeout(RuntimeError):
+    """Raised when a project lock could not be taken within the timeout; nothing has been read or written."""
+
+    def __init__(self, project_dir, exclusive, timeout, holder):
+        held_by = _describe(holder) if holder else 'runs holding a shared lock'
+        RuntimeError.__init__(self, f"Timed out after {timeout:g}s waiting for the {'exclusive' if exclusive else 'shared'} "
+                                    f"lock on {project_dir}; it is held by {held_by}")
+        self.holder = holder
+
+def _describe(holder):
+    started = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(holder.get('since', 0)))
+    return f"pid {holder.get('pid')} on {holder.get('host')} since {started}"
+
+def lock_timeout():
+    """Return the default seconds to wait for a project lock."""
+    try:
+        return float(os.environ.get(LOCK_TIMEOUT_ENV, DEFAULT_LOCK_TIMEOUT))
+    except ValueError:
+        return DEFAULT_LOCK_TIMEOUT
+
+def lock_path(project_dir):
+    """Return the lock file of a project: in the project's .gradle/, or under $SMARTECH_LOCK_DIR when set."""
+    lock_dir = os.environ.get(LOCK_DIR_ENV)
+    if lock_dir:
+        name = hashlib.sha1(os.path.realpath(project_dir).encode('utf-8')).hexdigest()
+        return os.path.join(lock_dir, name + '.lock')
+    return os.path.join(project_dir, LOCK_FILE)
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+class ProjectLock:
+    """
+    Advisory lock on a project, exclusive for runs that write and shared for read-only ones.
+
+    The lock is an flock on a lock file, so the kernel releases it when the holder exits. An
+    exclusive holder records its pid, host and start time in the file. A waiter uses that record
+    to report who holds the lock, and to break it when the holder is a dead process on this host
+    whose lock lives on in a leaked descriptor. A record left by a holder that died mid-run is
+    kept in stale_holder, because that run may have left partial edits behind.
+
+    With project_dir None, or where fcntl is unavailable, the lock does nothing.
+    """
+
+    def __init__(self, project_dir, exclusive=False, timeout=None):
+        self.project_dir = project_dir
+        self.exclusive = exclusive
+        self.timeout = lock_timeout() if timeout is None else timeout
+        self.path = lock_path(project_dir) if project_dir is not None else None
+        self.stale_holder = None
+        self._fd = None
+
+    def _read_holder(self, fd):
+        try:
+            os.lseek(fd, 0, os.SEEK_SET)
+            data = os.read(fd, 4096)
+            return json.loads(data.decode('utf-8')) if data.strip() else None
+        except (OSError, ValueError):
+            return None
+
+    def _open(self):
+        if not self.exclusive:
+            # Readers never create the lock file, so check and plan leave the project untouched.
+            # Without the file no writer holds the lock, and without access no writer can run here.
+            try:
+                return os.open(self.path, os.O_RDONLY)
+            except OSError as e:
+                if e.errno in (errno.ENOENT, errno.ENOTDIR, errno.EACCES, errno.EPERM):
+                    return None
+                raise
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        return os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+
+    def _break_if_stale(self, fd):
+        """Remove the lock file when its recorded holder is a dead process on this host; returns the holder."""
+        holder = self._read_holder(fd)
+        if holder and holder.get('host') == socket.gethostname() and not _alive(holder.get('pid', 0)):
+            try:
+                if os.stat(self.path).st_ino == os.fstat(fd).st_ino:
+                    os.unlink(self.path)
+            except OSError:
+                pass
+            return holder, True
+        return holder, False
+
+    def acquire(self):
+        if self.path is None or fcntl is None:
+            return self
+        deadline = time.monotonic() + self.timeout
+        delay = 0.01
+        while True:
+            fd = self._open()
+            if fd is None:
+                return self
+            try:
+                fcntl.flock(fd, (fcntl.LOCK_EX if self.exclusive else fcntl.LOCK_SH) | fcntl.LOCK_NB)
+            except OSError as e:
+                if e.errno not in (errno.EAGAIN, errno.EACCES, errno.EWOULDBLOCK):
+                    os.close(fd)
+                    raise
+                holder, broken = self._break_if_stale(fd)
+                os.close(fd)
+                if broken:
+                    self.stale_holder = holder
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise ProjectLockTimeout(self.project_dir, self.exclusive, self.timeout, holder)
+                time.sleep(min(delay, remaining))
+                delay = min(delay * 2, _MAX_POLL)
+                continue
+            # A stale lock broken after we opened the file leaves us locking an unlinked inode; start over.
+            try:
+                replaced = os.stat(self.path).st_ino != os.fstat(fd).st_ino
+            except FileNotFoundError:
+                replaced = True
+            if replaced:
+                os.close(fd)
+                continue
+            if self.exclusive:
+                # A record is only left behind by an exclusive holder that never released the lock.
+                self.stale_holder = self.stale_holder or self._read_holder(fd)
+                record = {'pid': os.getpid(), 'host': socket.gethostname(), 'since': time.time()}
+                os.ftruncate(fd, 0)
+                os.lseek(fd, 0, os.SEEK_SET)
+                os.write(fd, json.dumps(record).encode('utf-8'))
+            self._fd = fd
+            return self
+
+    def release(self):
+        if self._fd is None:
+            return
+        if self.exclusive:
+            os.ftruncate(self._fd, 0)
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
+
+    def stale_warning(self):
+        """Return a warning about a previous run that died holding the lock, or None."""
+        if not self.stale_holder:
+            return None
+        return (f"⚠️ A previous run ({_describe(self.stale_holder)}) stopped without releasing the project lock; "
+                "check the project for partial edits.")
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc_info):
+        self.release()
@@ -0,0 +1,187 @@
+import os
+import shutil
+import tempfile
+import time
+
+from ..guard.guard_manager import PATTERNS, EditBudgetExceeded, pathological_inputs, time_pattern
+
+# Below this many seconds on the larger input a run passes whatever its ratio, since timer noise dominates.
+NOISE_FLOOR_SECONDS = 0.05
+# Times a run over the allowed ratio is timed again before it counts as a failure.
+RETRIES = 3
+
+def _edit_cases():
+    """Return (label, file name, edit) triples running the real file editors end to end."""
+    from ..application.application_manager import inject_debug_level, inject_notification_appearance
+    from ..deeplink.deeplink_manager import receiver_facts
+    from ..fs.fs_manager import LOCAL_FS
+    from ..gradle.gradle_manager import extract_target_sdk, inject_push_dependency, modify_gradle
+    from ..manifest.manifest_manager import inject_location_tracking_meta_tag, modify_manifest, register_firebase_service
+    from ..push.push_manager import inject_push_logic
+
+    return [
+        ('modify_manifest', 'AndroidManifest.xml', lambda path: modify_manifest(path, 'app-id', '.App', 34)),
+        ('register_firebase_service', 'AndroidManifest.xml', lambda path: register_firebase_service(path, 'Service')),
+        ('inject_location_tracking_meta_tag', 'AndroidManifest.xml', lambda path: inject_location_tracking_meta_tag(path, True)),
+        ('extract_target_sdk', 'build.gradle', extract_target_sdk),
+        ('modify_gradle', 'build.gradle', modify_gradle),
+        ('inject_push_dependency', 'build.gradle', inject_push_dependency),
+        ('inject_debug_level', 'App.kt', lambda path: inject_debug_level(path, 'kotlin', True)),
+        ('inject_notification_appearance', 'App.kt',
+         lambda path: inject_notification_appearance(path, 'kotlin', {'small_icon': 'ic_small'})),
+        ('inject_push_logic', 'Service.kt', lambda path: inject_push_logic(path, 'kotlin')),
+        ('receiver_facts', 'Receiver.kt', lambda path: receiver_facts(LOCAL_FS.read_text(path), 'kotlin')),
+    ]
+
+def _time_edit(edit, path, text):
+    """Return the CPU seconds an editor takes on a file holding text, or inf if it exceeds the edit budget."""
+    with open(path, 'w') as f:
+        f.write(text)
+    started = time.process_time()
+    try:
+        edit(path)
+    except EditBudgetExceeded:
+        return float('inf')
+    except ValueError:
+        pass
+    return time.process_time() - started
+
+def regex_benchmark(size=1024 * 1024, max_ratio=3.0):
+    """
+    Check that every registered editing pattern and every file editor scales linearly on the pathological corpus.
+
+    Each run's CPU time is measured on inputs of size // 2 and of size characters. Linear work
+    takes about twice as long on the larger input and quadratic work four times as long, so a
+    run fails when the ratio is above max_ratio. Neither the ratio nor CPU time depends on how
+    fast or how loaded the machine is; a run over the ratio is timed again up to RETRIES times
+    and its best times are kept, so one noisy measurement does not fail it. A run aborted at
+    the edit budget always fails. Runs faster than NOISE_FLOOR_SECONDS on the larger input always pass.
+
+    Args:
+        size (int): Approximate size in characters of the larger pathological inputs
+        max_ratio (float): Allowed ratio of the time on the larger input to the time on the smaller one
+
+    Returns:
+        int: Number of runs that did not scale linearly
+    """
+    from ..cache.cache_manager import configure_patch_cache
+    from ..maven.maven_manager import configure_metadata
+
+    edit_cases = _edit_cases()  # importing the managers registers their patterns
+    configure_patch_cache('off')  # every run must do the work it is timing
+    configure_metadata(offline=True)  # the timings must not include a repository fetch
+
+    work_dir = tempfile.mkdtemp(prefix='smartech-bench-')
+    try:
+        cases = [(label, lambda text, label=label: time_pattern(label, text)) for label in PATTERNS]
+        cases += [(label, lambda text, edit=edit, path=os.path.join(work_dir, file_name): _time_edit(edit, path, text))
+                  for label, file_name, edit in edit_cases]
+        smaller, larger = pathological_inputs(size // 2), pathological_inputs(size)
+        results = []
+        for name in larger:
+            for label, timer in cases:
+                small, large = timer(smaller[name]), timer(larger[name])
+                for _ in range(RETRIES):
+                    if large == float('inf') or not _over_ratio(small, large, max_ratio):
+                        break
+                    small, large = min(small, timer(smaller[name])), min(large, timer(larger[name]))
+                results.append((label, name, small, large))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    results.sort(key=lambda result: result[3], reverse=True)
+    failures = 0
+    print(f"{'pattern / editor':<48} {'input':<36} {'1/2 size':>8} {'size':>8} {'ratio':>6}")
+    for label, name, small, large in results:
+        over = _over_ratio(small, large, max_ratio)
+        failures += over
+        print(f"{label[:48]:<48} {name[:36]:<36} {small:>8.3f} {large:>8.3f} {large / max(small, 1e-9):>6.1f}"
+              f"{'  ❌' if over else ''}")
+    if failures:
+        print(f"❌ {failures} of {len(results)} runs grew more than {max_ratio:g}x when their input doubled")
+    else:
+        print(f"✅ All {len(results)} runs scaled linearly")
+    return failures
+
+def _over_ratio(small, large, max_ratio):
+    # A run aborted at the edit budget (inf) always fails, even when both sizes were aborted.
+    return large >= NOISE_FLOOR_SECONDS and (large == float('inf') or large > max_ratio * small)
+
+# (label, arguments, budget in milliseconds) for each command whose start-to-exit time is tracked.
+# '{project}' is replaced by a minimal project; the budgets are medians, on a cached bytecode run.
+STARTUP_COMMANDS = (
+    ('--help', ['--help'], 100),
+    ('check', ['check', '{project}', '--no-daemon'], 200),
+    ('apply --dry-run', ['--offline', '--patch-cache', 'off', 'apply', '{project}', '--app-id', 'bench',
+                         '--push', '--no-daemon', '--dry-run', '--skip-library-scan'], 300),
+)
+
+def _startup_project(root):
+    """Write the smallest project the integrator accepts."""
+    files = {
+        'settings.gradle': "include ':app'\n",
+        os.path.join('app', 'build.gradle'): "android {\n    defaultConfig {\n        applicationId \"com.example.bench\"\n"
+                                             "        targetSdk 34\n    }\n}\n\ndependencies {\n}\n",
+        os.path.join('app', 'src', 'main', 'AndroidManifest.xml'):
+            '<?xml version="1.0" encoding="utf-8"?>\n<manifest xmlns:android="http://schemas.android.com/apk/res/android">\n'
+            '    <application android:label="Bench">\n    </application>\n</manifest>\n',
+        os.path.join('app', 'src', 'main', 'java', 'com', 'example', 'bench', 'MainActivity.kt'):
+            "package com.example.bench\n\nclass MainActivity\n",
+    }
+    for name, content in files.items():
+        path = os.path.join(root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+
+def startup_benchmark(runs=10, budget_scale=1.0, zipapp_path=None):
+    """
+    Time the integrator from process start to exit for the commands in STARTUP_COMMANDS.
+
+    Each command runs once untimed, so bytecode caches are warm, then runs times; the median is
+    compared with its budget.
+
+    Args:
+        runs (int): Timed runs per command
+        budget_scale (float): Factor applied to every budget, e.g. 2 on a slow CI machine
+        zipapp_path (str): Time this zipapp instead of the source tree
+
+    Returns:
+        int: Number of commands over budget
+    """
+    import statistics
+    import subprocess
+    import sys
+
+    if zipapp_path:
+        command, cwd = [sys.executable, os.path.abspath(zipapp_path)], None
+    else:
+        command = [sys.executable, '-m', 'src.main.integrator']
+        cwd = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        if sys.dont_write_bytecode:
+            print("⚠️ PYTHONDONTWRITEBYTECODE is set: modules changed since their bytecode was cached are compiled on every run")
+    work_dir = tempfile.mkdtemp(prefix='smartech-startup-')
+    failures = 0
+    try:
+        project = os.path.join(work_dir, 'project')
+        _startup_project(project)
+        print(f"{'command':<24} {'median ms':>10} {'max ms':>8} {'budget':>8}")
+        for label, arguments, budget in STARTUP_COMMANDS:
+            argv = command + [argument.replace('{project}', project) for argument in arguments]
+            timings = []
+            for attempt in range(runs + 1):
+                started = time.perf_counter()
+                subprocess.run(argv, cwd=cwd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                if attempt:
+                    timings.append((time.perf_counter() - started) * 1000)
+            median, budget = statistics.median(timings), budget * budget_scale
+            over = median > budget
+            failures += over
+            print(f"{label:<24} {median:>10.1f} {max(timings):>8.1f} {budget:>8.0f}{'  ❌' if over else ''}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    if failures:
+        print(f"❌ {failures} of {len(STARTUP_COMMANDS)} commands started slower than their budget")
+    else:
+        print(f"✅ All {len(STARTUP_COMMANDS)} commands finished within budget")
+    return failures
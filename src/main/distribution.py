@@ -0,0 +1,53 @@
+import os
+import py_compile
+import shutil
+import tempfile
+import zipapp
+
+DEFAULT_INTERPRETER = '/usr/bin/env python3'
+MAIN_SOURCE = "import sys\n\nfrom src.main.integrator import main\n\nsys.exit(main())\n"
+
+def _compile_tree(root):
+    """Compile every module under root to a .pyc beside its source, the layout zipimport loads bytecode from."""
+    count = 0
+    for directory, dirs, files in os.walk(root):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith('.py'):
+                path = os.path.join(directory, name)
+                # Unchecked hash-based bytecode is loaded as is, without reading the source it was built from.
+                py_compile.compile(path, cfile=path + 'c', dfile=os.path.relpath(path, root), doraise=True,
+                                   invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH)
+                count += 1
+    return count
+
+def build_zipapp(output, interpreter=DEFAULT_INTERPRETER, compiled=True):
+    """
+    Build a single-file, self-contained integrator that runs with `python <output>` or directly.
+
+    The archive holds the src package, its built-in templates and a __main__ that runs the
+    command line. With compiled, every module is shipped precompiled as well, so a run never
+    compiles source, even where bytecode cannot be cached (a read-only install, or
+    PYTHONDONTWRITEBYTECODE). The bytecode is tied to the building interpreter's minor version;
+    another interpreter falls back to the sources in the archive.
+
+    Args:
+        output (str): Path of the .pyz file to write
+        interpreter (str): Shebang interpreter, or None for no shebang
+        compiled (bool): Ship precompiled bytecode next to the sources
+
+    Returns:
+        int: Number of modules precompiled
+    """
+    package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    staging = tempfile.mkdtemp(prefix='smartech-zipapp-')
+    try:
+        shutil.copytree(package_dir, os.path.join(staging, 'src'),
+                        ignore=shutil.ignore_patterns('__pycache__', '*.pyc', '*.pyo'))
+        with open(os.path.join(staging, '__main__.py'), 'w') as f:
+            f.write(MAIN_SOURCE)
+        count = _compile_tree(staging) if compiled else 0
+        zipapp.create_archive(staging, output, interpreter=interpreter, compressed=True)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    return count
@@ -1,14 +1,14 @@
 import os
 import sys
-from ..application.application_manager import find_application_class, create_application_class, inject_sdk_initialization, inject_debug_level, inject_notification_appearance
-from ..deeplink.deeplink_manager import create_deeplink_receiver
-from ..manifest.manifest_manager import modify_manifest, inject_push_meta_tag, register_firebase_service, inject_location_tracking_meta_tag
-from ..gradle.gradle_manager import extract_target_sdk, extract_application_id, modify_gradle, inject_push_dependency, modify_settings_gradle
-from ..push.push_manager import find_push_service_class, create_push_service_class, inject_push_logic
-from ..backup.backup_manager import create_backup_xml_files
-
-def validate_android_project(project_dir):
+
+# Managers are imported by the steps that use them, so --help, a daemon client and a run that
+# skips the push or library scan steps do not pay to load code they never call.
+
+def validate_android_project(project_dir, fs=None):
     """Validate that the project directory contains the required Android project structure."""
+    from ..fs.fs_manager import LOCAL_FS
+
+    fs = fs or LOCAL_FS
     required_paths = [
         os.path.join(project_dir, "app"),
         os.path.join(project_dir, "app", "src", "main"),
@@ -19,10 +19,10 @@ def validate_android_project(project_dir):
     # Check for either build.gradle or build.gradle.kts
     gradle_path = os.path.join(project_dir, "app", "build.gradle")
     gradle_kts_path = os.path.join(project_dir, "app", "build.gradle.kts")
-    if not os.path.exists(gradle_path) and not os.path.exists(gradle_kts_path):
+    if not fs.exists(gradle_path) and not fs.exists(gradle_kts_path):
         required_paths.append("app/build.gradle or app/build.gradle.kts")
     
-    missing_paths = [path for path in required_paths if not os.path.exists(path)]
+    missing_paths = [path for path in required_paths if not fs.exists(path)]
     
     if missing_paths:
         print("\nError: The specified directory is not a valid Android project.")
@@ -55,200 +55,324 @@ def get_user_input():
 
     return project_dir, app_id
 
-def integrate_smartech(project_dir, app_id):
+def ask_yes_no(question, answers=None, key=None):
+    """Return a yes/no answer, taken from answers[key] when provided instead of prompting."""
+    if answers is not None and key in answers:
+        return bool(answers[key])
+    while True:
+        answer = input(question).strip().lower()
+        if answer in ['yes', 'no']:
+            return answer == 'yes'
+        print("Error: Please enter 'yes' or 'no'.")
+
+NOTIFICATION_PROMPTS = (
+    ('brand_logo', "Brand logo resource name (e.g., logo): "),
+    ('large_icon', "Large icon resource name (e.g., icon_notification): "),
+    ('small_icon', "Small icon resource name (e.g., ic_action_play): "),
+    ('small_icon_transparent', "Transparent small icon resource name (e.g., ic_action_play): "),
+    ('transparent_bg_color', "Transparent icon background color (e.g., #FF0000): "),
+    ('placeholder_icon', "Placeholder icon resource name (e.g., ic_notification): "),
+)
+
+def _ask_notification_option(prompt, option, resources):
+    """Prompt for a notification option until it is empty or valid for the app's resources."""
+    from ..resource.resource_manager import check_notification_option
+
+    while True:
+        value = input(prompt).strip()
+        problem = check_notification_option(option, value, resources) if value else None
+        if problem is None:
+            return value
+        print(f"   ⚠️ {problem}")
+
+def integrate_smartech(project_dir, app_id, answers=None, index=None, fs=None, progress=None):
     """
     Main integration function that orchestrates the Smartech SDK integration process.
     
     Args:
         project_dir (str): Path to the Android project directory
         app_id (str): Smartech App ID
+        answers (dict): Optional pre-filled answers (enable_debug, enable_location,
+            integrate_push, ask_permission, notification_options) used instead of prompting,
+            variant_app_ids, a dict of source set -> SMT_APP_ID for per-variant App IDs, and
+            scan_libraries, False to skip the library manifest conflict scan
+        index (ProjectIndex): Optional warm project index used instead of rescanning sources
+        fs: Filesystem to read and write the project on (the index's, or the local disk by default)
+        progress (Progress): Receives step and scan progress; its cancel token is checked between
+            steps and between scanned files, so a cancelled run stops with every file complete
+
+    Raises:
+        Cancelled: If the progress token was cancelled; the steps before it are fully applied
     """
+    from ..application.application_manager import (create_application_class, find_application_class, inject_debug_level,
+                                                    inject_sdk_initialization)
+    from ..backup.backup_manager import backup_rules_name, create_backup_xml_files
+    from ..deeplink.deeplink_manager import DEEPLINK_ACTION, create_deeplink_receiver, find_action_handlers
+    from ..fs.fs_manager import LOCAL_FS
+    from ..gradle.gradle_manager import (extract_application_id, extract_target_sdk, modify_gradle, modify_settings_gradle,
+                                         parse_gradle)
+    from ..index.index_manager import class_name_from_path, resolve_project_paths
+    from ..manifest.manifest_manager import (inject_location_tracking_meta_tag, modify_manifest, parse_manifest,
+                                             update_variant_manifests, variant_manifest_paths)
+    from ..maven.maven_manager import resolve_sdk_version
+    from ..progress.progress_manager import Cancelled, Progress
+
+    fs = fs or (index.fs if index is not None else LOCAL_FS)
+    progress = progress or Progress()
     try:
         print("\n 🧑🏻‍💻 Starting Smartech SDK integration process...")
         
         # Define paths
-        app_dir = os.path.join(project_dir, "app")
-        src_dir = os.path.join(app_dir, "src", "main", "java")
-        manifest_path = os.path.join(app_dir, "src", "main", "AndroidManifest.xml")
-        
-        # Check for both gradle file types
-        gradle_path = os.path.join(app_dir, "build.gradle")
-        gradle_kts_path = os.path.join(app_dir, "build.gradle.kts")
-        if os.path.exists(gradle_kts_path):
-            gradle_path = gradle_kts_path
-
-        # Check for settings.gradle file
-        settings_path = os.path.join(project_dir, "settings.gradle")
-        settings_kts_path = os.path.join(project_dir, "settings.gradle.kts")
-        if os.path.exists(settings_kts_path):
-            settings_path = settings_kts_path
-        elif not os.path.exists(settings_path):
+        paths = resolve_project_paths(project_dir, fs)
+        src_dir = paths['src_dir']
+        manifest_path = paths['manifest_path']
+        gradle_path = paths['gradle_path']
+        settings_path = paths['settings_path']
+        if settings_path is None:
             print("Error: Could not find settings.gradle or settings.gradle.kts file")
             return False
 
+        # Read the target SDK first: the library scan below must run before any file is written
+        if index is not None:
+            gradle_model = index.gradle_model()
+            target_sdk, application_id = gradle_model['target_sdk'], gradle_model['application_id']
+        else:
+            target_sdk = extract_target_sdk(gradle_path, fs)
+            application_id = extract_application_id(gradle_path, fs)
+
+        # Look for library manifests that would fail the manifest merge once the integration is applied
+        if (answers or {}).get('scan_libraries', True):
+            from ..conflict.conflict_manager import library_conflicts, planned_application, scan_library_manifests
+
+            print("Checking library manifests for merge conflicts...")
+            manifest = index.manifest_model() if index is not None else parse_manifest(fs.read_text(manifest_path))
+            sources = scan_library_manifests(paths, fs, progress=progress)
+            backup_rules = backup_rules_name(manifest['application'], target_sdk, paths['res_dir'], fs)
+            conflicts = library_conflicts(sources, planned_application(target_sdk, backup_rules=backup_rules),
+                                          manifest['application'], manifest['package'])
+            for conflict in conflicts:
+                print(f"   ⚠️ {conflict['source']}: {conflict['message']}")
+            if not conflicts:
+                print(f"   ✅ No conflicts in {len(sources)} library manifest(s)")
+
+        # Check notification appearance options against the app's resources before anything is written
+        notification_options = (answers or {}).get('notification_options') or {}
+        if notification_options:
+            from ..resource.resource_manager import resource_index, validate_notification_options
+
+            problems = validate_notification_options(notification_options, resource_index(paths['app_dir'], fs))
+            if problems:
+                print("Error: invalid notification appearance options:")
+                for problem in problems:
+                    print(f"   ❌ {problem}")
+                return False
+
         # Add Smartech repository to settings.gradle
+        progress.step("Adding Smartech repository")
         print("1. Adding Smartech repository...")
-        modify_settings_gradle(settings_path)
+        modify_settings_gradle(settings_path, fs)
         print("   ✅ Added Smartech repository to settings.gradle")
 
-        # Extract target SDK version and application ID
+        # Report target SDK version and application ID
+        progress.step("Extracting project information")
         print("2. Extracting project information...")
-        target_sdk = extract_target_sdk(gradle_path)
-        application_id = extract_application_id(gradle_path)
         if not application_id:
             print("Error: Could not find applicationId in build.gradle file")
             return False
         print(f"   ✅ Target SDK version: {target_sdk}")
         print(f"   🔔 Application ID: {application_id}")
+        sdk_version = resolve_sdk_version(target_sdk)
+        print(f"   ✅ Smartech SDK version: {sdk_version}")
 
         # Find or create application class
+        progress.step("Setting up application class")
         print("3. Setting up application class...")
-        app_class_path, language = find_application_class(src_dir)
+        if index is not None:
+            app_class_path, language = index.application_class(progress)
+        else:
+            app_class_path, language = find_application_class(src_dir, fs, progress)
         if not app_class_path:
-            app_class_path = create_application_class(src_dir, language,application_id)
+            app_class_path = create_application_class(src_dir, language, application_id, target_sdk, fs)
             print("   ✅ Created new application class")
         else:
             print("   ⚠️ Found existing application class")
         
         # Create deep link receiver
+        progress.step("Setting up deep link receiver")
         print("4. Setting up deep link receiver...")
-        create_deeplink_receiver(src_dir, language,application_id)
-        print("   ✅ Deep link receiver configured")
+        if index is not None:
+            deeplink_handlers = index.action_handlers(DEEPLINK_ACTION, progress)
+        else:
+            manifest_paths = [manifest_path] + list(variant_manifest_paths(paths['app_dir'], fs).values())
+            deeplink_handlers = find_action_handlers(DEEPLINK_ACTION, src_dir, manifest_paths, fs, progress)
+        if deeplink_handlers:
+            # An app receiving the broadcast already would otherwise handle every deep link twice
+            for handler in deeplink_handlers:
+                where = os.path.relpath(handler['file'], project_dir)
+                if handler['kind'] == 'manifest':
+                    print(f"   ✅ Deep links already received by {handler['receiver']} (<receiver> in {where})")
+                else:
+                    print(f"   ✅ Deep links already received through registerReceiver in {where}")
+        else:
+            create_deeplink_receiver(src_dir, language, application_id, target_sdk, fs)
+            print("   ✅ Deep link receiver configured")
 
         # Modify manifest
+        progress.step("Updating Android manifest")
         print("5. Updating Android manifest...")
-        app_class_relative = os.path.relpath(app_class_path, src_dir).replace(os.sep, '.').replace('.java', '').replace('.kt', '')
-        modify_manifest(manifest_path, app_id, app_class_relative, target_sdk)
+        app_class_relative = class_name_from_path(app_class_path, src_dir)
+        # Backup rules the app already points at are kept and merged into in step 7
+        backup_rules = backup_rules_name(parse_manifest(fs.read_text(manifest_path))['application'], target_sdk,
+                                         paths['res_dir'], fs)
+        modify_manifest(manifest_path, app_id, app_class_relative, target_sdk, fs, backup_rules)
         print("   ✅ Manifest updated with Smartech configurations")
 
         # Modify gradle
+        progress.step("Updating Gradle configuration")
         print("6. Updating Gradle configuration...")
-        modify_gradle(gradle_path)
+        modify_gradle(gradle_path, fs, sdk_version)
         print("   ✅ Gradle configuration updated")
 
         # Create backup configuration files
+        progress.step("Setting up backup configuration")
         print("7. Setting up backup configuration...")
-        create_backup_xml_files(project_dir, target_sdk, manifest_path)
-        print("   ✅ Backup configuration created")
+        backup_path, excluded = create_backup_xml_files(paths['res_dir'], target_sdk, manifest_path, fs)
+        for _, path in excluded:
+            print(f"   ⚠️ {os.path.basename(backup_path)} excludes {path}, so Smartech cannot restore its GUID "
+                  "after a reinstall; remove that exclude")
+        print(f"   ✅ Backup configuration set up in {os.path.basename(backup_path)}")
 
         # Inject SDK initialization
+        progress.step("Injecting SDK initialization")
         print("8. Injecting SDK initialization...")
-        inject_sdk_initialization(app_class_path, language, target_sdk)
+        inject_sdk_initialization(app_class_path, language, target_sdk, fs, register_deeplink=not deeplink_handlers)
         print("   ✅ SDK initialization code injected")
 
         # Ask about debug logs
-        while True:
-            enable_debug = input("\nDo you want to enable debug logs? (yes/no): ").strip().lower()
-            if enable_debug in ['yes', 'no']:
-                break
-            print("Error: Please enter 'yes' or 'no'.")
+        enable_debug = ask_yes_no("\nDo you want to enable debug logs? (yes/no): ", answers, 'enable_debug')
 
         # Inject debug level setting
+        progress.step("Setting debug level")
         print("9. Setting debug level...")
-        inject_debug_level(app_class_path, language, enable_debug == 'yes')
-        print(f"   ✅ Debug logs {'enabled' if enable_debug == 'yes' else 'disabled'}")
+        inject_debug_level(app_class_path, language, enable_debug, fs)
+        print(f"   ✅ Debug logs {'enabled' if enable_debug else 'disabled'}")
 
         # Ask about location tracking
-        while True:
-            enable_location = input("\nDo you want to enable location tracking? (yes/no): ").strip().lower()
-            if enable_location in ['yes', 'no']:
-                break
-            print("Error: Please enter 'yes' or 'no'.")
+        enable_location = ask_yes_no("\nDo you want to enable location tracking? (yes/no): ", answers, 'enable_location')
 
         # Inject location tracking meta tag
+        progress.step("Setting location tracking")
         print("10. Setting location tracking...")
-        inject_location_tracking_meta_tag(manifest_path, enable_location == 'yes')
-        print(f"   ✅ Location tracking: {'Enabled' if enable_location == 'yes' else 'Disabled'}")
+        inject_location_tracking_meta_tag(manifest_path, enable_location, fs)
+        print(f"   ✅ Location tracking: {'Enabled' if enable_location else 'Disabled'}")
 
         print("\nCore Smartech SDK integration completed successfully!")
         print(f"Project directory: {project_dir}")
         print(f"Smartech App ID: {app_id}")
 
         # Ask about push SDK integration
-        while True:
-            integrate_push = input("\nDo you want to integrate Push SDK? (yes/no): ").strip().lower()
-            if integrate_push in ['yes', 'no']:
-                break
-            print("Error: Please enter 'yes' or 'no'.")
+        integrate_push = ask_yes_no("\nDo you want to integrate Push SDK? (yes/no): ", answers, 'integrate_push')
+
+        if integrate_push:
+            from ..application.application_manager import inject_notification_appearance
+            from ..gradle.gradle_manager import inject_push_dependency
+            from ..manifest.manifest_manager import inject_push_meta_tag, register_firebase_service
+            from ..push.push_manager import create_push_service_class, find_push_service, inject_push_logic
 
-        if integrate_push == 'yes':
             print("\nStarting Push SDK integration process...")
             
             # Handle push notifications
+            progress.step("Setting up push notification service")
             print("1. Setting up push notification service...")
-            push_class_path, push_language = find_push_service_class(src_dir)
+            if index is not None:
+                push_service = index.push_service(progress)
+            else:
+                push_service = find_push_service(src_dir, parse_manifest(fs.read_text(manifest_path)),
+                                                 parse_gradle(fs.read_text(gradle_path))['namespace'], fs, progress)
+            push_class_path = push_service['path']
+            for name in push_service['unresolved']:
+                print(f"   ⚠️ {name} is registered for MESSAGING_EVENT, but its class is not in the app sources")
             if not push_class_path:
-                push_class_path = create_push_service_class(src_dir, language,application_id)
+                push_class_path = create_push_service_class(src_dir, language, application_id, target_sdk, fs)
                 print("   🔔 Created new push notification service")
             else:
-                inject_push_logic(push_class_path, push_language)
-                print("   ✅ Updated existing push notification service")
+                inject_push_logic(push_class_path, push_service['language'], fs)
+                print(f"   ✅ Updated existing push notification service {push_service['class_name']}")
+                if push_service['others']:
+                    reason = ("the manifest registers it for MESSAGING_EVENT" if push_service['registered']
+                              else "no service is registered for MESSAGING_EVENT, so the first by path was chosen")
+                    print(f"   ⚠️ Also found {', '.join(push_service['others'])}, left unchanged: {reason}")
 
             # Register Firebase service in manifest
+            progress.step("Registering Firebase service in manifest")
             print("2. Registering Firebase service in manifest...")
-            service_name = os.path.basename(push_class_path).replace('.kt', '').replace('.java', '')
-            register_firebase_service(manifest_path, service_name)
-            print("   🔔 Firebase service registered")
+            if push_service['registered']:
+                print(f"   🔔 Firebase service {push_service['android_name']} already registered")
+            else:
+                service_name = os.path.basename(push_class_path).replace('.kt', '').replace('.java', '')
+                register_firebase_service(manifest_path, service_name, fs, push_service['android_name'])
+                print("   🔔 Firebase service registered")
 
             # Add push dependency to gradle
+            progress.step("Adding push dependencies to Gradle")
             print("3. Adding push dependencies to Gradle...")
-            inject_push_dependency(gradle_path)
+            inject_push_dependency(gradle_path, fs, sdk_version)
             print("   🔔 Push dependencies added")
 
             # Ask about push permission
-            while True:
-                ask_permission = input("\nDo you want to ask for push notification permission? (yes/no): ").strip().lower()
-                if ask_permission in ['yes', 'no']:
-                    break
-                print("Error: Please enter 'yes' or 'no'.")
+            ask_permission = ask_yes_no("\nDo you want to ask for push notification permission? (yes/no): ", answers, 'ask_permission')
 
             # Update manifest with push permission setting
+            progress.step("Updating push notification settings")
             print("4. Updating push notification settings...")
-            inject_push_meta_tag(manifest_path, ask_permission == 'yes')
-            print(f"   ✅ Push notification permission: {'Enabled' if ask_permission == 'yes' else 'Disabled'}")
+            inject_push_meta_tag(manifest_path, ask_permission, fs)
+            print(f"   ✅ Push notification permission: {'Enabled' if ask_permission else 'Disabled'}")
 
             # Ask about notification appearance
-            while True:
-                modify_notification = input("\nDo you want to modify notification appearance? (yes/no): ").strip().lower()
-                if modify_notification in ['yes', 'no']:
-                    break
-                print("Error: Please enter 'yes' or 'no'.")
-
-            if modify_notification == 'yes':
+            if answers is not None:
+                notification_options = answers.get('notification_options') or {}
+                if notification_options:
+                    progress.step("Setting notification appearance")
+                    print("5. Setting notification appearance...")
+                    inject_notification_appearance(app_class_path, language, notification_options, fs)
+                    print("   ✅ Notification appearance configured")
+            elif ask_yes_no("\nDo you want to modify notification appearance? (yes/no): "):
                 print("\nPlease provide the resource names for notification customization (press Enter to skip any option):")
-                notification_options = {}
-                
-                brand_logo = input("Brand logo resource name (e.g., logo): ").strip()
-                if brand_logo:
-                    notification_options['brand_logo'] = brand_logo
-
-                large_icon = input("Large icon resource name (e.g., icon_notification): ").strip()
-                if large_icon:
-                    notification_options['large_icon'] = large_icon
-
-                small_icon = input("Small icon resource name (e.g., ic_action_play): ").strip()
-                if small_icon:
-                    notification_options['small_icon'] = small_icon
-
-                small_icon_transparent = input("Transparent small icon resource name (e.g., ic_action_play): ").strip()
-                if small_icon_transparent:
-                    notification_options['small_icon_transparent'] = small_icon_transparent
-
-                transparent_bg_color = input("Transparent icon background color (e.g., #FF0000): ").strip()
-                if transparent_bg_color:
-                    notification_options['transparent_bg_color'] = transparent_bg_color
+                from ..resource.resource_manager import resource_index
 
-                placeholder_icon = input("Placeholder icon resource name (e.g., ic_notification): ").strip()
-                if placeholder_icon:
-                    notification_options['placeholder_icon'] = placeholder_icon
+                notification_options = {}
+                resources = resource_index(paths['app_dir'], fs)
+                for option, prompt in NOTIFICATION_PROMPTS:
+                    value = _ask_notification_option(prompt, option, resources)
+                    if value:
+                        notification_options[option] = value
 
                 if notification_options:
+                    progress.step("Setting notification appearance")
                     print("5. Setting notification appearance...")
-                    inject_notification_appearance(app_class_path, language, notification_options)
+                    inject_notification_appearance(app_class_path, language, notification_options, fs)
                     print("   ✅ Notification appearance configured")
 
             print("\n 🔔 Push SDK integration completed successfully!")
+
+        # Carry the Smartech settings into build-type and flavor manifests that would override them when merged
+        variant_app_ids = (answers or {}).get('variant_app_ids')
+        progress.step("Updating variant manifests")
+        gradle_model = index.gradle_model() if index is not None else parse_gradle(fs.read_text(gradle_path))
+        placements = update_variant_manifests(paths['app_dir'], manifest_path, variant_app_ids, fs, gradle_model['namespace'])
+        if placements:
+            print("\nUpdating variant manifests...")
+            for path, placement in placements.values():
+                relative = os.path.relpath(path, project_dir)
+                changed = list(placement['meta_data']) + list(placement['application'])
+                if changed:
+                    print(f"   ✅ {relative}: set {', '.join(changed)}")
+                for warning in placement['warnings']:
+                    print(f"   ⚠️ {relative}: {warning}")
         
+    except Cancelled:
+        print("\n⚠️ Integration cancelled. Every file written so far is complete; run the integrator again to finish.")
+        raise
     except Exception as e:
         print(f"\nError during integration: {str(e)}")
         print("Please check the error message above and try again.")
@@ -256,7 +380,17 @@ def integrate_smartech(project_dir, app_id):
     
     return True
 
-if __name__ == "__main__":
+def _terminal_progress():
+    """Return a Progress drawing a bar on the terminal, with its own cancel token."""
+    from ..progress.progress_manager import CancelToken, Progress, ProgressBar
+
+    return Progress(ProgressBar(), CancelToken())
+
+def run_interactive():
+    """Run the interactive, prompt-driven integration; returns EXIT_CANCELLED if it was cancelled."""
+    from ..lock.lock_manager import ProjectLock, ProjectLockTimeout
+    from ..progress.progress_manager import EXIT_CANCELLED, Cancelled, cancel_on_interrupt
+
     print("🛠  Welcome to Smartech SDK Integrator!")
     print(" 🩺This tool will help you integrate the Smartech SDK into your Android project.")
     print("\nPlease provide the following information:")
@@ -270,7 +404,387 @@ if __name__ == "__main__":
     project_dir, app_id = get_user_input()
     
     print("\nStarting integration process...")
-    if integrate_smartech(project_dir, app_id):
+    progress = _terminal_progress()
+    try:
+        with ProjectLock(project_dir, exclusive=True) as lock, cancel_on_interrupt(progress.token):
+            if lock.stale_warning():
+                print(lock.stale_warning())
+            ok = integrate_smartech(project_dir, app_id, progress=progress)
+    except ProjectLockTimeout as e:
+        print(f"❌ {e}")
+        ok = False
+    except Cancelled:
+        return EXIT_CANCELLED
+    if ok:
         print("\n ✅🧑🏻‍💻Integration completed successfully! ✅🧑🏻‍💻")
     else:
-        print("\n ❌❌❌ Integration failed. Please check the error messages above. ❌❌❌") 
\ No newline at end of file
+        print("\n ❌❌❌ Integration failed. Please check the error messages above. ❌❌❌")
+
+def _add_project_arguments(parser):
+    parser.add_argument('project_dir', help='Path to the Android project directory')
+    parser.add_argument('--app-id', help='Smartech App ID')
+    parser.add_argument('--socket', help='Daemon socket path (default: $SMARTECH_INTEGRATOR_SOCKET or a per-user temp path)')
+    parser.add_argument('--no-daemon', action='store_true', help='Always run in-process, even if a daemon is running')
+    parser.add_argument('--git-rev', help='Read the project from this commit of the git repository at project_dir, without a checkout')
+    parser.add_argument('--subdir', help='Project directory inside the repository (with --git-rev)')
+    parser.add_argument('--lock-timeout', type=float, help='Seconds to wait for another run on the project to finish (default: $SMARTECH_LOCK_TIMEOUT or 600)')
+
+def _add_answer_arguments(parser):
+    parser.add_argument('--debug', dest='enable_debug', action='store_true', default=None, help='Enable debug logs')
+    parser.add_argument('--location', dest='enable_location', action='store_true', default=None, help='Enable location tracking')
+    parser.add_argument('--push', dest='integrate_push', action='store_true', default=None, help='Integrate the Push SDK')
+    parser.add_argument('--ask-permission', dest='ask_permission', action='store_true', default=None, help='Ask for push notification permission')
+    parser.add_argument('--variant-app-id', dest='variant_app_ids', action='append', type=_variant_app_id, metavar='SOURCE_SET=APP_ID',
+                        help='SMT_APP_ID for a build type or flavor manifest, e.g. debug=<APP_ID> (repeatable)')
+
+def _variant_app_id(value):
+    import argparse
+
+    source_set, _, app_id = value.partition('=')
+    if not source_set or not app_id:
+        raise argparse.ArgumentTypeError(f"expected SOURCE_SET=APP_ID, got {value!r}")
+    return source_set, app_id
+
+def _answers_from_args(args):
+    answers = {key: getattr(args, key) for key in ('enable_debug', 'enable_location', 'integrate_push', 'ask_permission')
+               if getattr(args, key) is not None}
+    if args.variant_app_ids:
+        answers['variant_app_ids'] = dict(args.variant_app_ids)
+    if getattr(args, 'skip_library_scan', False):
+        answers['scan_libraries'] = False
+    return answers
+
+def _print_upgrade(record):
+    project = record['project']
+    if 'error' in record:
+        print(f"❌ {project}: {record['error']}")
+        return
+    if not record['coordinates'] and not record['unresolved']:
+        print(f"➖ {project}: no Smartech dependency found")
+    for coordinate in record['coordinates']:
+        if coordinate['action'] == 'upgrade':
+            print(f"⬆️  {project}: {coordinate['artifact']} {coordinate['from']} -> {record['version']} ({coordinate['file']})")
+        elif coordinate['action'] == 'newer':
+            print(f"⚠️ {project}: {coordinate['artifact']} {coordinate['from']} is newer than {record['version']}, "
+                  f"left alone ({coordinate['file']})")
+        else:
+            print(f"✅ {project}: {coordinate['artifact']} is already {record['version']} ({coordinate['file']})")
+    for problem in record['unresolved']:
+        print(f"⚠️ {project}: {problem}")
+    if record.get('diff'):
+        print(record['diff'], end='')
+
+def build_parser():
+    """Build the command line parser for the non-interactive commands."""
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='python -m src.main.integrator',
+                                     description='Smartech SDK integrator. Run without arguments for the interactive flow.')
+    parser.add_argument('--templates', help='Directory of code templates overriding the built-in ones '
+                                            '(default: $SMARTECH_TEMPLATES_DIR)')
+    parser.add_argument('--patch-cache', help="Where to cache integration patches: a directory (local or shared), "
+                                              "'package.module:factory' for a custom store, or 'off' "
+                                              "(default: $SMARTECH_PATCH_CACHE or the user cache directory)")
+    parser.add_argument('--offline', action='store_true', default=None,
+                        help='Pick SDK versions from cached repository metadata only, never fetching (default: $SMARTECH_OFFLINE)')
+    parser.add_argument('--maven-repository', help='Repository URL or directory to read SDK versions from '
+                                                   '(default: $SMARTECH_MAVEN_REPOSITORY or the Netcore repository)')
+    commands = parser.add_subparsers(dest='command')
+
+    serve_parser = commands.add_parser('serve', help='Run a daemon that keeps project caches warm')
+    serve_parser.add_argument('--socket', help='Socket path to listen on')
+
+    plan_parser = commands.add_parser('plan', help='List the changes an integration would make')
+    _add_project_arguments(plan_parser)
+    _add_answer_arguments(plan_parser)
+
+    apply_parser = commands.add_parser('apply', help='Integrate non-interactively')
+    _add_project_arguments(apply_parser)
+    _add_answer_arguments(apply_parser)
+    apply_parser.add_argument('--dry-run', action='store_true', help='Print the diff of the changes instead of writing them')
+    apply_parser.add_argument('--branch', help='With --git-rev: branch to commit the integration to')
+    apply_parser.add_argument('--message', help='With --git-rev: commit message')
+    apply_parser.add_argument('--skip-library-scan', action='store_true',
+                              help='Do not scan library modules and cached AARs for manifest merge conflicts first')
+
+    check_parser = commands.add_parser('check', help='Report integration drift without writing files (exit 0 ok, 1 drift, 2 error)')
+    _add_project_arguments(check_parser)
+    check_parser.add_argument('--json', action='store_true', help='Print the drift items as JSON')
+
+    watch_parser = commands.add_parser('watch', help='Re-verify the integration whenever project files change')
+    watch_parser.add_argument('project_dir', help='Path to the Android project directory')
+    watch_parser.add_argument('--app-id', help='Expected Smartech App ID')
+    watch_parser.add_argument('--interval', type=float, default=0.5, help='Polling interval in seconds')
+    watch_parser.add_argument('--polling', action='store_true', help='Poll file stats instead of using inotify')
+
+    conflicts_parser = commands.add_parser('conflicts', help='Scan library modules and cached AARs for manifest merge conflicts '
+                                                             '(exit 0 none, 1 conflicts)')
+    conflicts_parser.add_argument('project_dir', help='Path to the Android project directory or snapshot')
+    conflicts_parser.add_argument('--gradle-home', help='Gradle user home holding the dependency cache (default: $GRADLE_USER_HOME or ~/.gradle)')
+    conflicts_parser.add_argument('--no-aars', action='store_true', help='Only scan the library modules of the build')
+    conflicts_parser.add_argument('--workers', type=int, help='Worker processes (default: one per CPU)')
+    conflicts_parser.add_argument('--json', action='store_true', help='Print the conflicts as JSON')
+
+    inventory_parser = commands.add_parser('inventory', help='Stream one JSON record per project describing its integration')
+    inventory_parser.add_argument('source', help='Directory of project checkouts, or a file listing one project path per line')
+    inventory_parser.add_argument('--workers', type=int, default=8, help='Number of projects inspected in parallel')
+    inventory_parser.add_argument('--processes', action='store_true', help='Use worker processes instead of threads')
+    inventory_parser.add_argument('--output', help='Write JSONL to this file instead of stdout')
+
+    fleet_parser = commands.add_parser('fleet', help='Integrate many projects, sharded across nodes and resumable from a journal '
+                                                     '(exit 0 all integrated, 1 otherwise)')
+    fleet_parser.add_argument('source', help="Directory of project checkouts, or a file listing one project path per line "
+                                             "(optionally followed by a tab and the project's App ID)")
+    fleet_parser.add_argument('--app-id', help='Smartech App ID for projects the list gives none for')
+    _add_answer_arguments(fleet_parser)
+    fleet_parser.add_argument('--skip-library-scan', action='store_true',
+                              help='Do not scan library modules and cached AARs for manifest merge conflicts first')
+    fleet_parser.add_argument('--shard', help='Only integrate shard i of N, e.g. 2/8; every node must use the same list')
+    fleet_parser.add_argument('--journal', help='Append each project outcome to this JSONL file')
+    fleet_parser.add_argument('--resume', action='store_true', help='Skip projects the journal records as finished')
+
+    upgrade_parser = commands.add_parser('upgrade', help='Move existing Smartech dependencies to another SDK version '
+                                                         '(exit 0 ok, 1 if a version could not be traced or a project failed)')
+    upgrade_parser.add_argument('source', help='Project directory or snapshot, a directory of project checkouts, '
+                                               'or a file listing one project path per line')
+    upgrade_parser.add_argument('--to', dest='version', help="SDK version to move to (default: the newest release that suits each project's targetSdk)")
+    upgrade_parser.add_argument('--dry-run', action='store_true', help='Print the diff of the changes instead of writing them')
+    upgrade_parser.add_argument('--allow-downgrade', action='store_true', help='Also rewrite versions newer than the target')
+    upgrade_parser.add_argument('--workers', type=int, default=8, help='Number of projects upgraded in parallel')
+    upgrade_parser.add_argument('--json', action='store_true', help='Print one JSON record per project')
+
+    versions_parser = commands.add_parser('sdk-versions', help='Show the Smartech releases known to the metadata cache '
+                                                               'and the one new integrations get')
+    versions_parser.add_argument('--target-sdk', type=int, default=33, help='targetSdk to pick a release for')
+    versions_parser.add_argument('--seed', nargs='+', metavar='FILE', help='Store maven-metadata.xml files in the cache, e.g. for offline runs')
+    versions_parser.add_argument('--refresh', action='store_true', help='Fetch the metadata again even if the cached copy is fresh')
+
+    bench_parser = commands.add_parser('regex-bench', help='Time the editing patterns against pathological inputs '
+                                                           '(exit 1 if any does not scale linearly)')
+    bench_parser.add_argument('--size', type=int, default=1024 * 1024, help='Approximate size in characters of the larger inputs')
+    bench_parser.add_argument('--max-ratio', type=float, default=3.0,
+                              help='Allowed growth of a run when its input doubles (2 is linear, 4 quadratic)')
+
+    startup_parser = commands.add_parser('startup-bench', help='Time how long common commands take from start to exit '
+                                                               '(exit 1 if any is over budget)')
+    startup_parser.add_argument('--runs', type=int, default=10, help='Timed runs per command')
+    startup_parser.add_argument('--budget-scale', type=float, default=1.0, help='Factor applied to every budget, e.g. 2 on a slow machine')
+    startup_parser.add_argument('--zipapp', help='Time this zipapp instead of the source tree')
+
+    zipapp_parser = commands.add_parser('build-zipapp', help='Build a single-file integrator with precompiled bytecode')
+    zipapp_parser.add_argument('--output', default='smartech-integrator.pyz', help='Path of the .pyz file to write')
+    zipapp_parser.add_argument('--python', default='/usr/bin/env python3', help='Interpreter for the shebang line')
+    zipapp_parser.add_argument('--no-compile', action='store_true', help='Ship sources only, without precompiled bytecode')
+    return parser
+
+def main(argv=None):
+    """Command line entry point; returns the process exit code."""
+    import json
+
+    from ..progress.progress_manager import EXIT_CANCELLED, Cancelled, cancel_on_interrupt
+
+    argv = sys.argv[1:] if argv is None else argv
+    args = build_parser().parse_args(argv)
+    if args.command in (None, 'serve', 'apply', 'fleet'):
+        from ..templates.template_manager import TemplateError, configure_templates
+
+        from ..cache.cache_manager import configure_patch_cache
+
+        try:
+            configure_templates(args.templates)
+        except TemplateError as e:
+            print(f"Error: {e}")
+            return 2
+        try:
+            configure_patch_cache(args.patch_cache)
+        except (ImportError, AttributeError) as e:
+            print(f"Error: cannot load the patch cache store: {e}")
+            return 2
+    if args.command in (None, 'serve', 'apply', 'fleet', 'upgrade', 'sdk-versions'):
+        from ..maven.maven_manager import configure_metadata
+
+        try:
+            configure_metadata(args.offline, args.maven_repository)
+        except (ImportError, AttributeError, ValueError) as e:
+            print(f"Error: cannot load the metadata fetcher: {e}")
+            return 2
+    if args.command is None:
+        return run_interactive() or 0
+
+    from ..daemon.daemon_manager import run_request, serve
+
+    if args.command == 'serve':
+        serve(args.socket)
+        return 0
+
+    if args.command == 'inventory':
+        from ..inventory.inventory_manager import write_inventory
+
+        if args.output:
+            with open(args.output, 'w') as output:
+                write_inventory(args.source, output, args.workers, args.processes)
+        else:
+            write_inventory(args.source, None, args.workers, args.processes)
+        return 0
+
+    if args.command == 'fleet':
+        from ..fleet.fleet_manager import parse_shard, run_fleet
+
+        if args.resume and not args.journal:
+            print("Error: --resume needs --journal.")
+            return 2
+        try:
+            shard = parse_shard(args.shard) if args.shard else None
+        except ValueError as e:
+            print(f"Error: {e}")
+            return 2
+        progress = _terminal_progress()
+        with cancel_on_interrupt(progress.token):
+            counts = run_fleet(args.source, args.app_id, _answers_from_args(args), args.journal, shard, args.resume,
+                               progress=progress)
+        print(f"\n{counts['ok']} integrated, {counts['failed']} failed, {counts['error']} errors, "
+              f"{counts['skipped']} skipped as already finished")
+        if counts['cancelled']:
+            print("⚠️ Fleet run cancelled" + ("; run it again with --resume to continue." if args.journal else "."))
+            return EXIT_CANCELLED
+        return 0 if not counts['failed'] and not counts['error'] else 1
+
+    if args.command == 'sdk-versions':
+        from ..maven.maven_manager import ARTIFACTS, MetadataError, compatible_versions, metadata_cache
+
+        cache = metadata_cache()
+        for path in args.seed or []:
+            try:
+                with open(path, 'rb') as f:
+                    print(f"✅ Seeded {cache.seed(f.read())} from {path}")
+            except (OSError, MetadataError) as e:
+                print(f"Error: {path}: {e}")
+                return 2
+        for artifact in ARTIFACTS:
+            versions = cache.versions(artifact, args.refresh)
+            if versions is None:
+                print(f"⚠️ {artifact}: no metadata cached{' (offline)' if cache.offline else ''}")
+            else:
+                compatible = compatible_versions(versions, args.target_sdk)
+                print(f"   {artifact}: {len(versions)} release(s), newest {versions[-1] if versions else '-'}, "
+                      f"{len(compatible)} suit targetSdk {args.target_sdk}")
+        print(f"✅ New integrations targeting SDK {args.target_sdk} get {cache.resolve(args.target_sdk)}")
+        return 0
+
+    if args.command == 'upgrade':
+        from ..upgrade.upgrade_manager import iter_upgrades
+
+        incomplete = False
+        for record in iter_upgrades(args.source, args.version, args.dry_run,
+                                    args.allow_downgrade, args.workers):
+            incomplete = incomplete or 'error' in record or bool(record['unresolved'])
+            if args.json:
+                print(json.dumps(record, separators=(',', ':')), flush=True)
+                continue
+            _print_upgrade(record)
+        return 1 if incomplete else 0
+
+    if args.command == 'conflicts':
+        from ..conflict.conflict_manager import find_library_conflicts
+        from ..fs.fs_manager import open_project
+
+        fs, root = open_project(args.project_dir)
+        progress = _terminal_progress()
+        try:
+            with cancel_on_interrupt(progress.token):
+                scanned, conflicts = find_library_conflicts(root, fs, args.gradle_home, not args.no_aars, args.workers,
+                                                            progress)
+        except Cancelled:
+            print("⚠️ Scan cancelled.")
+            return EXIT_CANCELLED
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}")
+            return 2
+        finally:
+            fs.close()
+        if args.json:
+            print(json.dumps(conflicts, indent=2))
+        elif conflicts:
+            print(f"❌ Found {len(conflicts)} conflict(s) in {scanned} library manifest(s):")
+            for conflict in conflicts:
+                print(f"   - [{conflict['kind']}] {conflict['source']}: {conflict['message']}")
+        else:
+            print(f"✅ No conflicts in {scanned} library manifest(s).")
+        return 1 if conflicts else 0
+
+    if args.command == 'regex-bench':
+        from .benchmark import regex_benchmark
+
+        return 1 if regex_benchmark(args.size, args.max_ratio) else 0
+
+    if args.command == 'startup-bench':
+        from .benchmark import startup_benchmark
+
+        return 1 if startup_benchmark(args.runs, args.budget_scale, args.zipapp) else 0
+
+    if args.command == 'build-zipapp':
+        from .distribution import build_zipapp
+
+        compiled = build_zipapp(args.output, args.python, not args.no_compile)
+        print(f"✅ Built {args.output}" + (f" with {compiled} precompiled modules" if compiled else ''))
+        return 0
+
+    if args.command == 'watch':
+        from ..watch.watch_manager import watch_project
+
+        problems = watch_project(args.project_dir, args.app_id, args.interval, args.polling)
+        return 1 if any(problems.values()) else 0
+
+    if args.command == 'apply' and not args.app_id:
+        print("Error: App ID cannot be empty. Pass --app-id.")
+        return 2
+    if args.command == 'apply' and args.git_rev and not (args.branch or args.dry_run):
+        print("Error: --git-rev needs --branch to commit to (or --dry-run).")
+        return 2
+    request = {'op': args.command, 'project_dir': os.path.abspath(args.project_dir), 'app_id': args.app_id}
+    if args.git_rev:
+        request.update(git_rev=args.git_rev, subdir=args.subdir)
+        if args.command == 'apply':
+            request.update(branch=args.branch, message=args.message)
+    if args.lock_timeout is not None:
+        request['lock_timeout'] = args.lock_timeout
+    if args.command in ('plan', 'apply'):
+        request['options'] = _answers_from_args(args)
+    if args.command == 'apply' and args.dry_run:
+        request['dry_run'] = True
+    progress = _terminal_progress()
+    with cancel_on_interrupt(progress.token):
+        response = run_request(request, args.socket, use_daemon=not args.no_daemon, progress=progress)
+
+    if response.get('cancelled'):
+        writes = args.command == 'apply' and not args.dry_run and not args.git_rev
+        print(f"⚠️ {response['error']}." + (" Every file written so far is complete; run the command again to finish."
+                                           if writes else ''))
+        return EXIT_CANCELLED
+
+    if not response['ok'] and 'error' in response:
+        print(f"Error: {response['error']}")
+        return 2
+    result = response['result']
+    if args.command == 'apply':
+        print(result['log'], end='')
+        if 'diff' in result:
+            print(result['diff'], end='')
+        if result.get('commit'):
+            print(f"✅ Committed {result['commit']} to {result['branch']}")
+        elif 'commit' in result and response['ok']:
+            print("✅ Nothing to commit, the project is already integrated.")
+        return 0 if response['ok'] else 1
+    if args.command == 'check':
+        from ..check.check_manager import EXIT_DRIFT, EXIT_OK, print_report
+
+        if args.json:
+            print(json.dumps(result['problems'], indent=2))
+        else:
+            print_report(result['problems'])
+        return EXIT_OK if result['integrated'] else EXIT_DRIFT
+    print(json.dumps(result, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+import contextlib
+import difflib
+import io
+import os
+
+from ..application.application_manager import has_deeplink_registration, has_sdk_initialization
+from ..backup.backup_manager import backup_rules_name, missing_backup_includes
+from ..deeplink.deeplink_manager import DEEPLINK_ACTION
+from ..fs.fs_manager import OverlayFileSystem
+from ..git.git_manager import commit_changes
+from ..gradle.gradle_manager import has_smartech_repository
+from ..index.index_manager import ProjectIndex, class_name_from_path
+from ..manifest.manifest_manager import backup_attribute, plan_variant_manifests
+from ..push.push_manager import missing_push_handling
+
+def _language_extension(language):
+    return '.kt' if language == 'kotlin' else '.java'
+
+def plan_integration(index, app_id, options=None, progress=None):
+    """
+    List the changes an integration run would make, without writing any file.
+
+    Args:
+        index (ProjectIndex): Index of the project to inspect
+        app_id (str): Smartech App ID the project should be configured with
+        options (dict): Same answers accepted by integrate_smartech; unanswered options are not planned
+        progress (Progress): Receives the progress of the source scan and can cancel it
+
+    Returns:
+        list: One dict per pending change with 'step', 'file' and 'action' keys
+    """
+    options = options or {}
+    paths = index.paths
+    steps = []
+
+    def add(step, path, action):
+        steps.append({'step': step, 'file': os.path.relpath(path, index.project_dir), 'action': action})
+
+    if paths['settings_path'] is None:
+        raise ValueError("Could not find settings.gradle or settings.gradle.kts file")
+    if not has_smartech_repository(index.read(paths['settings_path'])):
+        add('repository', paths['settings_path'], 'add Smartech repository')
+
+    gradle_model = index.gradle_model()
+    if not gradle_model['application_id']:
+        raise ValueError("Could not find applicationId in build.gradle file")
+    target_sdk = gradle_model['target_sdk']
+
+    app_class_path, language = index.application_class(progress)
+    deeplink_handled = bool(index.action_handlers(DEEPLINK_ACTION, progress))
+    app_content = ''
+    if not app_class_path:
+        app_class_path = os.path.join(paths['src_dir'], 'MyApplication' + _language_extension(language))
+        add('application', app_class_path, 'create application class')
+    else:
+        app_content = index.read(app_class_path)
+        if not has_sdk_initialization(app_content):
+            add('initialization', app_class_path, 'inject SDK initialization')
+        if not deeplink_handled and not has_deeplink_registration(app_content):
+            add('initialization', app_class_path, 'register deep link receiver')
+
+    receiver_path = os.path.join(paths['src_dir'], 'DeeplinkReceiver' + _language_extension(language))
+    if not deeplink_handled and not index.fs.exists(receiver_path):
+        add('deeplink', receiver_path, 'create deep link receiver')
+
+    manifest = index.manifest_model()
+    application = manifest['application'] or {}
+    meta_data = manifest['meta_data']
+    manifest_path = paths['manifest_path']
+    if meta_data.get('SMT_APP_ID') is None:
+        add('manifest', manifest_path, 'add SMT_APP_ID meta-data')
+    app_class_name = class_name_from_path(app_class_path, paths['src_dir'])
+    if application.get('android:name') != app_class_name:
+        add('manifest', manifest_path, f'set android:name to {app_class_name}')
+    if application.get('android:allowBackup') != 'true':
+        add('manifest', manifest_path, 'set android:allowBackup to true')
+    backup_rules = backup_rules_name(application, target_sdk, paths['res_dir'], index.fs)
+    attribute, backup_value = backup_attribute(target_sdk), '@xml/' + backup_rules
+    if application.get(attribute) != backup_value:
+        add('manifest', manifest_path, f'set {attribute} to {backup_value}')
+
+    if gradle_model['dependencies']['smartech-base'] is None:
+        add('gradle', paths['gradle_path'], 'add smartech-base dependency')
+
+    backup_path = os.path.join(paths['res_dir'], 'xml', backup_rules + '.xml')
+    if not index.fs.exists(backup_path):
+        add('backup', backup_path, 'create backup rules file')
+    else:
+        for _, path in missing_backup_includes(index.read(backup_path), attribute):
+            add('backup', backup_path, f'add backup include for {path}')
+
+    if 'enable_debug' in options:
+        debug_call = 'setDebugLevel({})'.format(9 if options['enable_debug'] else 0)
+        if debug_call not in app_content:
+            add('debug', app_class_path, debug_call)
+
+    if 'enable_location' in options:
+        value = '1' if options['enable_location'] else '0'
+        if meta_data.get('SMT_IS_AUTO_FETCHED_LOCATION') != value:
+            add('location', manifest_path, f'set SMT_IS_AUTO_FETCHED_LOCATION to {value}')
+
+    if options.get('integrate_push'):
+        push_service = index.push_service(progress)
+        push_class_path = push_service['path']
+        if not push_class_path:
+            push_class_path = os.path.join(paths['src_dir'], 'MyFirebaseMessagingService' + _language_extension(language))
+            add('push', push_class_path, 'create push notification service')
+        else:
+            push_content = index.read(push_class_path)
+            if missing_push_handling(push_content):
+                add('push', push_class_path, 'inject push handling')
+        if not push_service['registered']:
+            service_name = os.path.basename(push_class_path).replace('.kt', '').replace('.java', '')
+            add('push', manifest_path, f"register {push_service['android_name'] or '.' + service_name} service")
+        if gradle_model['dependencies']['smartech-push'] is None:
+            add('push', paths['gradle_path'], 'add smartech-push dependency')
+        if 'ask_permission' in options:
+            value = '1' if options['ask_permission'] else '0'
+            if meta_data.get('SMT_IS_AUTO_ASK_NOTIFICATION_PERMISSION') != value:
+                add('push', manifest_path, f'set SMT_IS_AUTO_ASK_NOTIFICATION_PERMISSION to {value}')
+
+    # Variant manifests are reconciled against the main manifest as the run above will leave it.
+    expected_meta_data = dict(meta_data, SMT_APP_ID=meta_data.get('SMT_APP_ID') or app_id)
+    if 'enable_location' in options:
+        expected_meta_data['SMT_IS_AUTO_FETCHED_LOCATION'] = '1' if options['enable_location'] else '0'
+    if options.get('integrate_push') and 'ask_permission' in options:
+        expected_meta_data['SMT_IS_AUTO_ASK_NOTIFICATION_PERMISSION'] = '1' if options['ask_permission'] else '0'
+    expected_application = dict(application, **{'android:name': app_class_name, 'android:allowBackup': 'true',
+                                                attribute: backup_value})
+    expected = dict(manifest, meta_data=expected_meta_data, application=expected_application)
+    variants = index.variant_manifest_models()
+    variant_app_ids = options.get('variant_app_ids') or {}
+    for source_set in variant_app_ids:
+        variants.setdefault(source_set, (os.path.join(paths['app_dir'], 'src', source_set, 'AndroidManifest.xml'), None))
+    placements = plan_variant_manifests(expected, {source_set: model for source_set, (_, model) in variants.items()},
+                                        variant_app_ids, gradle_model['namespace'])
+    for source_set, placement in placements.items():
+        for name, value in list(placement['meta_data'].items()) + list(placement['application'].items()):
+            add('variant', variants[source_set][0], f'set {name} to {value}')
+
+    return steps
+
+def _default_answers(options):
+    answers = {
+        'enable_debug': False,
+        'enable_location': False,
+        'integrate_push': False,
+        'ask_permission': False,
+    }
+    answers.update(options or {})
+    return answers
+
+def apply_integration(index, app_id, options=None, progress=None):
+    """Run the integration non-interactively, returning its success flag and captured output."""
+    from .integrator import integrate_smartech
+
+    answers = _default_answers(options)
+    output = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(output):
+            ok = integrate_smartech(index.project_dir, app_id, answers=answers, index=index, progress=progress)
+    finally:
+        index.invalidate()
+    return ok, output.getvalue()
+
+def _integrate_on_overlay(index, app_id, options, progress):
+    from .integrator import integrate_smartech
+
+    overlay = OverlayFileSystem(index.fs)
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        ok = integrate_smartech(index.project_dir, app_id, answers=_default_answers(options),
+                                index=ProjectIndex(index.project_dir, fs=overlay), progress=progress)
+    return ok, output.getvalue(), overlay
+
+def preview_integration(index, app_id, options=None, progress=None):
+    """
+    Run the integration against an in-memory overlay of the project and report what would change.
+
+    Returns:
+        tuple: (success flag, captured output, unified diff of every changed file)
+    """
+    ok, log, overlay = _integrate_on_overlay(index, app_id, options, progress)
+    return ok, log, changes_diff(overlay.changes(), index.project_dir)
+
+def changes_diff(changes, project_dir):
+    """Return a unified diff of {path: (original or None, content)} changes, with paths relative to project_dir."""
+    diff = []
+    for path, (original, content) in changes.items():
+        name = os.path.relpath(path, project_dir)
+        diff.extend(difflib.unified_diff((original or '').splitlines(True), content.splitlines(True),
+                                         'a/' + name if original is not None else '/dev/null', 'b/' + name))
+    return ''.join(diff)
+
+def commit_integration(index, app_id, options, branch, message=None, progress=None):
+    """
+    Integrate a project read from a git commit and record the result as a new commit on a branch.
+
+    Args:
+        index (ProjectIndex): Index over a GitTreeFileSystem
+        app_id (str): Smartech App ID
+        options (dict): Integration answers, as for apply_integration
+        branch (str): Branch to create (or advance from the indexed commit)
+        message (str): Commit message
+        progress (Progress): Receives step and scan progress and can cancel the run before the commit
+
+    Returns:
+        tuple: (success flag, captured output, new commit hash or None when nothing changed)
+    """
+    ok, log, overlay = _integrate_on_overlay(index, app_id, options, progress)
+    changes = overlay.changes()
+    if not ok or not changes:
+        return ok, log, None
+    return ok, log, commit_changes(index.fs, changes, branch, message)
@@ -1,129 +1,355 @@
+import os
 import re
 
-def modify_manifest(manifest_path, app_id, app_class_relative, target_sdk):
-    """Modify the Android manifest file with necessary Smartech configurations."""
-    with open(manifest_path, 'r') as f:
-        content = f.read()
+from ..cache.cache_manager import cached_edits
+from ..fs.fs_manager import LOCAL_FS, apply_edits, as_text, edit_file, find_text, rfind_text
+from ..guard.guard_manager import guarded_finditer, guarded_search, register_pattern
 
-    # Add SMT_APP_ID if missing
-    if 'SMT_APP_ID' not in content:
-        content = re.sub(r'(<application\b[^>]*>)',
-                         r'\1\n        <meta-data android:name="SMT_APP_ID" android:value="{}" />'.format(app_id),
-                         content)
-
-    # Always set android:name to the application class path
-    if re.search(r'<application[^>]*android:name=', content):
-        # Replace existing android:name
-     # Only update android:name inside the <application> tag
-        content = re.sub(
-        r'(<application[^>]*?)android:name="[^"]*"([^>]*>)',
-        rf'\1android:name="{app_class_relative}"\2',
-        content
-        )
+MESSAGING_EVENT_ACTION = 'com.google.firebase.MESSAGING_EVENT'
+TOOLS_NAMESPACE = 'http://schemas.android.com/tools'
+SMARTECH_META_DATA = ('SMT_APP_ID', 'SMT_IS_AUTO_FETCHED_LOCATION', 'SMT_IS_AUTO_ASK_NOTIFICATION_PERMISSION')
+BACKUP_ATTRIBUTES = ('android:allowBackup', 'android:fullBackupContent', 'android:dataExtractionRules')
+# Prefixes of source sets whose manifests are never merged into the app (test, testDebug, androidTestFree, ...).
+TEST_SOURCE_SETS = ('test', 'androidTest')
 
-    else:
-        # Add android:name if not present
-        content = re.sub(r'<application\b',
-                         f'<application android:name="{app_class_relative}"',
-                         content)
-
-    # Ensure allowBackup is true
-    def ensure_or_replace_attr(tag, attr, value):
-        if attr in tag:
-            tag = re.sub(r'{}="[^"]*"'.format(attr), '{}="{}"'.format(attr, value), tag)
-        else:
-            tag = tag.rstrip('>') + f' {attr}="{value}">'
-        return tag
+# Tag patterns stop at the next '<' as well as '>', so an unclosed tag costs one scan to the
+# next tag instead of a scan to the end of the file for every occurrence.
+APPLICATION_TAG = register_pattern('manifest: application tag', r'<application\b[^<>]*>')
+MANIFEST_TAG = register_pattern('manifest: manifest tag', r'<manifest\b[^<>]*>')
+MANIFEST_PACKAGE = register_pattern('manifest: package attribute', r'<manifest\b[^<>]*?\bpackage="([^"<>]*)"')
+META_DATA_TAG = register_pattern('manifest: meta-data tag', r'<meta-data\b[^<>]*>')
+META_DATA_VALUE = register_pattern('manifest: meta-data value',
+                                   r'<meta-data android:name="([^"<>]*)" android:value="[^"]*" ?/>')
+SERVICE_TOKEN = register_pattern('manifest: service tokens', r'<service\b[^<>]*>|</service>')
+RECEIVER_TOKEN = register_pattern('manifest: receiver tokens', r'<receiver\b[^<>]*>|</receiver>')
+ACTION_TAG = register_pattern('manifest: action tag', r'<action\b[^<>]*>')
+# The lookbehind anchors names at a word start, keeping the scan linear in long tokens.
+ATTRIBUTE = register_pattern('manifest: attribute', r'(?<![\w:.-])([\w:.-]+)\s*=\s*"([^"]*)"')
+
+def backup_attribute(target_sdk):
+    """Return the <application> attribute that points at backup rules for a target SDK version."""
+    return 'android:dataExtractionRules' if target_sdk >= 31 else 'android:fullBackupContent'
+
+def qualified_name(name, package):
+    """Return a manifest class name resolved against the manifest's package (or the module namespace)."""
+    if name and package and (name.startswith('.') or '.' not in name):
+        return package + ('' if name.startswith('.') else '.') + name
+    return name
+
+def parse_attributes(tag):
+    """Return the attributes of a single XML start tag as a dict."""
+    return dict(ATTRIBUTE.findall(tag))
+
+def _components(content, tokens):
+    """Pair the start tags of one kind of component with the intent filter actions in their bodies, in one pass."""
+    components = []
+    open_component = None
+    for match in tokens.finditer(content):
+        token = match.group(0)
+        if token.startswith('</'):
+            if open_component is not None:
+                body = content[open_component.pop('body'):match.start()]
+                open_component['actions'] = [parse_attributes(tag).get('android:name') for tag in ACTION_TAG.findall(body)]
+                open_component = None
+            continue
+        component = {'name': parse_attributes(token).get('android:name'), 'actions': []}
+        components.append(component)
+        open_component = None if token.endswith('/>') else component
+        if open_component is not None:
+            open_component['body'] = match.end()
+    if open_component is not None:
+        open_component.pop('body')
+    return components
+
+def _services(content):
+    services = _components(content, SERVICE_TOKEN)
+    for service in services:
+        service['messaging'] = MESSAGING_EVENT_ACTION in service['actions']
+    return services
+
+def parse_manifest(content):
+    """Parse the values the integrator cares about out of AndroidManifest.xml content."""
+    package = guarded_search(MANIFEST_PACKAGE, content)
+    application = guarded_search(APPLICATION_TAG, content)
+    meta_data = {}
+    for tag in META_DATA_TAG.findall(content):
+        attributes = parse_attributes(tag)
+        if 'android:name' in attributes:
+            meta_data[attributes['android:name']] = attributes.get('android:value')
+    return {
+        'package': package.group(1) if package else None,
+        'application': parse_attributes(application.group(0)) if application else None,
+        'meta_data': meta_data,
+        'services': _services(content),
+        'receivers': _components(content, RECEIVER_TOKEN),
+    }
+
+def set_attribute(tag, attr, value, first=False):
+    """Set an attribute on a single start tag, appending it (or inserting it first) when absent."""
+    existing = re.search(r'(?<![\w:.-])' + re.escape(attr) + r'\s*=\s*"[^"]*"', tag)
+    if existing:
+        return tag[:existing.start()] + f'{attr}="{value}"' + tag[existing.end():]
+    if first:
+        name_end = re.match(r'<[\w:.-]+', tag).end()
+        return tag[:name_end] + f' {attr}="{value}"' + tag[name_end:]
+    close = len(tag) - (2 if tag.endswith('/>') else 1)
+    return tag[:close].rstrip() + f' {attr}="{value}"' + tag[close:]
+
+def insert_after_application_tag(content, text):
+    """Insert text right after the <application> start tag; content is unchanged if there is none."""
+    match = guarded_search(APPLICATION_TAG, content)
+    if match is None:
+        return content
+    return content[:match.end()] + text + content[match.end():]
+
+def _meta_data_edits(content, name, value):
+    """Return the edits that add a meta-data entry right after <application> or update an existing one."""
+    tag = f'<meta-data android:name="{name}" android:value="{value}" />'
+    if find_text(content, name) == -1:
+        match = guarded_search(APPLICATION_TAG, content)
+        return [] if match is None else [(match.end(), match.end(), '\n        ' + tag)]
+    return [(m.start(), m.end(), tag) for m in guarded_finditer(META_DATA_VALUE, content)
+            if as_text(m.group(1)) == name and as_text(m.group(0)) != tag]
+
+def set_meta_data(content, name, value):
+    """Add a meta-data entry right after <application>, or update the value of an existing one."""
+    return apply_edits(content, _meta_data_edits(content, name, value))
+
+def _application_edits(content, app_id, app_class_relative, target_sdk, backup_rules=None):
+    edits = []
+
+    # Add SMT_APP_ID if missing
+    if find_text(content, 'SMT_APP_ID') == -1:
+        edits += _meta_data_edits(content, 'SMT_APP_ID', app_id)
 
     # Find the application tag
-    match = re.search(r'<application\b[^>]*>', content)
+    match = guarded_search(APPLICATION_TAG, content)
     if match:
-        app_tag = match.group(0)
+        app_tag = as_text(match.group(0))
+
+        # Always set android:name to the application class path
+        app_tag = set_attribute(app_tag, 'android:name', app_class_relative, first=True)
 
         # Enforce allowBackup = true
-        app_tag = ensure_or_replace_attr(app_tag, 'android:allowBackup', 'true')
+        app_tag = set_attribute(app_tag, 'android:allowBackup', 'true')
 
         # Handle fullBackupContent (only if targetSdk < 31)
         if target_sdk < 31:
-            app_tag = ensure_or_replace_attr(app_tag, 'android:fullBackupContent', '@xml/my_backup_file')
+            app_tag = set_attribute(app_tag, 'android:fullBackupContent', '@xml/' + (backup_rules or 'my_backup_file'))
 
         # Handle dataExtractionRules (only if targetSdk >= 31)
         if target_sdk >= 31:
-            app_tag = ensure_or_replace_attr(app_tag, 'android:dataExtractionRules', '@xml/my_backup_file_31')
+            app_tag = set_attribute(app_tag, 'android:dataExtractionRules', '@xml/' + (backup_rules or 'my_backup_file_31'))
 
         # Replace the old <application ...> tag with the modified one
-        content = content.replace(match.group(0), app_tag)
+        if app_tag != as_text(match.group(0)):
+            edits.append((match.start(), match.end(), app_tag))
+    return edits
 
-    # Write back to file
-    with open(manifest_path, "w") as f:
-        f.write(content)
+def modify_manifest(manifest_path, app_id, app_class_relative, target_sdk, fs=None, backup_rules=None):
+    """
+    Modify the Android manifest file with necessary Smartech configurations.
 
-def inject_push_meta_tag(manifest_path, ask_permission):
-    """Inject push notification meta tag into the manifest."""
-    with open(manifest_path, 'r') as f:
-        content = f.read()
-
-    if 'SMT_IS_AUTO_ASK_NOTIFICATION_PERMISSION' not in content:
-        content = re.sub(r'(<application\b[^>]*>)',
-                         r'\1\n        <meta-data android:name="SMT_IS_AUTO_ASK_NOTIFICATION_PERMISSION" android:value="{}" />'.format(
-                             '1' if ask_permission else '0'),
-                         content)
-    else:
-        content = re.sub(r'<meta-data android:name="SMT_IS_AUTO_ASK_NOTIFICATION_PERMISSION" android:value="[^"]*" ?/>',
-                         r'<meta-data android:name="SMT_IS_AUTO_ASK_NOTIFICATION_PERMISSION" android:value="{}" />'.format(
-                             '1' if ask_permission else '0'),
-                         content)
+    backup_rules names the res/xml backup rules resource to point at (see backup_rules_name);
+    by default it is the Smartech one for the target SDK.
+    """
+    edit_file(fs or LOCAL_FS, manifest_path, lambda content: cached_edits(
+        'manifest.application', (app_id, app_class_relative, target_sdk, backup_rules), content,
+        lambda content: _application_edits(content, app_id, app_class_relative, target_sdk, backup_rules)))
 
-    with open(manifest_path, 'w') as f:
-        f.write(content)
+def _edit_meta_data(manifest_path, name, value, fs=None):
+    edit_file(fs or LOCAL_FS, manifest_path, lambda content: cached_edits(
+        'manifest.meta-data', (name, value), content, lambda content: _meta_data_edits(content, name, value)))
 
-def register_firebase_service(manifest_path, service_name):
-    """Register Firebase Messaging Service in the AndroidManifest.xml."""
-    with open(manifest_path, 'r') as f:
-        content = f.read()
+def inject_push_meta_tag(manifest_path, ask_permission, fs=None):
+    """Inject push notification meta tag into the manifest."""
+    _edit_meta_data(manifest_path, 'SMT_IS_AUTO_ASK_NOTIFICATION_PERMISSION', '1' if ask_permission else '0', fs)
 
+def _service_edits(content, android_name):
     # Check if the service is already registered
-    if f'android:name=".{service_name}"' in content:
-        return
+    if find_text(content, f'android:name="{android_name}"') != -1:
+        return []
 
     service_registration = f"""
         <service 
-            android:name=".{service_name}">
+            android:name="{android_name}">
             <intent-filter>
                 <action android:name="com.google.firebase.MESSAGING_EVENT"/>
             </intent-filter>
         </service>"""
 
     # Case 1: <application> and </application> present
-    if '</application>' in content:
-        content = re.sub(r'(</application>)', service_registration + r'\n\1', content)
+    position = rfind_text(content, '</application>')
+    if position != -1:
+        return [(position, position, service_registration + '\n')]
     
     # Case 2: <application> present but </application> missing
-    elif '<application' in content:
-        content += '\n' + service_registration + '\n</application>'
+    elif find_text(content, '<application') != -1:
+        return [(len(content), len(content), '\n' + service_registration + '\n</application>')]
 
     # Case 3: No <application> tag at all — raise error or create it (optional)
     else:
         raise ValueError("No <application> tag found in AndroidManifest.xml.")
 
-    with open(manifest_path, 'w') as f:
-        f.write(content)
+def register_firebase_service(manifest_path, service_name, fs=None, android_name=None):
+    """
+    Register Firebase Messaging Service in the AndroidManifest.xml.
 
-def inject_location_tracking_meta_tag(manifest_path, enable_location):
+    The service is registered as android_name when given (a fully qualified name for a class
+    outside the app namespace), otherwise as .service_name relative to the namespace.
+    """
+    android_name = android_name or '.' + service_name
+    edit_file(fs or LOCAL_FS, manifest_path, lambda content: cached_edits(
+        'manifest.service', (android_name,), content, lambda content: _service_edits(content, android_name)))
+
+def inject_location_tracking_meta_tag(manifest_path, enable_location, fs=None):
     """Inject location tracking meta tag into the manifest."""
-    with open(manifest_path, 'r') as f:
-        content = f.read()
-
-    if 'SMT_IS_AUTO_FETCHED_LOCATION' not in content:
-        content = re.sub(r'(<application\b[^>]*>)',
-                         r'\1\n        <meta-data android:name="SMT_IS_AUTO_FETCHED_LOCATION" android:value="{}" />'.format(
-                             '1' if enable_location else '0'),
-                         content)
-    else:
-        content = re.sub(r'<meta-data android:name="SMT_IS_AUTO_FETCHED_LOCATION" android:value="[^"]*" ?/>',
-                         r'<meta-data android:name="SMT_IS_AUTO_FETCHED_LOCATION" android:value="{}" />'.format(
-                             '1' if enable_location else '0'),
-                         content)
+    _edit_meta_data(manifest_path, 'SMT_IS_AUTO_FETCHED_LOCATION', '1' if enable_location else '0', fs)
+
+def variant_manifest_paths(app_dir, fs=None):
+    """Return {source set: AndroidManifest.xml path} for the build-type and flavor manifests of a module."""
+    fs = fs or LOCAL_FS
+    src = os.path.join(app_dir, 'src')
+    if not fs.isdir(src):
+        return {}
+    manifests = {}
+    for source_set in fs.listdir(src):
+        if source_set == 'main' or source_set.startswith(TEST_SOURCE_SETS):
+            continue
+        path = os.path.join(src, source_set, 'AndroidManifest.xml')
+        if fs.isfile(path):
+            manifests[source_set] = path
+    return dict(sorted(manifests.items()))
+
+def plan_variant_manifests(main, variants, variant_app_ids=None, namespace=None):
+    """
+    Work out which Smartech settings each build-type and flavor manifest must carry to survive merging.
+
+    Variant manifests take priority over the main one when the manifests are merged, so a variant
+    that declares a Smartech meta-data entry or a backup attribute hides the main value. Those
+    declarations are set to the main value. A per-variant App ID is placed in its variant with
+    tools:replace, since it deliberately differs from the main one.
+
+    Args:
+        main (dict): parse_manifest model of the main manifest as integrated
+        variants (dict): source set -> parse_manifest model, or None for a variant without a manifest
+        variant_app_ids (dict): Optional source set -> SMT_APP_ID
+        namespace (str): Namespace relative service names resolve against (default: the main manifest package)
+
+    Returns:
+        dict: source set -> {'meta_data': {name: value}, 'replace': names needing tools:replace,
+        'application': {attribute: value}, 'warnings': [message]}; variants needing nothing are left out
+    """
+    variant_app_ids = variant_app_ids or {}
+    main_application = main['application'] or {}
+    namespace = namespace or main['package']
+    main_services = {qualified_name(service['name'], namespace) for service in main['services'] if service['messaging']}
+    placements = {}
+    for source_set, variant in sorted(variants.items()):
+        variant = variant or {'meta_data': {}, 'application': None, 'services': []}
+        placement = {'meta_data': {}, 'replace': [], 'application': {}, 'warnings': []}
+        for name in SMARTECH_META_DATA:
+            expected = main['meta_data'].get(name)
+            if name == 'SMT_APP_ID' and source_set in variant_app_ids:
+                expected = variant_app_ids[source_set]
+                if expected != main['meta_data'].get(name):
+                    placement['replace'].append(name)
+            elif name not in variant['meta_data']:
+                continue
+            if expected is not None and variant['meta_data'].get(name) != expected:
+                placement['meta_data'][name] = expected
+        application = variant['application'] or {}
+        for attribute in BACKUP_ATTRIBUTES:
+            expected = main_application.get(attribute)
+            if attribute in application and expected is not None and application[attribute] != expected:
+                placement['application'][attribute] = expected
+        name = application.get('android:name')
+        if name and name.split('.')[-1] != (main_application.get('android:name') or '').split('.')[-1]:
+            placement['warnings'].append(f"android:name is overridden with {name}; "
+                                         "Smartech must also be initialized in that class")
+        for service in variant['services']:
+            if service['messaging'] and qualified_name(service['name'], namespace) not in main_services:
+                placement['warnings'].append(f"{service['name']} also handles MESSAGING_EVENT; "
+                                             "Smartech push handling must be added to it")
+        if placement['meta_data'] or placement['application'] or placement['warnings']:
+            placements[source_set] = placement
+    return placements
+
+def _variant_edits(content, placement):
+    """Return the edits that apply a plan_variant_manifests placement to a variant manifest."""
+    edits = []
+    if placement['replace'] and find_text(content, 'xmlns:tools') == -1:
+        manifest = guarded_search(MANIFEST_TAG, content)
+        if manifest is not None:
+            edits.append((manifest.start(), manifest.end(),
+                          set_attribute(as_text(manifest.group(0)), 'xmlns:tools', TOOLS_NAMESPACE)))
+
+    new_entries = []
+    declared = {}
+    for match in guarded_finditer(META_DATA_TAG, content):
+        declared.setdefault(parse_attributes(as_text(match.group(0))).get('android:name'), match)
+    for name, value in placement['meta_data'].items():
+        match = declared.get(name)
+        tag = as_text(match.group(0)) if match else f'<meta-data android:name="{name}" />'
+        tag = set_attribute(tag, 'android:value', value)
+        if name in placement['replace']:
+            tag = set_attribute(tag, 'tools:replace', 'android:value')
+        if match:
+            edits.append((match.start(), match.end(), tag))
+        else:
+            new_entries.append('\n        ' + tag)
+
+    application = guarded_search(APPLICATION_TAG, content)
+    if application is None:
+        if new_entries or placement['application']:
+            tag = '<application>'
+            for attribute, value in placement['application'].items():
+                tag = set_attribute(tag, attribute, value)
+            position = rfind_text(content, '</manifest>')
+            position = len(content) if position == -1 else position
+            edits.append((position, position, '    ' + tag + ''.join(new_entries) + '\n    </application>\n'))
+        return edits
+    tag = as_text(application.group(0))
+    for attribute, value in placement['application'].items():
+        tag = set_attribute(tag, attribute, value)
+    if new_entries and tag.endswith('/>'):
+        tag = tag[:-2].rstrip() + '>' + ''.join(new_entries) + '\n    </application>'
+    elif new_entries:
+        tag += ''.join(new_entries)
+    if tag != as_text(application.group(0)):
+        edits.append((application.start(), application.end(), tag))
+    return edits
+
+def update_variant_manifests(app_dir, manifest_path, variant_app_ids=None, fs=None, namespace=None):
+    """
+    Carry the Smartech settings of the main manifest into the variant manifests that override them.
+
+    The main manifest and every variant manifest are each read and parsed once.
+
+    Args:
+        app_dir (str): Path to the app module
+        manifest_path (str): Path to the integrated main AndroidManifest.xml
+        variant_app_ids (dict): Optional source set -> SMT_APP_ID; a manifest is created for a source set without one
+        fs: Filesystem the project lives on
+        namespace (str): The app module's Gradle namespace, if it declares one
 
-    with open(manifest_path, 'w') as f:
-        f.write(content)
\ No newline at end of file
+    Returns:
+        dict: source set -> (manifest path, placement) for every variant that needed changes or has warnings
+    """
+    fs = fs or LOCAL_FS
+    paths = variant_manifest_paths(app_dir, fs)
+    for source_set in variant_app_ids or {}:
+        paths.setdefault(source_set, os.path.join(app_dir, 'src', source_set, 'AndroidManifest.xml'))
+    variants = {source_set: parse_manifest(fs.read_text(path)) if fs.isfile(path) else None
+                for source_set, path in paths.items()}
+    placements = plan_variant_manifests(parse_manifest(fs.read_text(manifest_path)), variants, variant_app_ids, namespace)
+    for source_set, placement in placements.items():
+        path = paths[source_set]
+        if variants[source_set] is None:
+            fs.makedirs(os.path.dirname(path))
+            skeleton = ('<?xml version="1.0" encoding="utf-8"?>\n'
+                        '<manifest xmlns:android="http://schemas.android.com/apk/res/android">\n\n</manifest>\n')
+            fs.write_text(path, apply_edits(skeleton, _variant_edits(skeleton, placement)))
+        elif placement['meta_data'] or placement['application']:
+            edit_file(fs, path, lambda content: _variant_edits(content, placement))
+    return {source_set: (paths[source_set], placement) for source_set, placement in placements.items()}
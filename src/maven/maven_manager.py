@@ -0,0 +1,223 @@
+import hashlib
+import importlib
+import os
+import re
+import threading
+import time
+
+from ..fs.fs_manager import cache_dir, replace_file
+
+REPOSITORY_ENV = 'SMARTECH_MAVEN_REPOSITORY'
+FETCHER_ENV = 'SMARTECH_MAVEN_FETCHER'
+OFFLINE_ENV = 'SMARTECH_OFFLINE'
+TTL_ENV = 'SMARTECH_METADATA_TTL_HOURS'
+# The repository modify_settings_gradle adds to projects.
+NETCORE_REPOSITORY = 'https://artifacts.netcore.co.in/artifactory/android'
+GROUP_ID = 'com.netcore.android'
+ARTIFACTS = ('smartech-base', 'smartech-push')
+# The version the integrator's generated code was written and verified against.
+SMARTECH_SDK_VERSION = '3.6.2'
+# (targetSdk, oldest release) pairs: projects targeting at least that SDK need at least that release.
+# The exported deep link receiver written for targetSdk 34+ was verified against the pinned release.
+MINIMUM_RELEASES = ((34, SMARTECH_SDK_VERSION),)
+DEFAULT_TTL_HOURS = 24
+# A failed fetch is remembered this long, so a fleet without network access does not retry per run.
+FAILURE_TTL = 3600
+FETCH_TIMEOUT = 10
+_RELEASE = re.compile(r'^\d+(\.\d+)*$')
+_PLUGIN = re.compile(r'^[A-Za-z_][\w.]*:[A-Za-z_]\w*$')
+
+class MetadataError(OSError):
+    """Raised when maven-metadata.xml cannot be fetched or parsed."""
+
+def metadata_url(repository, artifact):
+    """Return the maven-metadata.xml location of a Netcore artifact in a repository URL or directory."""
+    return '/'.join([repository.rstrip('/'), GROUP_ID.replace('.', '/'), artifact, 'maven-metadata.xml'])
+
+def fetch_url(url):
+    """Fetch a URL or local path; the default fetcher, so a directory laid out like the repository can stand in for it."""
+    if '://' not in url or url.startswith('file://'):
+        path = url[len('file://'):] if url.startswith('file://') else url
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError as e:
+            raise MetadataError(f"Cannot read {path}: {e}")
+    import urllib.request
+
+    try:
+        with urllib.request.urlopen(url, timeout=FETCH_TIMEOUT) as response:
+            return response.read()
+    except (OSError, ValueError) as e:
+        raise MetadataError(f"Cannot fetch {url}: {e}")
+
+def parse_metadata(data):
+    """Return the release versions listed in maven-metadata.xml content, oldest first."""
+    # Imported here rather than at module load: check and plan runs import this module but never parse.
+    import xml.etree.ElementTree as ET
+
+    try:
+        root = ET.fromstring(data)
+    except ET.ParseError as e:
+        raise MetadataError(f"Invalid maven-metadata.xml: {e}")
+    versions = [element.text.strip() for element in root.iter('version') if element.text]
+    return sorted((version for version in versions if is_release(version)), key=version_key)
+
+def is_release(version):
+    """Return True for a plain numeric release such as 3.6.2."""
+    return bool(_RELEASE.match(version))
+
+def version_key(version):
+    return tuple(int(part) for part in version.split('.'))
+
+def compatible_versions(versions, target_sdk):
+    """Return the releases the integrator can write for a project targeting target_sdk."""
+    major = version_key(SMARTECH_SDK_VERSION)[0]
+    minimum = max((version_key(release) for sdk, release in MINIMUM_RELEASES if target_sdk >= sdk), default=())
+    return [version for version in versions if version_key(version)[0] == major and version_key(version) >= minimum]
+
+class MetadataCache:
+    """
+    maven-metadata.xml of the Smartech artifacts, cached on disk and in memory.
+
+    A cached file is used until it is ttl seconds old and then fetched again; a failed
+    fetch falls back to the stale copy. Offline, nothing is fetched and any cached copy is
+    used however old. The cache directory can be shared by every worker of a fleet, so
+    one fetch per TTL serves them all.
+    """
+
+    def __init__(self, root, repository=NETCORE_REPOSITORY, fetcher=fetch_url, ttl=DEFAULT_TTL_HOURS * 3600, offline=False):
+        self.root = root
+        self.repository = repository
+        self.fetcher = fetcher
+        self.ttl = ttl
+        self.offline = offline
+        self.fetches = 0
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def _path(self, artifact, suffix='.xml'):
+        name = hashlib.sha1(metadata_url(self.repository, artifact).encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.root, f'{artifact}-{name}{suffix}')
+
+    def _age(self, path):
+        try:
+            return time.time() - os.stat(path).st_mtime
+        except OSError:
+            return None
+
+    def seed(self, data, artifact=None):
+        """Store maven-metadata.xml content, e.g. for offline use; returns the artifact it belongs to."""
+        versions = parse_metadata(data)
+        if artifact is None:
+            import xml.etree.ElementTree as ET
+
+            artifact_id = ET.fromstring(data).findtext('artifactId')
+            artifact = artifact_id.strip() if artifact_id else None
+        if artifact not in ARTIFACTS:
+            raise MetadataError(f"Not the metadata of a Smartech artifact: {artifact}")
+        replace_file(self._path(artifact), data)
+        with self._lock:
+            self._versions[artifact] = (time.time(), versions)
+        return artifact
+
+    def versions(self, artifact, refresh=False):
+        """Return the release versions of an artifact, or None when no metadata is available."""
+        with self._lock:
+            if artifact in self._versions and not refresh:
+                loaded, versions = self._versions[artifact]
+                if self.offline or time.time() - loaded < (self.ttl if versions is not None else FAILURE_TTL):
+                    return versions
+            path, failure = self._path(artifact), self._path(artifact, '.failed')
+            age, failed_age = self._age(path), self._age(failure)
+            fresh = age is not None and age < self.ttl
+            recently_failed = failed_age is not None and failed_age < FAILURE_TTL
+            if not self.offline and (refresh or not (fresh or recently_failed)):
+                try:
+                    data = self.fetcher(metadata_url(self.repository, artifact))
+                    versions = parse_metadata(data)
+                    self.fetches += 1
+                    replace_file(path, data)
+                    _remove(failure)
+                    self._versions[artifact] = (time.time(), versions)
+                    return versions
+                except (OSError, MetadataError):
+                    try:
+                        replace_file(failure, b'')
+                    except OSError:
+                        pass
+            try:
+                with open(path, 'rb') as f:
+                    versions = parse_metadata(f.read())
+                # A copy read from disk expires when the file does, not a full TTL from now.
+                loaded = time.time() - age
+            except (OSError, MetadataError):
+                versions, loaded = None, time.time()
+            self._versions[artifact] = (loaded, versions)
+            return versions
+
+    def resolve(self, target_sdk):
+        """
+        Return the newest release of both Smartech artifacts that suits a project targeting target_sdk.
+
+        Falls back to the pinned version when no metadata is available or no release fits.
+        """
+        common = None
+        for artifact in ARTIFACTS:
+            versions = self.versions(artifact)
+            if versions is None:
+                return SMARTECH_SDK_VERSION
+            common = set(versions) if common is None else common & set(versions)
+        candidates = compatible_versions(sorted(common, key=version_key), target_sdk)
+        return candidates[-1] if candidates else SMARTECH_SDK_VERSION
+
+def _remove(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+def _env_number(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+def _load_fetcher(spec):
+    module_name, _, function = spec.partition(':')
+    return getattr(importlib.import_module(module_name), function)
+
+_cache = None
+
+def configure_metadata(offline=None, repository=None, fetcher=None, ttl=None, root=None):
+    """
+    Set up the process-wide metadata cache and return it.
+
+    Args:
+        offline (bool): Never fetch; defaults to $SMARTECH_OFFLINE
+        repository (str): Repository URL or directory; defaults to $SMARTECH_MAVEN_REPOSITORY, then the Netcore repository
+        fetcher: Callable fetch(url) returning bytes, or 'package.module:function' naming one;
+            defaults to $SMARTECH_MAVEN_FETCHER, then fetch_url
+        ttl (float): Seconds before cached metadata is fetched again; defaults to $SMARTECH_METADATA_TTL_HOURS (24 h)
+        root (str): Cache directory; defaults to a directory in the user cache
+    """
+    global _cache
+    if offline is None:
+        offline = os.environ.get(OFFLINE_ENV, '').lower() not in ('', '0', 'false', 'no')
+    fetcher = fetcher or os.environ.get(FETCHER_ENV) or fetch_url
+    if isinstance(fetcher, str):
+        if not _PLUGIN.match(fetcher):
+            raise ValueError(f"Expected 'package.module:function' for the metadata fetcher, got {fetcher!r}")
+        fetcher = _load_fetcher(fetcher)
+    _cache = MetadataCache(root or cache_dir('maven-metadata'),
+                           repository or os.environ.get(REPOSITORY_ENV) or NETCORE_REPOSITORY, fetcher,
+                           _env_number(TTL_ENV, DEFAULT_TTL_HOURS) * 3600 if ttl is None else ttl, offline)
+    return _cache
+
+def metadata_cache():
+    """Return the process-wide metadata cache, configuring it from the environment on first use."""
+    return _cache or configure_metadata()
+
+def resolve_sdk_version(target_sdk):
+    """Return the Smartech SDK version to integrate into a project targeting target_sdk."""
+    return metadata_cache().resolve(target_sdk)
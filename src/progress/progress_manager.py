@@ -0,0 +1,193 @@
+import contextlib
+import signal
+import sys
+import threading
+import time
+
+# Exit code of a command line run stopped by Ctrl-C, as shells report it (128 + SIGINT).
+EXIT_CANCELLED = 130
+
+class Cancelled(RuntimeError):
+    """Raised at a cancellation check once a run's token is cancelled; no write is ever left half done."""
+
+class CancelToken:
+    """
+    Cooperative cancellation flag shared by a run and whoever may stop it.
+
+    The run calls check() between files and between steps, so it stops at the next point where
+    every file it wrote is complete, never in the middle of a write.
+    """
+
+    def __init__(self):
+        self.reason = None
+        self._event = threading.Event()
+
+    def cancel(self, reason='cancelled'):
+        self.reason = self.reason or reason
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def check(self):
+        if self._event.is_set():
+            raise Cancelled(self.reason)
+
+class Progress:
+    """
+    Progress of a run's long phases, delivered as events to a listener.
+
+    listener(event) receives one dict per event, with an 'event' key of:
+        'phase'    a phase started: 'phase', 'total_files' (None when not known up front)
+        'advance'  files were processed: 'phase', 'files', 'bytes', 'total_files', 'elapsed', 'eta'
+        'end'      the phase finished: 'phase', 'files', 'bytes', 'elapsed'
+        'step'     the run moved on to a step: 'step'
+        'message'  a line of output for the user: 'text'
+    'bytes' counts the text read, one per character. 'advance' events are sent at most once per
+    interval seconds, and always for the last file.
+
+    Every advance and step checks the cancel token, so a run passing a Progress around is
+    cancellable between any two files.
+    """
+
+    def __init__(self, listener=None, token=None, interval=0.1):
+        self.listener = listener
+        self.token = token
+        self.interval = interval
+        self.name = None
+        self.files = 0
+        self.bytes = 0
+        self.total_files = None
+        self._started = self._sent = 0.0
+
+    def _emit(self, event, **fields):
+        if self.listener is not None:
+            fields['event'] = event
+            self.listener(fields)
+
+    def check(self):
+        """Raise Cancelled if the run was cancelled."""
+        if self.token is not None:
+            self.token.check()
+
+    @contextlib.contextmanager
+    def phase(self, name, total_files=None):
+        """Count the files and bytes processed inside the block as one phase."""
+        self.check()
+        self.name, self.files, self.bytes, self.total_files = name, 0, 0, total_files
+        self._started = self._sent = time.monotonic()
+        self._emit('phase', phase=name, total_files=total_files)
+        try:
+            yield self
+        finally:
+            # Also sent when the phase is cut short by a return, an error or a cancellation.
+            self._emit('end', phase=name, files=self.files, bytes=self.bytes, elapsed=time.monotonic() - self._started)
+            self.name = None
+
+    def eta(self):
+        """Seconds the phase still needs at its rate so far, or None without a known total."""
+        if not self.total_files or not self.files:
+            return None
+        elapsed = time.monotonic() - self._started
+        return elapsed / self.files * max(self.total_files - self.files, 0)
+
+    def advance(self, nbytes=0, files=1):
+        """Record processed files, then check for cancellation."""
+        self.files += files
+        self.bytes += nbytes
+        now = time.monotonic()
+        if self.listener is not None and (now - self._sent >= self.interval or self.files == self.total_files):
+            self._sent = now
+            self._emit('advance', phase=self.name, files=self.files, bytes=self.bytes, total_files=self.total_files,
+                       elapsed=now - self._started, eta=self.eta())
+        self.check()
+
+    def step(self, name):
+        """Check for cancellation before a step starts, then report it."""
+        self.check()
+        self._emit('step', step=name)
+
+    def message(self, text):
+        """Report a line of output; it is printed unless a listener takes it."""
+        if self.listener is None:
+            print(text)
+        else:
+            self._emit('message', text=text)
+
+def _size(nbytes):
+    for unit in ('B', 'KB', 'MB'):
+        if nbytes < 1024:
+            return f"{nbytes:.0f} {unit}" if unit == 'B' else f"{nbytes:.1f} {unit}"
+        nbytes /= 1024.0
+    return f"{nbytes:.1f} GB"
+
+class ProgressBar:
+    """
+    Listener drawing the current phase as a one-line bar on a terminal.
+
+    Phases that finish within `delay` seconds are never drawn, so quick runs print nothing extra.
+    Nothing is drawn when the stream is not a terminal. Messages are printed to stdout above the bar.
+    """
+
+    def __init__(self, stream=None, delay=0.5, width=24):
+        self.stream = stream or sys.stderr
+        self.delay = delay
+        self.width = width
+        self.enabled = hasattr(self.stream, 'isatty') and self.stream.isatty()
+        self._drawn = None
+
+    def __call__(self, event):
+        if event['event'] == 'message':
+            drawn = self._drawn
+            self._clear()
+            print(event['text'], flush=True)
+            if drawn:
+                self._draw(drawn)
+        elif not self.enabled:
+            return
+        elif event['event'] == 'advance' and event['elapsed'] >= self.delay:
+            self._draw(event)
+        elif event['event'] == 'end':
+            self._clear()
+
+    def _clear(self):
+        if self._drawn:
+            self.stream.write('\r\033[K')
+            self.stream.flush()
+            self._drawn = None
+
+    def _draw(self, event):
+        total, files = event['total_files'], event['files']
+        if total:
+            filled = int(self.width * min(files, total) / total)
+            bar = f"[{'#' * filled}{'.' * (self.width - filled)}] {files}/{total} files"
+        else:
+            bar = f"{files} files"
+        eta = f"  ETA {event['eta']:.0f}s" if event['eta'] is not None else ''
+        self.stream.write(f"\r\033[K⏳ {event['phase']} {bar}  {_size(event['bytes'])}{eta}")
+        self.stream.flush()
+        self._drawn = event
+
+@contextlib.contextmanager
+def cancel_on_interrupt(token):
+    """
+    Turn the first Ctrl-C inside the block into token.cancel(), and a second one into KeyboardInterrupt.
+
+    Does nothing outside the main thread, where signal handlers cannot be installed.
+    """
+    if threading.current_thread() is not threading.main_thread() or signal.getsignal(signal.SIGINT) is None:
+        yield token
+        return
+
+    def interrupted(signum, frame):
+        if token.cancelled:
+            raise KeyboardInterrupt
+        token.cancel('interrupted')
+        sys.stderr.write("\n⚠️ Stopping at the next safe point; press Ctrl-C again to stop immediately.\n")
+
+    previous = signal.signal(signal.SIGINT, interrupted)
+    try:
+        yield token
+    finally:
+        signal.signal(signal.SIGINT, previous)
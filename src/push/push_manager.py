@@ -1,162 +1,220 @@
 import os
 import re
 
-def find_push_service_class(src_dir):
-    """Find the push notification service class in the source directory."""
-    for root, _, files in os.walk(src_dir):
-        for file in files:
-            if file.endswith(".java") or file.endswith(".kt"):
-                path = os.path.join(root, file)
-                with open(path, 'r') as f:
-                    content = f.read()
-                    if re.search(r'class\s+\w+\s*:\s*FirebaseMessagingService|extends\s+FirebaseMessagingService', content):
-                        return path, 'kotlin' if file.endswith('.kt') else 'java'
-    return None, None
-
-def inject_push_logic(push_class_path, language):
-    """Inject push notification handling logic into the service class."""
-    with open(push_class_path, 'r') as f:
-        content = f.read()
-
-    if language == 'kotlin':
-        # Check and add onNewToken if not present, or update if present but doesn't use Smartech
-        if 'onNewToken' not in content:
-            content = re.sub(r'(class\s+\w+\s*:\s*FirebaseMessagingService\s*{[^}]*)}',
-                             lambda m: m.group(0) + """
+from ..fs.fs_manager import LOCAL_FS
+from ..guard.guard_manager import guarded_finditer, guarded_search, register_pattern
+from ..locator.locator_manager import apply_insertions, get_source_map
+from ..manifest.manifest_manager import qualified_name
+from ..progress.progress_manager import Progress
+from ..templates.template_manager import render_template
+from ..validate.validate_manager import patch_source, write_source
+
+PUSH_SERVICE_CLASS = register_pattern('push: service class declaration',
+                                      r'class\s+\w+\s*:\s*FirebaseMessagingService|extends\s+FirebaseMessagingService')
+# Named declarations, with the primary constructor and qualified supertype forms the check above does not need.
+PUSH_SERVICE_DECLARATION = register_pattern('push: service class name',
+                                            r'\b(abstract\s+)?class\s+(\w+)\s*(?:(?:\([^()]*\)\s*)?:\s*(?:[\w.]+\.)?'
+                                            r'FirebaseMessagingService\s*\(|\s+extends\s+(?:[\w.]+\.)?FirebaseMessagingService\b)')
+PACKAGE_DECLARATION = register_pattern('push: package declaration', r'^[ \t]*package\s+([\w.]+)', re.MULTILINE)
+
+def is_push_service_class(content):
+    """Check whether Java/Kotlin source content declares a FirebaseMessagingService subclass."""
+    return guarded_search(PUSH_SERVICE_CLASS, content) is not None
+
+def missing_push_handling(content):
+    """Return the Smartech calls missing from push service content."""
+    return [call for call in ('setPushToken', 'handlePushNotification') if call not in content]
+
+def push_service_classes(content, language='java'):
+    """Return the qualified names of the concrete FirebaseMessagingService subclasses a source file declares."""
+    if 'FirebaseMessagingService' not in content:
+        return ()
+    source_map = get_source_map(content, language)
+    package = guarded_search(PACKAGE_DECLARATION, content)
+    prefix = package.group(1) + '.' if package else ''
+    return tuple(prefix + match.group(2) for match in guarded_finditer(PUSH_SERVICE_DECLARATION, content)
+                 if not match.group(1) and source_map.is_code(match.start()))
+
+def resolve_push_service(sources, manifest=None, namespace=None):
+    """
+    Pick the FirebaseMessagingService an integration patches by joining the manifest with the source index.
+
+    Firebase delivers messages to the service registered for MESSAGING_EVENT, so the first one the
+    manifest declares whose class is in the sources wins. When none is, the candidates are every
+    concrete subclass in the sources and the one in the first path (in sorted order) is chosen.
+
+    Args:
+        sources (dict): source path -> record with 'language' and 'push_services' (push_service_classes())
+        manifest (dict): parse_manifest model of the main manifest, or None
+        namespace (str): Namespace relative manifest names resolve against (default: the manifest package)
+
+    Returns:
+        dict: 'path', 'language' and 'class_name' of the chosen service (None without one),
+        'android_name' to register it as, 'registered' whether the manifest already does, 'others'
+        (the qualified names of the other subclasses, left alone) and 'unresolved' (manifest
+        MESSAGING_EVENT services whose class is not in the sources, such as a library's)
+    """
+    manifest = manifest or {'package': None, 'services': []}
+    namespace = namespace or manifest['package']
+    classes = {}
+    for path in sorted(sources):
+        for name in sources[path]['push_services']:
+            classes.setdefault(name, (path, sources[path]['language']))
+    by_simple_name = {}
+    for name in classes:
+        by_simple_name.setdefault(name.rsplit('.', 1)[-1], []).append(name)
+
+    chosen = android_name = None
+    unresolved = []
+    for service in manifest['services']:
+        if not service['messaging'] or not service['name']:
+            continue
+        name = qualified_name(service['name'], namespace)
+        if name not in classes:
+            # Without a namespace to resolve against, a class name that is unique in the sources still matches.
+            matches = by_simple_name.get(name.rsplit('.', 1)[-1], [])
+            name = matches[0] if namespace is None and len(matches) == 1 else None
+        if name is None:
+            unresolved.append(service['name'])
+        elif chosen is None:
+            chosen, android_name = name, service['name']
+    registered = chosen is not None
+    if chosen is None and classes:
+        chosen = min(classes, key=lambda name: classes[name][0])
+    if chosen is not None and android_name is None:
+        if namespace and chosen.startswith(namespace + '.'):
+            android_name = chosen[len(namespace):]
+        else:
+            android_name = chosen if '.' in chosen else '.' + chosen
+    path, language = classes[chosen] if chosen is not None else (None, None)
+    return {'path': path, 'language': language, 'class_name': chosen, 'android_name': android_name,
+            'registered': registered, 'others': sorted(name for name in classes if name != chosen),
+            'unresolved': unresolved}
+
+def find_push_service(src_dir, manifest=None, namespace=None, fs=None, progress=None, read=None):
+    """
+    Return resolve_push_service() for a project without an index, walking and reading its sources once.
+
+    read is an optional callable returning a file's content, to share reads with the caller.
+    """
+    fs = fs or LOCAL_FS
+    progress = progress or Progress()
+    read = read or fs.read_text
+    paths = [os.path.join(root, file) for root, _, files in fs.walk(src_dir)
+             for file in files if file.endswith(".java") or file.endswith(".kt")]
+    sources = {}
+    with progress.phase("Looking for the push service class", len(paths)):
+        for path in paths:
+            content = read(path)
+            progress.advance(len(content))
+            language = 'kotlin' if path.endswith('.kt') else 'java'
+            sources[path] = {'language': language, 'push_services': push_service_classes(content, language)}
+    return resolve_push_service(sources, manifest, namespace)
+
+def find_push_service_class(src_dir, fs=None, progress=None, manifest=None):
+    """Find the push notification service class in the source directory, preferring the one the manifest registers."""
+    service = find_push_service(src_dir, manifest, fs=fs, progress=progress)
+    return service['path'], service['language']
+
+NEW_TOKEN_METHOD = {
+    'kotlin': """
     override fun onNewToken(token: String) {
         super.onNewToken(token)
         Smartech.getInstance(WeakReference(applicationContext)).setPushToken(token)
     }
-}""",
-                             content)
-        elif 'onNewToken' in content and 'setPushToken' not in content:
-            content = re.sub(r'(override\s+fun\s+onNewToken\s*\(\s*token\s*:\s*String\s*\)\s*{[^}]*})',
-                             lambda m: m.group(0).replace('}', """
-        Smartech.getInstance(WeakReference(applicationContext)).setPushToken(token)
-    }"""),
-                             content)
+""",
+    'java': """
+    @Override
+    public void onNewToken(@NonNull String token) {
+        super.onNewToken(token);
+        Smartech.getInstance(new WeakReference<>(getApplicationContext())).setPushToken(token);
+    }
+""",
+}
 
-        # Check and add onMessageReceived if not present, or update if present but doesn't use Smartech
-        if 'onMessageReceived' not in content:
-            content = re.sub(r'(class\s+\w+\s*:\s*FirebaseMessagingService\s*{[^}]*)}',
-                             lambda m: m.group(0) + """
+MESSAGE_RECEIVED_METHOD = {
+    'kotlin': """
     override fun onMessageReceived(remoteMessage: RemoteMessage) {
         super.onMessageReceived(remoteMessage)
-        if(remoteMessage.getData().containsKey("smtSrc")){
-        Smartech.getInstance(WeakReference(applicationContext)).handlePushNotification(remoteMessage)
-        }
-    }
-}""",
-                             content)
-        elif 'onMessageReceived' in content and 'handlePushNotification' not in content:
-            content = re.sub(r'(override\s+fun\s+onMessageReceived\s*\(\s*remoteMessage\s*:\s*RemoteMessage\s*\)\s*{[^}]*super\.onMessageReceived\s*\(\s*remoteMessage\s*\)[^}]*})',
-                             lambda m: m.group(0).replace('}', """
         if(remoteMessage.getData().containsKey("smtSrc")){
             Smartech.getInstance(WeakReference(applicationContext)).handlePushNotification(remoteMessage)
         }
-    }"""),
-                             content)
-    else:  # Java
-        # Check and add onNewToken if not present, or update if present but doesn't use Smartech
-        if 'onNewToken' not in content:
-            content = re.sub(r'(class\s+\w+\s*extends\s*FirebaseMessagingService\s*{[^}]*)}',
-                             lambda m: m.group(0) + """
-    @Override
-    public void onNewToken(@NonNull String token) {
-        super.onNewToken(token);
-        Smartech.getInstance(new WeakReference<>(getApplicationContext())).setPushToken(token);
     }
-}""",
-                             content)
-        elif 'onNewToken' in content and 'setPushToken' not in content:
-            content = re.sub(r'(@Override\s+public\s+void\s+onNewToken\s*\(\s*@NonNull\s*String\s+token\s*\)\s*{[^}]*})',
-                             lambda m: m.group(0).replace('}', """
-        Smartech.getInstance(new WeakReference<>(getApplicationContext())).setPushToken(token);
-    }"""),
-                             content)
-
-        # Check and add onMessageReceived if not present, or update if present but doesn't use Smartech
-        if 'onMessageReceived' not in content:
-            content = re.sub(r'(class\s+\w+\s*extends\s*FirebaseMessagingService\s*{[^}]*)}',
-                             lambda m: m.group(0) + """
+""",
+    'java': """
     @Override
     public void onMessageReceived(RemoteMessage remoteMessage) {
         super.onMessageReceived(remoteMessage);
-         if(remoteMessage.getData().containsKey("smtSrc")){
-            Smartech.getInstance(new WeakReference<>(getApplicationContext())).handlePushNotification(remoteMessage);
-        }
-            }
-}""",
-                             content)
-        elif 'onMessageReceived' in content and 'handlePushNotification' not in content:
-            content = re.sub(r'(@Override\s+public\s+void\s+onMessageReceived\s*\(\s*RemoteMessage\s+remoteMessage\s*\)\s*{[^}]*super\.onMessageReceived\s*\(\s*remoteMessage\s*\)[^}]*})',
-                             lambda m: m.group(0).replace('}', """
         if(remoteMessage.getData().containsKey("smtSrc")){
             Smartech.getInstance(new WeakReference<>(getApplicationContext())).handlePushNotification(remoteMessage);
         }
-    }"""),
-                             content)
+    }
+""",
+}
 
-    with open(push_class_path, 'w') as f:
-        f.write(content)
+def _parameter_name(source_map, method, type_name, default):
+    """Return the name of the first parameter of the given type in a located method."""
+    params = source_map.content[method['params'][0] + 1:method['params'][1]]
+    if source_map.kotlin:
+        match = re.search(r'(\w+)\s*:\s*' + type_name + r'\b', params)
+    else:
+        match = re.search(r'\b' + type_name + r'\s+(\w+)', params)
+    return match.group(1) if match else default
 
-def create_push_service_class(src_dir, language, application_id):
-    """Create a new push notification service class if one doesn't exist."""
-    path = os.path.join(src_dir, "MyFirebaseMessagingService.kt" if language == 'kotlin' else "MyFirebaseMessagingService.java")
-    if os.path.exists(path):
-        return path
+def _after_super_call(source_map, method, name):
+    """Return the offset right after super.<name>(...) in a method body, or the start of the body."""
+    position = source_map.statement_end(r'\bsuper\s*\.\s*' + name + r'\s*\(', method['body'])
+    return method['body'][0] + 1 if position is None else position
 
-    if language == 'kotlin':
-        content = f"""
-package {application_id}
+def inject_push_logic(push_class_path, language, fs=None):
+    """Inject push notification handling logic into the service class."""
+    language = 'kotlin' if language == 'kotlin' else 'java'
+    patch_source(push_class_path, language, 'push.handling', [], lambda content: _with_push_logic(content, language), fs)
 
-import android.content.Context
-import com.google.firebase.messaging.FirebaseMessagingService
-import com.google.firebase.messaging.RemoteMessage
-import com.netcore.android.Smartech
-import java.lang.ref.WeakReference
+def _with_push_logic(content, language):
+    """Return the service source with Smartech token and message handling added, or None if nothing changes."""
+    source_map = get_source_map(content, language)
+    body = source_map.class_body('FirebaseMessagingService')
+    if body is None:
+        return None
+    insertions = []
 
-class MyFirebaseMessagingService : FirebaseMessagingService() {{
-    override fun onMessageReceived(remoteMessage: RemoteMessage) {{
-        super.onMessageReceived(remoteMessage)
-         if(remoteMessage.getData().containsKey("smtSrc")){{
-        Smartech.getInstance(WeakReference(applicationContext)).handlePushNotification(remoteMessage)
-        }}
-     }}
+    # Add onNewToken if not present, or update it if present but doesn't use Smartech
+    token_method = source_map.method('onNewToken', body)
+    if token_method is None:
+        insertions.append((body[1], NEW_TOKEN_METHOD[language]))
+    elif 'setPushToken' not in content:
+        token = _parameter_name(source_map, token_method, 'String', 'token')
+        if language == 'kotlin':
+            code = f"\n        Smartech.getInstance(WeakReference(applicationContext)).setPushToken({token})"
+        else:
+            code = f"\n        Smartech.getInstance(new WeakReference<>(getApplicationContext())).setPushToken({token});"
+        insertions.append((_after_super_call(source_map, token_method, 'onNewToken'), code))
 
-    override fun onNewToken(token: String) {{
-        super.onNewToken(token)
-        Smartech.getInstance(WeakReference(applicationContext)).setPushToken(token)
-    }}
-}}
-"""
-    else:
-        content = f"""
-package {application_id};
+    # Add onMessageReceived if not present, or update it if present but doesn't use Smartech
+    message_method = source_map.method('onMessageReceived', body)
+    if message_method is None:
+        insertions.append((body[1], MESSAGE_RECEIVED_METHOD[language]))
+    elif 'handlePushNotification' not in content:
+        message = _parameter_name(source_map, message_method, 'RemoteMessage', 'remoteMessage')
+        if language == 'kotlin':
+            call = f"Smartech.getInstance(WeakReference(applicationContext)).handlePushNotification({message})"
+        else:
+            call = f"Smartech.getInstance(new WeakReference<>(getApplicationContext())).handlePushNotification({message});"
+        code = f'\n        if({message}.getData().containsKey("smtSrc")){{\n            {call}\n        }}'
+        insertions.append((_after_super_call(source_map, message_method, 'onMessageReceived'), code))
 
-import android.content.Context;
-import androidx.annotation.NonNull;
-import com.google.firebase.messaging.FirebaseMessagingService;
-import com.google.firebase.messaging.RemoteMessage;
-import com.netcore.android.Smartech;
-import java.lang.ref.WeakReference;
+    if not insertions:
+        return None
+    return apply_insertions(content, insertions)
 
-public class MyFirebaseMessagingService extends FirebaseMessagingService {{
-    @Override
-    public void onMessageReceived(RemoteMessage remoteMessage) {{
-        super.onMessageReceived(remoteMessage);
-         if(remoteMessage.getData().containsKey("smtSrc")){{
-            Smartech.getInstance(new WeakReference<>(getApplicationContext())).handlePushNotification(remoteMessage);
-        }}
-            }}
+def create_push_service_class(src_dir, language, application_id, target_sdk=None, fs=None):
+    """Create a new push notification service class if one doesn't exist."""
+    fs = fs or LOCAL_FS
+    path = os.path.join(src_dir, "MyFirebaseMessagingService.kt" if language == 'kotlin' else "MyFirebaseMessagingService.java")
+    if fs.exists(path):
+        return path
 
-    @Override
-    public void onNewToken(@NonNull String token) {{
-        super.onNewToken(token);
-        Smartech.getInstance(new WeakReference<>(getApplicationContext())).setPushToken(token);
-    }}
-}}
-"""
-    with open(path, 'w') as f:
-        f.write(content)
+    content = render_template('push_service', language, application_id, target_sdk)
+    write_source(path, content, language, fs=fs)
     return path 
\ No newline at end of file
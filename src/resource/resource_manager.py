@@ -0,0 +1,152 @@
+import collections
+import difflib
+import os
+import re
+import threading
+
+from ..fs.fs_manager import LOCAL_FS
+from ..manifest.manifest_manager import TEST_SOURCE_SETS
+
+# Notification options naming a drawable or mipmap resource, and those holding a colour.
+ICON_OPTIONS = ('brand_logo', 'large_icon', 'small_icon', 'small_icon_transparent', 'placeholder_icon')
+COLOR_OPTIONS = ('transparent_bg_color',)
+IMAGE_TYPES = ('drawable', 'mipmap')
+HEX_COLOR = re.compile(r'^#[0-9A-Fa-f]{6}$')
+_COLOR = re.compile(r'<color\b[^>]*\bname\s*=\s*"([^"]+)"[^>]*>\s*([^<]*?)\s*</color>')
+# How a resource is referenced in XML, code or on disk, rather than by the bare name the SDK expects.
+_REFERENCE = re.compile(r'^(?:@(?:\+)?(drawable|mipmap)/|R\.(drawable|mipmap)\.)?([\w.]+?)(?:\.9)?(?:\.\w+)?$')
+# Projects whose indexes are kept; the daemon and fleet runs revisit them without rescanning.
+MAX_CACHED_PROJECTS = 64
+
+class ResourceIndex:
+    """
+    Drawable, mipmap and colour resources of a module across its source sets.
+
+    'images' maps each drawable or mipmap name to the (source set, directory) places it is
+    defined in; 'colors' maps each colour name to its value. Built in one pass over the res
+    directories, so each lookup afterwards is a dict access.
+    """
+
+    def __init__(self, images=None, colors=None):
+        self.images = images or {}
+        self.colors = colors or {}
+
+    def has_image(self, name):
+        return name in self.images
+
+    def similar_images(self, name, limit=3):
+        """Return the image names closest to a name that is not defined."""
+        return difflib.get_close_matches(name, list(self.images), n=limit, cutoff=0.6)
+
+def _res_dirs(app_dir, fs):
+    """Return (source set, res directory) for every non-test source set of a module."""
+    src = os.path.join(app_dir, 'src')
+    if not fs.isdir(src):
+        return []
+    return [(source_set, os.path.join(src, source_set, 'res')) for source_set in sorted(fs.listdir(src))
+            if not source_set.startswith(TEST_SOURCE_SETS) and fs.isdir(os.path.join(src, source_set, 'res'))]
+
+def _resource_dirs(app_dir, fs):
+    """Return (source set, directory name, path) for the drawable, mipmap and values directories of a module."""
+    dirs = []
+    for source_set, res_dir in _res_dirs(app_dir, fs):
+        for name in sorted(fs.listdir(res_dir)):
+            if name.split('-', 1)[0] in IMAGE_TYPES + ('values',) and fs.isdir(os.path.join(res_dir, name)):
+                dirs.append((source_set, name, os.path.join(res_dir, name)))
+    return dirs
+
+def _signature(app_dir, dirs, fs):
+    """Stat keys that change whenever a source set, resource directory or colors.xml of a module does."""
+    keys = [fs.stat_key(os.path.join(app_dir, 'src'))]
+    keys.extend(fs.stat_key(os.path.dirname(path)) for _, _, path in dirs)
+    for _, name, path in dirs:
+        keys.append((path, fs.stat_key(path)))
+        if name.startswith('values'):
+            keys.append(fs.stat_key(os.path.join(path, 'colors.xml')))
+    return tuple(keys)
+
+def build_resource_index(app_dir, fs=None, dirs=None):
+    """Scan the drawable, mipmap and values*/colors.xml resources of every non-test source set of a module."""
+    fs = fs or LOCAL_FS
+    images = {}
+    colors = {}
+    for source_set, name, path in _resource_dirs(app_dir, fs) if dirs is None else dirs:
+        if name.startswith('values'):
+            colors_path = os.path.join(path, 'colors.xml')
+            if fs.isfile(colors_path):
+                for color, value in _COLOR.findall(fs.read_text(colors_path, errors='replace')):
+                    colors.setdefault(color, value)
+            continue
+        for file in fs.listdir(path):
+            # Resource names cannot contain dots, so 'logo.9.png' and 'logo.webp' both define 'logo'.
+            images.setdefault(file.split('.', 1)[0], []).append((source_set, name))
+    return ResourceIndex(images, colors)
+
+_indexes = collections.OrderedDict()
+_lock = threading.Lock()
+
+def resource_index(app_dir, fs=None):
+    """Return the resource index of a module, rescanning only when its resources changed since the last call."""
+    fs = fs or LOCAL_FS
+    key = (type(fs).__name__, os.path.abspath(app_dir))
+    dirs = _resource_dirs(app_dir, fs)
+    signature = _signature(app_dir, dirs, fs)
+    with _lock:
+        cached = _indexes.get(key)
+        if cached is not None and cached[0] == signature:
+            _indexes.move_to_end(key)
+            return cached[1]
+    index = build_resource_index(app_dir, fs, dirs)
+    with _lock:
+        _indexes[key] = (signature, index)
+        _indexes.move_to_end(key)
+        while len(_indexes) > MAX_CACHED_PROJECTS:
+            _indexes.popitem(last=False)
+    return index
+
+def check_notification_option(option, value, index):
+    """Return a problem message for one notification option value, with a suggested fix, or None if it is valid."""
+    if option in COLOR_OPTIONS:
+        return _check_color(value, index)
+    if index.has_image(value):
+        return None
+    reference = _REFERENCE.match(value)
+    if reference and reference.group(3) != value and index.has_image(reference.group(3)):
+        return f"{value!r} is not a resource name; use {reference.group(3)!r}"
+    similar = index.similar_images(reference.group(3) if reference else value)
+    hint = f"; did you mean {' or '.join(repr(name) for name in similar)}?" if similar else ''
+    return f"no drawable or mipmap resource named {value!r}{hint}"
+
+def _check_color(value, index):
+    if HEX_COLOR.match(value):
+        return None
+    bare = value.lstrip('#')
+    if re.match(r'^[0-9A-Fa-f]{6}$', bare):
+        return f"{value!r} is not a #RRGGBB colour; use '#{bare}'"
+    if re.match(r'^[0-9A-Fa-f]{3}$', bare):
+        return f"{value!r} is not a #RRGGBB colour; use '#{''.join(c * 2 for c in bare)}'"
+    if re.match(r'^[0-9A-Fa-f]{8}$', bare):
+        return f"{value!r} has an alpha channel, which is not supported; use '#{bare[2:]}'"
+    name = re.sub(r'^(?:@color/|R\.color\.)', '', value)
+    if name in index.colors:
+        resolved = index.colors[name]
+        # Follow colours defined as another colour, e.g. accent = @color/brand_red.
+        seen = {name}
+        while resolved.startswith('@color/') and resolved[7:] in index.colors and resolved[7:] not in seen:
+            seen.add(resolved[7:])
+            resolved = index.colors[resolved[7:]]
+        if HEX_COLOR.match(resolved):
+            return f"{value!r} is a colour resource; give its value {resolved!r}"
+        return f"{value!r} is a colour resource ({resolved}); give its value as #RRGGBB"
+    return f"{value!r} is not a #RRGGBB colour"
+
+def validate_notification_options(options, index):
+    """Return '<option>: <problem>' messages for the notification options that would fail at runtime."""
+    problems = []
+    for option in ICON_OPTIONS + COLOR_OPTIONS:
+        value = options.get(option)
+        if value:
+            problem = check_notification_option(option, value, index)
+            if problem:
+                problems.append(f"{option}: {problem}")
+    return problems
@@ -0,0 +1,159 @@
+import os
+import re
+import string
+import threading
+
+TEMPLATES_ENV = 'SMARTECH_TEMPLATES_DIR'
+LANGUAGE_EXTENSIONS = {'kotlin': 'kt', 'java': 'java'}
+
+# Template name -> class the generated file must declare (the file is named after it).
+TEMPLATE_CLASSES = {
+    'application': 'MyApplication',
+    'deeplink_receiver': 'DeeplinkReceiver',
+    'push_service': 'MyFirebaseMessagingService',
+}
+PLACEHOLDERS = frozenset(['package'])
+
+# <name>[.sdk<N>].<kt|java>.tmpl; an sdk<N> variant is used when the target SDK is N or higher.
+_FILE_NAME = re.compile(r'^(?P<name>\w+?)(?:\.sdk(?P<sdk>\d+))?\.(?P<ext>kt|java)\.tmpl$')
+
+class TemplateError(ValueError):
+    """Raised when a template file is unknown, malformed or uses unsupported placeholders."""
+
+class CompiledTemplate:
+    """A template split once into literal text and placeholder names, rendered by a single join."""
+
+    def __init__(self, source, origin):
+        self.origin = origin
+        self.parts = []
+        self.placeholders = set()
+        last = 0
+        for match in string.Template.pattern.finditer(source):
+            literal = source[last:match.start()]
+            last = match.end()
+            if match.group('escaped') is not None:
+                self._add_literal(literal + '$')
+                continue
+            name = match.group('named') or match.group('braced')
+            if name is None:
+                line = source.count('\n', 0, match.start()) + 1
+                raise TemplateError(f"{origin}: invalid placeholder on line {line}")
+            if name not in PLACEHOLDERS:
+                raise TemplateError(f"{origin}: unknown placeholder ${name} (allowed: {', '.join(sorted(PLACEHOLDERS))})")
+            self._add_literal(literal)
+            self.parts.append((name,))
+            self.placeholders.add(name)
+        self._add_literal(source[last:])
+
+    def _add_literal(self, text):
+        if not text:
+            return
+        if self.parts and isinstance(self.parts[-1], str):
+            self.parts[-1] += text
+        else:
+            self.parts.append(text)
+
+    def render(self, **values):
+        return ''.join(part if isinstance(part, str) else values[part[0]] for part in self.parts)
+
+def _parse_file_name(file_name):
+    """Return (name, language, min_sdk) for a template file name, or None if it is not a template."""
+    match = _FILE_NAME.match(file_name)
+    if match is None:
+        return None
+    language = 'kotlin' if match.group('ext') == 'kt' else 'java'
+    return match.group('name'), language, int(match.group('sdk') or 0)
+
+class TemplateRegistry:
+    """
+    Code templates for generated classes, built-in or overridden from a directory.
+
+    Template sources are read once and compiled on first use; the template chosen for a
+    (name, language, target SDK) combination is cached, so generating many files repeats
+    no template work beyond the final join.
+    """
+
+    def __init__(self, override_dir=None):
+        self.override_dir = override_dir
+        self._sources = {}
+        self._compiled = {}
+        self._resolved = {}
+        self._lock = threading.Lock()
+        for name in TEMPLATE_CLASSES:
+            for language, extension in LANGUAGE_EXTENSIONS.items():
+                self._sources[(name, language, 0)] = ('builtin', f'builtin/{name}.{extension}.tmpl')
+        if override_dir:
+            self._load_overrides(override_dir)
+
+    def _load_overrides(self, override_dir):
+        if not os.path.isdir(override_dir):
+            raise TemplateError(f"Templates directory not found: {override_dir}")
+        for file_name in sorted(os.listdir(override_dir)):
+            if not file_name.endswith('.tmpl'):
+                continue
+            key = _parse_file_name(file_name)
+            if key is None or key[0] not in TEMPLATE_CLASSES:
+                raise TemplateError(f"{file_name}: not a known template "
+                                    f"(expected <{'|'.join(TEMPLATE_CLASSES)}>[.sdk<N>].<kt|java>.tmpl)")
+            self._sources[key] = ('file', os.path.join(override_dir, file_name))
+        # Overrides are validated up front so a broken house template fails the run before any project is touched.
+        for key, (kind, _) in self._sources.items():
+            if kind == 'file':
+                self._compile(key)
+
+    def _read(self, key):
+        kind, location = self._sources[key]
+        if kind == 'builtin':
+            import pkgutil
+
+            return pkgutil.get_data(__name__.rpartition('.')[0], location).decode('utf-8'), location
+        with open(location, 'r', encoding='utf-8') as f:
+            return f.read(), location
+
+    def _compile(self, key):
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            source, origin = self._read(key)
+            compiled = CompiledTemplate(source, origin)
+            name, language, _ = key
+            declaration = 'class ' + TEMPLATE_CLASSES[name]
+            if declaration not in source:
+                raise TemplateError(f"{origin}: must declare {declaration} ({language})")
+            self._compiled[key] = compiled
+        return compiled
+
+    def get(self, name, language, target_sdk=None):
+        """Return the compiled template for a name and language, picking the highest sdk variant <= target_sdk."""
+        language = 'kotlin' if language == 'kotlin' else 'java'
+        cache_key = (name, language, target_sdk)
+        compiled = self._resolved.get(cache_key)
+        if compiled is not None:
+            return compiled
+        with self._lock:
+            candidates = [key for key in self._sources
+                          if key[0] == name and key[1] == language and key[2] <= (target_sdk or 0)]
+            if not candidates:
+                raise TemplateError(f"No {language} template named {name}")
+            compiled = self._compile(max(candidates, key=lambda key: key[2]))
+            self._resolved[cache_key] = compiled
+        return compiled
+
+    def render(self, name, language, application_id, target_sdk=None):
+        """Render a template for a project's package."""
+        return self.get(name, language, target_sdk).render(package=application_id)
+
+_registry = None
+
+def configure_templates(override_dir=None):
+    """Create the process-wide registry, validating any override templates now; returns it."""
+    global _registry
+    _registry = TemplateRegistry(override_dir or os.environ.get(TEMPLATES_ENV) or None)
+    return _registry
+
+def default_registry():
+    """Return the process-wide registry, configuring it from the environment on first use."""
+    return _registry or configure_templates()
+
+def render_template(name, language, application_id, target_sdk=None):
+    """Render a generated class with the process-wide registry."""
+    return default_registry().render(name, language, application_id, target_sdk)
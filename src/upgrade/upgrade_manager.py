@@ -0,0 +1,154 @@
+import os
+
+from ..fs.fs_manager import apply_edits, is_archive, open_project
+from ..gradle.gradle_manager import (catalog_version_sites, parse_gradle, parse_included_projects, smartech_version_sites,
+                                     version_definition_sites)
+from ..index.index_manager import resolve_project_paths
+from ..inventory.inventory_manager import iter_parallel, iter_project_dirs
+from ..lock.lock_manager import ProjectLock
+from ..maven.maven_manager import resolve_sdk_version
+
+def _version_key(version):
+    parts = version.split('.')
+    return tuple(int(part) for part in parts) if all(part.isdigit() for part in parts) else None
+
+def upgrade_action(current, version, allow_downgrade=False):
+    """Return 'upgrade' if current should be rewritten to version, 'current' if it already is, or 'newer'."""
+    if current == version:
+        return 'current'
+    current_key, target_key = _version_key(current), _version_key(version)
+    if not allow_downgrade and current_key and target_key and current_key > target_key:
+        return 'newer'
+    return 'upgrade'
+
+def _read(fs, path):
+    try:
+        return fs.read_text(path)
+    except OSError:
+        return None
+
+def _build_files(fs, root):
+    """Return the root and module build scripts of a project, following the modules settings.gradle includes."""
+    settings_path = resolve_project_paths(root, fs)['settings_path']
+    settings = _read(fs, settings_path) if settings_path else None
+    module_dirs = list(parse_included_projects(settings).values()) if settings else []
+    paths = []
+    for module_dir in [''] + (module_dirs or ['app']):
+        for name in ('build.gradle.kts', 'build.gradle'):
+            path = os.path.normpath(os.path.join(root, module_dir, name))
+            if fs.exists(path) and path not in paths:
+                paths.append(path)
+                break
+    return paths
+
+def plan_upgrade(fs, root, version, allow_downgrade=False):
+    """
+    Work out how to move every Smartech coordinate of a project to version, without writing.
+
+    Literal versions in Groovy and Kotlin build scripts, versions interpolated from a variable
+    defined in a build script or gradle.properties, and version catalog entries (inline or via
+    version.ref) are all found. Each file is rewritten in a single pass over its content.
+
+    Returns:
+        dict: 'changes' {path: (original, content)}, 'coordinates' (one dict per version found,
+              with 'file', 'artifact', 'from' and 'action') and 'unresolved' (versions that could
+              not be traced to a definition)
+    """
+    contents = {}
+    edits = {}
+    coordinates = []
+    unresolved = []
+    seen = set()
+
+    def found(path, sites):
+        for start, end, artifact, current in sites:
+            action = upgrade_action(current, version, allow_downgrade)
+            coordinates.append({'file': os.path.relpath(path, root), 'artifact': artifact, 'from': current, 'action': action})
+            # Artifacts sharing a variable or a version.ref point at the same span; it is rewritten once.
+            if action == 'upgrade' and (path, start) not in seen:
+                seen.add((path, start))
+                edits.setdefault(path, []).append((start, end, version))
+
+    build_files = _build_files(fs, root)
+    properties_path = os.path.join(root, 'gradle.properties')
+    references = []
+    for path in build_files:
+        contents[path] = _read(fs, path)
+        sites, variables = smartech_version_sites(contents[path])
+        found(path, sites)
+        references.extend((path, artifact, variable) for artifact, variable in variables)
+
+    for path, artifact, variable in references:
+        # A variable is defined in the script using it, the root build script or gradle.properties.
+        candidates = [path] + [p for p in build_files[:1] if p != path] + [properties_path]
+        for candidate in candidates:
+            if candidate not in contents:
+                contents[candidate] = _read(fs, candidate)
+            if contents[candidate] is None:
+                continue
+            definitions = version_definition_sites(contents[candidate], variable, candidate == properties_path)
+            if definitions:
+                start, end, current = definitions[0]
+                found(candidate, [(start, end, artifact, current)])
+                break
+        else:
+            unresolved.append(f"{os.path.relpath(path, root)}: {artifact} uses ${variable}, which is not defined "
+                              f"in the build scripts or gradle.properties")
+
+    catalog_path = os.path.join(root, 'gradle', 'libs.versions.toml')
+    catalog = _read(fs, catalog_path)
+    if catalog is not None:
+        contents[catalog_path] = catalog
+        sites, missing = catalog_version_sites(catalog)
+        found(catalog_path, sites)
+        unresolved.extend(f"gradle/libs.versions.toml: version.ref {reference} is not defined in [versions]"
+                          for reference in missing)
+
+    changes = {path: (contents[path], apply_edits(contents[path], path_edits)) for path, path_edits in edits.items()}
+    return {'changes': changes, 'coordinates': coordinates, 'unresolved': unresolved}
+
+def upgrade_project(project_dir, version=None, dry_run=False, allow_downgrade=False, lock_timeout=None):
+    """
+    Upgrade the Smartech SDK of one project, or with dry_run return the diff instead of writing.
+
+    Without a version, the project moves to the newest release that suits its targetSdk.
+
+    Returns:
+        dict: Record with 'project', 'version', 'coordinates', 'unresolved', 'changed' (relative
+              paths) and, for dry runs, 'diff'
+    """
+    from ..main.operations import changes_diff
+
+    local = os.path.isdir(project_dir)
+    with ProjectLock(project_dir if local else None, exclusive=not dry_run, timeout=lock_timeout):
+        fs, root = open_project(project_dir)
+        try:
+            if version is None:
+                gradle_path = resolve_project_paths(root, fs)['gradle_path']
+                target_sdk = parse_gradle(_read(fs, gradle_path) or '')['target_sdk']
+                version = resolve_sdk_version(target_sdk)
+            plan = plan_upgrade(fs, root, version, allow_downgrade)
+            if not dry_run:
+                for path, (_, content) in plan['changes'].items():
+                    fs.write_text(path, content)
+        finally:
+            fs.close()
+    record = {'project': project_dir, 'version': version, 'coordinates': plan['coordinates'],
+              'unresolved': plan['unresolved'], 'changed': sorted(os.path.relpath(path, root) for path in plan['changes'])}
+    if dry_run:
+        record['diff'] = changes_diff(plan['changes'], root)
+    return record
+
+def is_project(path):
+    """Return True if path is one project (a checkout with a settings script, or a snapshot) rather than a fleet."""
+    return is_archive(path) or any(os.path.exists(os.path.join(path, name)) for name in ('settings.gradle', 'settings.gradle.kts'))
+
+def iter_upgrades(source, version=None, dry_run=False, allow_downgrade=False, workers=8):
+    """Upgrade a project, or every project of a directory of checkouts or list file in parallel, yielding records."""
+    project_dirs = [source] if is_project(source) else iter_project_dirs(source)
+    upgrade = lambda project_dir: upgrade_project(project_dir, version, dry_run, allow_downgrade)
+    for project_dir, future in iter_parallel(upgrade, project_dirs, workers):
+        try:
+            yield future.result()
+        except Exception as e:
+            yield {'project': project_dir, 'version': version, 'error': str(e)}
@@ -0,0 +1,185 @@
+import collections
+import re
+
+from ..cache.cache_manager import cached_content
+from ..fs.fs_manager import LOCAL_FS
+from ..locator.locator_manager import get_source_map
+
+# Symbols the integrator writes into sources, with the class each one must be imported from.
+KNOWN_IMPORTS = {
+    'Build': 'android.os.Build',
+    'Context': 'android.content.Context',
+    'IntentFilter': 'android.content.IntentFilter',
+    'SmartPush': 'com.netcore.android.smartechpush.SmartPush',
+    'SMTNotificationOptions': 'com.netcore.android.smartechpush.notification.SMTNotificationOptions',
+    'Smartech': 'com.netcore.android.Smartech',
+    'WeakReference': 'java.lang.ref.WeakReference',
+    'RemoteMessage': 'com.google.firebase.messaging.RemoteMessage',
+    'NonNull': 'androidx.annotation.NonNull',
+}
+
+_PACKAGE = re.compile(r'^[ \t]*package\s+([\w.]+)', re.MULTILINE)
+_IMPORT = re.compile(r'^[ \t]*import\s+(?:static\s+)?(\w+(?:\.\w+)*)(\.\*)?', re.MULTILINE)
+_SYMBOL = re.compile(r'(?<![\w.])(' + '|'.join(KNOWN_IMPORTS) + r')\b')
+
+class SourceValidationError(ValueError):
+    """Raised when patched or generated source fails the structural check; the file has not been written."""
+
+    def __init__(self, path, problems):
+        ValueError.__init__(self, f"{path}: generated code is invalid, file left unchanged: " + '; '.join(problems))
+        self.path = path
+        self.problems = problems
+
+def _line(content, offset):
+    return content.count('\n', 0, offset) + 1
+
+def _imported(content):
+    """Return (package, explicitly imported names, wildcard-imported packages) of a source file."""
+    package = _PACKAGE.search(content)
+    names, wildcards = set(), set()
+    for match in _IMPORT.finditer(content):
+        (wildcards if match.group(2) else names).add(match.group(1))
+    return package.group(1) if package else None, names, wildcards
+
+def missing_imports(content, language, source_map=None):
+    """Return the known symbols used in code that the file neither imports nor shares a package with."""
+    source_map = source_map or get_source_map(content, language)
+    package, names, wildcards = _imported(content)
+    missing = []
+    for match in _SYMBOL.finditer(source_map.masked):
+        symbol = match.group(1)
+        qualified = KNOWN_IMPORTS[symbol]
+        symbol_package = qualified.rpartition('.')[0]
+        if symbol in missing or qualified in names or symbol_package in wildcards or symbol_package == package:
+            continue
+        missing.append(symbol)
+    return missing
+
+def add_missing_imports(content, language):
+    """Add import statements for known symbols the content uses without importing them."""
+    missing = missing_imports(content, language)
+    if not missing:
+        return content
+    terminator = '' if language == 'kotlin' else ';'
+    lines = ''.join(f'import {KNOWN_IMPORTS[symbol]}{terminator}\n' for symbol in sorted(missing))
+    last_import = None
+    for last_import in _IMPORT.finditer(content):
+        pass
+    anchor = last_import or _PACKAGE.search(content)
+    if anchor is None:
+        return lines + content
+    line_end = content.find('\n', anchor.end())
+    if line_end == -1:
+        return content + '\n' + lines.rstrip('\n')
+    separator = '' if last_import else '\n'
+    return content[:line_end + 1] + separator + lines + content[line_end + 1:]
+
+def _declaration_problems(content, language, source_map):
+    """Return (key, message) tuples for methods defined twice and known symbols used without an import."""
+    problems = []
+    for body in source_map.class_bodies():
+        seen = set()
+        for method in source_map.methods(body):
+            params = ' '.join(source_map.masked[method['params'][0] + 1:method['params'][1]].split())
+            signature = (method['name'], params)
+            if signature in seen:
+                problems.append((('duplicate', signature),
+                                 f"method {method['name']}({params}) defined twice (line {_line(content, method['start'])})"))
+            seen.add(signature)
+
+    for symbol in missing_imports(content, language, source_map):
+        problems.append((('import', symbol), f"{symbol} is used without importing {KNOWN_IMPORTS[symbol]}"))
+    return problems
+
+def _problem_keys(content, language):
+    """Count the problem keys of a source without formatting a message for each unbalanced bracket."""
+    source_map = get_source_map(content, language)
+    keys = collections.Counter(('unbalanced', content[offset]) for offset in source_map.unmatched)
+    keys.update(key for key, _ in _declaration_problems(content, language, source_map))
+    return keys
+
+def _report(content, source_map, declarations, known):
+    """Return the (key, message) problems left after skipping known keys, as many times as each is counted."""
+    problems = []
+    line, counted = 1, 0
+    for offset in source_map.unmatched:
+        key = ('unbalanced', content[offset])
+        if known[key]:
+            known[key] -= 1
+            continue
+        # Offsets are sorted, so line numbers are counted incrementally rather than from the top each time.
+        line += content.count('\n', counted, offset)
+        counted = offset
+        problems.append((key, f"unbalanced '{key[1]}' on line {line}"))
+    for key, message in declarations:
+        if known[key]:
+            known[key] -= 1
+        else:
+            problems.append((key, message))
+    return problems
+
+def find_problems(content, language):
+    """
+    Run the structural checks on Java/Kotlin source.
+
+    Checks bracket balance, methods defined twice with the same parameters in one
+    class, and known symbols used without an import.
+
+    Returns:
+        list: (key, message) tuples; keys leave out line numbers so problems can be compared across edits
+    """
+    source_map = get_source_map(content, language)
+    return _report(content, source_map, _declaration_problems(content, language, source_map), collections.Counter())
+
+def validate_source(content, language, path='<source>', original=None):
+    """
+    Raise SourceValidationError if content has structural problems.
+
+    Args:
+        content (str): Source about to be written
+        language (str): 'kotlin' or 'java'
+        path (str): Path used in the error message
+        original (str): Content before the edit; problems it already had are not reported
+    """
+    source_map = get_source_map(content, language)
+    declarations = _declaration_problems(content, language, source_map)
+    if not source_map.unmatched and not declarations:
+        return
+    known = _problem_keys(original, language) if original is not None else collections.Counter()
+    problems = _report(content, source_map, declarations, known)
+    if problems:
+        raise SourceValidationError(path, [message for _, message in problems])
+
+def prepare_source(content, language, path='<source>', original=None):
+    """Add missing imports and validate patched or generated source; returns the content to write."""
+    content = add_missing_imports(content, language)
+    validate_source(content, language, path, original)
+    return content
+
+def write_source(path, content, language, original=None, fs=None):
+    """Add missing imports, validate and write a patched or generated source file."""
+    content = prepare_source(content, language, path, original)
+    (fs or LOCAL_FS).write_text(path, content)
+    return content
+
+def patch_source(path, language, editor, args, edit, fs=None):
+    """
+    Edit a source file and write it with missing imports added and the result validated.
+
+    edit(content) returns the edited source, or None to leave the file alone. The whole
+    transformation, validation included, is looked up in the patch cache by the editor name,
+    its arguments and the file content, so an identical file is patched without re-running it.
+    """
+    fs = fs or LOCAL_FS
+
+    def transform(content):
+        edited = edit(content)
+        if edited is None or edited == content:
+            return content
+        return prepare_source(edited, language, path, content)
+
+    original = fs.read_text(path)
+    content = cached_content(editor, [language] + list(args), original, transform)
+    if content != original:
+        fs.write_text(path, content)
+    return content
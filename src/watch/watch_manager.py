@@ -0,0 +1,249 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+
+from ..application.application_manager import is_application_class
+from ..check.check_manager import check_application, check_gradle, check_manifest
+from ..index.index_manager import ProjectIndex, SOURCE_EXTENSIONS
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+_EVENT_HEADER = struct.Struct('iIII')
+
+# How long to wait for further events after the first one, so a burst of writes is checked once.
+DEBOUNCE_SECONDS = 0.02
+
+class InotifyWatcher:
+    """Report changed paths in a set of directories using Linux inotify."""
+
+    def __init__(self, directories):
+        libc_name = ctypes.util.find_library('c') or 'libc.so.6'
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self._directories = {}
+        for directory in directories:
+            self.add_directory(directory)
+
+    def add_directory(self, directory):
+        if directory in self._directories.values():
+            return
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f'inotify_add_watch failed for {directory}')
+        self._directories[wd] = directory
+
+    def poll(self, timeout):
+        """Wait up to timeout seconds and return the set of paths that changed."""
+        changed = set()
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        while ready:
+            try:
+                data = os.read(self._fd, 65536)
+            except BlockingIOError:
+                data = b''
+            offset = 0
+            while offset < len(data):
+                wd, _, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                name = data[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + length].rstrip(b'\0')
+                offset += _EVENT_HEADER.size + length
+                if wd in self._directories and name:
+                    changed.add(os.path.join(self._directories[wd], os.fsdecode(name)))
+            ready, _, _ = select.select([self._fd], [], [], DEBOUNCE_SECONDS)
+        return changed
+
+    def close(self):
+        os.close(self._fd)
+
+class PollingWatcher:
+    """Report changed paths by comparing the mtime and size of a fixed set of files."""
+
+    def __init__(self, files, interval=0.5):
+        self.interval = interval
+        self._files = {}
+        for path in files:
+            self.add_file(path)
+
+    @staticmethod
+    def _stat(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def add_file(self, path):
+        if path not in self._files:
+            self._files[path] = self._stat(path)
+
+    def poll(self, timeout):
+        """Wait up to timeout seconds and return the set of paths that changed."""
+        deadline = time.monotonic() + timeout
+        while True:
+            changed = set()
+            for path, previous in self._files.items():
+                current = self._stat(path)
+                if current != previous:
+                    self._files[path] = current
+                    changed.add(path)
+            remaining = deadline - time.monotonic()
+            if changed or remaining <= 0:
+                return changed
+            time.sleep(min(self.interval, remaining))
+
+    def close(self):
+        pass
+
+def create_watcher(directories, files, interval=0.5, polling=False):
+    """Return an inotify watcher on Linux, or a polling watcher where inotify is unavailable."""
+    if not polling:
+        try:
+            return InotifyWatcher(directories)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(files, interval)
+
+class ProjectWatch:
+    """Track the integration state of the artifacts a watch re-verifies on change."""
+
+    def __init__(self, project_dir, app_id=None):
+        self.index = ProjectIndex(project_dir)
+        self.app_id = app_id
+        paths = self.index.paths
+        self.src_dir = paths['src_dir']
+        self.artifacts = {
+            'manifest': paths['manifest_path'],
+            'gradle': paths['gradle_path'],
+            'application': self.index.application_class()[0],
+        }
+        self.problems = {}
+
+    def _read(self, path):
+        try:
+            return self.index.fs.read_text(path)
+        except (OSError, ValueError):
+            return None
+
+    def check(self, artifact):
+        """Re-check a single artifact, returning its current list of problems."""
+        path = self.artifacts[artifact]
+        content = self._read(path) if path else None
+        if content is None:
+            return [f'{artifact} file is missing']
+        if artifact == 'manifest':
+            items = check_manifest(content, path, self.app_id)
+        elif artifact == 'gradle':
+            items = check_gradle(content, path)
+        else:
+            items = check_application(content, path)
+        return [item['message'] for item in items]
+
+    def artifact_directories(self):
+        return sorted({os.path.dirname(path) for path in self.artifacts.values() if path and os.path.isdir(os.path.dirname(path))})
+
+    def directories(self):
+        """Return the directories to watch: those of the artifacts and every package directory of the sources."""
+        directories = set(self.artifact_directories())
+        if os.path.isdir(self.src_dir):
+            directories.update(root for root, _, _ in os.walk(self.src_dir))
+        return sorted(directories)
+
+    def affected_artifacts(self, changed_paths):
+        """Map changed paths to the artifacts that need re-checking."""
+        affected = set()
+        for path in changed_paths:
+            for artifact, artifact_path in self.artifacts.items():
+                if path == artifact_path:
+                    affected.add(artifact)
+            if path.endswith(SOURCE_EXTENSIONS) and path != self.artifacts['application']:
+                # A regenerated Application class may appear under a new name.
+                content = self._read(path)
+                if content is not None and is_application_class(content):
+                    self.artifacts['application'] = path
+                    affected.add('application')
+        if self.artifacts['application'] and not os.path.exists(self.artifacts['application']):
+            self.artifacts['application'] = self.index.application_class()[0]
+            affected.add('application')
+        return affected
+
+    def update(self, artifacts):
+        """Re-check artifacts and return (artifact, problems) pairs whose state changed."""
+        changes = []
+        for artifact in sorted(artifacts):
+            problems = self.check(artifact)
+            if problems != self.problems.get(artifact):
+                self.problems[artifact] = problems
+                changes.append((artifact, problems))
+        return changes
+
+def _print_changes(watch, changes, started):
+    elapsed_ms = (time.monotonic() - started) * 1000
+    for artifact, problems in changes:
+        path = watch.artifacts[artifact]
+        label = os.path.relpath(path, watch.index.project_dir) if path else artifact
+        if problems:
+            for problem in problems:
+                print(f"   ❌ {label}: {problem} ({elapsed_ms:.1f} ms)")
+        else:
+            print(f"   ✅ {label}: integrated ({elapsed_ms:.1f} ms)")
+
+def watch_project(project_dir, app_id=None, interval=0.5, polling=False, report=_print_changes, max_events=None):
+    """
+    Watch an app module and re-verify only the artifacts affected by each change.
+
+    Args:
+        project_dir (str): Path to the Android project directory
+        app_id (str): Expected Smartech App ID, if SMT_APP_ID values should be compared
+        interval (float): Polling interval when inotify is unavailable
+        polling (bool): Force the polling watcher
+        report (callable): Called with (watch, changes, started) whenever an artifact's state changes
+        max_events (int): Stop after this many change batches (runs until Ctrl-C when None)
+    """
+    watch = ProjectWatch(project_dir, app_id)
+    started = time.monotonic()
+    report(watch, watch.update(watch.artifacts), started)
+    watcher = create_watcher(watch.directories(),
+                             [path for path in watch.artifacts.values() if path], interval, polling)
+    print(f"👀 Watching {project_dir} ({'inotify' if isinstance(watcher, InotifyWatcher) else 'polling'}). Press Ctrl-C to stop.")
+    batches = 0
+    try:
+        while max_events is None or batches < max_events:
+            changed = watcher.poll(interval)
+            if not changed:
+                continue
+            started = time.monotonic()
+            batches += 1
+            if isinstance(watcher, InotifyWatcher):
+                # Watch package directories created since the last batch, and check the sources already in them.
+                for path in list(changed):
+                    if os.path.isdir(path):
+                        for root, _, files in os.walk(path):
+                            watcher.add_directory(root)
+                            changed.update(os.path.join(root, file) for file in files)
+            affected = watch.affected_artifacts(changed)
+            if isinstance(watcher, InotifyWatcher):
+                for directory in watch.artifact_directories():
+                    watcher.add_directory(directory)
+            else:
+                for path in watch.artifacts.values():
+                    if path:
+                        watcher.add_file(path)
+            changes = watch.update(affected)
+            if changes:
+                report(watch, changes, started)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+    return watch.problems